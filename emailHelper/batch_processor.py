@@ -0,0 +1,272 @@
+# batch_processor.py
+import logging
+
+from url_classifier import flatten_group
+from pipeline import Pipeline, Stage, DEFAULT_QUEUE_SIZE
+from email_manager import MATCH_FUZZY
+from outbox import STATE_SENT, STATE_FAILED
+
+logger = logging.getLogger(__name__)
+
+# 邮箱来源
+EMAIL_SOURCE_CSV = "csv"
+# 按相似名称模糊匹配到的 CSV 邮箱，发送前需要人工核对
+EMAIL_SOURCE_FUZZY = "fuzzy"
+EMAIL_SOURCE_HELP_PAGE = "help_page"
+EMAIL_SOURCE_MANUAL = "manual"
+
+# 处理结果状态
+STATUS_OK = "ok"
+STATUS_NO_EMAIL = "no_email"
+STATUS_ERROR = "error"
+STATUS_RECENTLY_CONTACTED = "recently_contacted"
+# Steam 商店中不存在该 AppID，重试也不会有结果
+STATUS_NOT_FOUND = "not_found"
+
+NO_EMAIL_PLACEHOLDER = "未找到邮箱"
+# 取消时正在处理、没有走完全部阶段的结果
+CANCELLED_ERROR = "已取消，未处理完"
+
+# 流水线阶段
+STAGE_METADATA = "metadata"
+STAGE_PUBLISHER = "publisher"
+STAGE_HELP_PAGE = "help_page"
+STAGE_RENDER = "render"
+STAGE_SEND = "send"
+
+def new_result(appid: str, urls: list) -> dict:
+    """创建一个尚未处理的游戏结果字典。"""
+    return {
+        "appid": appid,
+        "urls": list(urls),
+        "game_name": "",
+        "publisher_name": "",
+        "publisher_email": None,
+        "email_source": None,
+        "email": None,
+        "status": STATUS_ERROR,
+        "error": None,
+    }
+
+# 各阶段默认的工作线程数，None 表示使用 extractor 的并发数
+DEFAULT_STAGE_WORKERS = {
+    STAGE_METADATA: None,
+    STAGE_PUBLISHER: 2,
+    STAGE_HELP_PAGE: None,
+    STAGE_RENDER: 1,
+    STAGE_SEND: 1,
+}
+
+def render_result_email(email_manager, result: dict):
+    """按当前模板为已解析好的结果重新生成邮件内容，只做模板渲染，不访问网络。"""
+    result["email"] = email_manager.construct_email_content(
+        to_email=result["publisher_email"] or NO_EMAIL_PLACEHOLDER,
+        game_name=result["game_name"],
+        publisher_name=result["publisher_name"],
+        appid=result["appid"],
+        steam_url="\n".join(result["urls"])
+    )
+
+def rerender_results(email_manager, results) -> int:
+    """
+    模板或发件配置修改后，用内存中的游戏和发行商信息重新渲染邮件，返回渲染的数量。
+    没有获取到游戏信息的结果会被跳过。模板有错误时抛出 TemplateError。
+    """
+    email_manager.compile_templates()
+    count = 0
+    for result in results:
+        if result["game_name"]:
+            render_result_email(email_manager, result)
+            count += 1
+    return count
+
+class BatchProcessor:
+    """
+    多游戏批量处理：按 AppID 完成 获取游戏信息 → 查找发行商邮箱 → 帮助页面兜底 → 构造邮件（→ 发送）。
+    每个步骤是流水线中的一个阶段，各有独立的线程数，阶段之间用有界队列连接。
+    每个游戏产出一个结果字典，单个游戏失败不影响其他游戏。
+    """
+    def __init__(self, extractor, email_manager, csv_path: str, max_workers: int = None,
+                 stage_workers: dict = None, queue_size: int = DEFAULT_QUEUE_SIZE, outbox_sender=None):
+        """
+        outbox_sender: 已启动的 OutboxSender，发送阶段经由它的发件箱和多账号调度器发送。
+        retry_failed_sends 为 True 时（命令行恢复运行），发件箱中此前发送失败的邮件会重新入队，而不是直接算作失败。
+        """
+        self.extractor = extractor
+        self.email_manager = email_manager
+        self.csv_path = csv_path
+        self.max_workers = max_workers or extractor.max_workers
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS)
+        self.stage_workers.update(stage_workers or {})
+        self.queue_size = queue_size
+        self.outbox_sender = outbox_sender
+        self.retry_failed_sends = False
+        # 从运行清单恢复时 appid -> 已完成的最后一个阶段
+        self._resumed_stages = {}
+        self.pipeline = None
+
+    def process_game(self, appid: str, urls: list) -> dict:
+        """
+        处理单个游戏，返回结果字典：
+        appid, urls, game_name, publisher_name, publisher_email, email_source,
+        email (construct_email_content 的结果), status, error
+        发行商邮箱在冷却期内已联系过时，status 为 STATUS_RECENTLY_CONTACTED，不会被批量发送。
+        """
+        result = new_result(appid, urls)
+        for step in (self.fetch_metadata, self.resolve_publisher_email, self.fetch_help_page_email, self.render_email):
+            if not step(result):
+                break
+        return result
+
+    def fetch_metadata(self, result: dict) -> bool:
+        game_info = self.extractor.get_game_info_from_appid(result["appid"])
+        if game_info is not None and not game_info:
+            result["status"] = STATUS_NOT_FOUND
+            result["error"] = "Steam 商店中不存在该 AppID"
+            return False
+        if not game_info:
+            result["error"] = "无法从Steam商店页面获取游戏名和发行商名"
+            return False
+        result["game_name"] = game_info.get("game_name", "未知游戏名")
+        result["publisher_name"] = game_info.get("publisher_name", "未知发行商")
+        return True
+
+    def resolve_publisher_email(self, result: dict) -> bool:
+        publisher_email, match = self.email_manager.find_email(result["game_name"], result["publisher_name"],
+                                                               self.csv_path, appid=result["appid"])
+        if publisher_email:
+            result["publisher_email"] = publisher_email
+            result["email_source"] = EMAIL_SOURCE_FUZZY if match == MATCH_FUZZY else EMAIL_SOURCE_CSV
+        return True
+
+    def fetch_help_page_email(self, result: dict) -> bool:
+        if result["publisher_email"]:
+            return True
+        import requests  # 延迟导入，此时 extractor 已经导入过，不会拖慢启动
+        appid = result["appid"]
+        try:
+            publisher_email = self.extractor.help_scraper.get_support_email(appid)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"从 Steam 帮助页面获取邮箱失败 (AppID: {appid}): {e}")
+            result["error"] = f"帮助页面请求失败: {e}"
+            publisher_email = None
+        if publisher_email:
+            result["publisher_email"] = publisher_email
+            result["email_source"] = EMAIL_SOURCE_HELP_PAGE
+        return True
+
+    def render_email(self, result: dict) -> bool:
+        publisher_email = result["publisher_email"]
+        render_result_email(self.email_manager, result)
+        if not publisher_email:
+            result["status"] = STATUS_NO_EMAIL
+            return False
+        cooldown_message = self.email_manager.check_cooldown(publisher_email)
+        if cooldown_message:
+            result["status"] = STATUS_RECENTLY_CONTACTED
+            result["error"] = cooldown_message
+            return False
+        result["status"] = STATUS_OK
+        return True
+
+    def send_email(self, result: dict) -> bool:
+        """
+        与 GUI 一样经由发件箱发送：加入发件箱后等待发件线程的最终结果，
+        多账号调度、限流暂停和失败重试都由 OutboxSender/SendScheduler 处理，同一 (AppID, 收件人) 不会重复发送。
+        """
+        email = result["email"]
+        outbox = self.outbox_sender.outbox
+        added, state = outbox.enqueue(result["appid"], email["to_email"], email["subject"],
+                                      email["body"], email["from_email"])
+        if not added and state == STATE_FAILED and self.retry_failed_sends:
+            added = outbox.requeue(result["appid"], email["to_email"])
+            if added:
+                logger.info(f"重新发送此前失败的邮件 (AppID: {result['appid']}, 收件人: {email['to_email']})")
+        if added:
+            self.outbox_sender.wake()
+        success, message = self.outbox_sender.wait_for(result["appid"], email["to_email"],
+                                                       cancelled=lambda: self.pipeline.stopped)
+        result["sent"] = success
+        if success:
+            result["send_state"] = STATE_SENT
+        else:
+            # 停止等待时邮件仍在发件箱中排队
+            result["send_state"] = outbox.get_state(result["appid"], email["to_email"])[0] or STATE_FAILED
+            result["error"] = f"发送失败: {message}"
+        return True
+
+    def build_pipeline(self, send: bool = False, on_stage_done=None) -> Pipeline:
+        steps = [
+            (STAGE_METADATA, self.fetch_metadata),
+            (STAGE_PUBLISHER, self.resolve_publisher_email),
+            (STAGE_HELP_PAGE, self.fetch_help_page_email),
+            (STAGE_RENDER, self.render_email),
+        ]
+        if send:
+            if self.outbox_sender is None:
+                raise ValueError("发送阶段需要 outbox_sender。")
+            steps.append((STAGE_SEND, self.send_email))
+        stages = [Stage(name, self._skip_if_resumed(steps, name, func), self.stage_workers[name] or self.max_workers,
+                        self.queue_size)
+                  for name, func in steps]
+        return Pipeline(stages, on_error=self._on_stage_error, output_size=self.queue_size,
+                        on_stage_done=on_stage_done)
+
+    def _skip_if_resumed(self, steps: list, name: str, func):
+        """从运行清单恢复的游戏，已经完成的阶段直接跳过。"""
+        order = {step_name: index for index, (step_name, _) in enumerate(steps)}
+        def run(result: dict) -> bool:
+            completed = self._resumed_stages.get(result["appid"])
+            if completed in order and order[name] <= order[completed]:
+                return True
+            return func(result)
+        return run
+
+    def _on_stage_error(self, result: dict, exc: Exception):
+        result["status"] = STATUS_ERROR
+        result["error"] = str(exc)
+
+    def process_many(self, groups: dict, send: bool = False, manifest=None, cancel_token=None):
+        """
+        流水线并发处理多个游戏，按完成顺序逐个产出结果字典。
+        groups: classify_urls 返回的 {appid: {类型: [url, ...]}}，不带 AppID 的分组会被忽略。
+        其余参数见 process_jobs。
+        """
+        jobs = {appid: flatten_group(kinds) for appid, kinds in groups.items() if appid}
+        yield from self.process_jobs(jobs, send=send, manifest=manifest, cancel_token=cancel_token)
+
+    def process_jobs(self, jobs: dict, send: bool = False, manifest=None, cancel_token=None, resume_from: dict = None):
+        """
+        jobs: {appid: [url, ...]}。
+        resume_from 为 RunManifest.resume_points() 返回的 {appid: (已完成的阶段, 当时的结果)}，
+        这些游戏从该阶段的下一阶段继续，不再重新获取已经拿到的数据。
+        send 为 True 时增加发送阶段，结果中带有 sent 字段；SMTP 变慢时上游的抓取也会随之放慢。
+        manifest 为 RunManifest 时，每个阶段完成和每个结果产出时都会写入清单，以便中断后恢复。
+        cancel_token 为 CancellationToken 时，取消后不再开始新的游戏，正在处理的请求完成后
+        以当前进度产出结果（未处理完的 error 为“已取消”，不会被清单记为完成），然后迭代结束。
+        模板有错误时在开始前抛出 TemplateError。
+        处理过程中可以通过 self.pipeline.format_stats() 查看各阶段的队列深度。
+        """
+        if not jobs:
+            return
+        # 模板有错误时在发起任何请求之前就失败
+        self.email_manager.compile_templates()
+
+        on_stage_done = None
+        if manifest is not None:
+            on_stage_done = lambda stage, result: manifest.record_stage(result["appid"], stage, result)
+        resume_from = resume_from or {}
+        self._resumed_stages = {appid: stage for appid, (stage, _) in resume_from.items()}
+        self.pipeline = self.build_pipeline(send=send, on_stage_done=on_stage_done)
+        if cancel_token is not None:
+            cancel_token.add_callback(self.pipeline.cancel)
+        logger.info(f"开始批量处理 {len(jobs)} 个游戏，各阶段线程数: "
+                    + ", ".join(f"{stage.name}={stage.workers}" for stage in self.pipeline.stages))
+        items = (dict(resume_from[appid][1]) if appid in resume_from else new_result(appid, urls)
+                 for appid, urls in jobs.items())
+        for result in self.pipeline.run(items):
+            if self.pipeline.stopped and result["status"] == STATUS_ERROR and not result["error"]:
+                result["error"] = CANCELLED_ERROR
+            if manifest is not None:
+                manifest.record_result(result)
+            yield result
@@ -0,0 +1,85 @@
+# bulk_renderer.py
+import os
+import time
+import logging
+from email.generator import BytesGenerator
+from email.utils import formatdate, make_msgid
+
+from batch_processor import NO_EMAIL_PLACEHOLDER
+
+logger = logging.getLogger(__name__)
+
+FLUSH_EVERY = 500
+FROM_HEADER_CACHE_SIZE = 1024
+
+class BulkEmailRenderer:
+    """
+    把大量邮件记录渲染为 RFC 5322 邮件草稿，逐封写入 mbox 文件或 .eml 目录，不发送任何邮件。
+    记录格式与 BatchProcessor 的结果字典相同（appid, game_name, publisher_name, publisher_email, urls），
+    已带有 email 字段的记录直接使用其中构造好的内容。
+    全程只保留当前一封邮件，内存占用与记录数量无关。
+    """
+    def __init__(self, email_manager):
+        self.email_manager = email_manager
+        self._from_headers = {}
+
+    def render_to_mbox(self, records, mbox_path: str) -> dict:
+        """把邮件追加写入 mbox 文件，返回 {"rendered": 数量, "skipped": 数量}。"""
+        stats = {"rendered": 0, "skipped": 0}
+        with open(mbox_path, "ab") as fp:
+            for msg in self._iter_messages(records, stats):
+                fp.write(f"From MAILER-DAEMON {time.asctime()}\n".encode("ascii"))
+                BytesGenerator(fp, mangle_from_=True).flatten(msg)
+                fp.write(b"\n")
+                if stats["rendered"] % FLUSH_EVERY == 0:
+                    fp.flush()
+        logger.info(f"已写入 mbox: {mbox_path}，共 {stats['rendered']} 封，跳过 {stats['skipped']} 条")
+        return stats
+
+    def render_to_eml_dir(self, records, output_dir: str) -> dict:
+        """每封邮件写成一个 .eml 文件，返回 {"rendered": 数量, "skipped": 数量}。"""
+        stats = {"rendered": 0, "skipped": 0}
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        for msg in self._iter_messages(records, stats):
+            file_name = f"{stats['rendered']:06d}_{msg['X-Steam-AppID']}.eml"
+            with open(os.path.join(output_dir, file_name), "wb") as fp:
+                BytesGenerator(fp).flatten(msg)
+        logger.info(f"已写入 .eml 目录: {output_dir}，共 {stats['rendered']} 封，跳过 {stats['skipped']} 条")
+        return stats
+
+    def _iter_messages(self, records, stats: dict):
+        # 模板有错误时在写入任何内容之前失败
+        self.email_manager.compile_templates()
+        domain = self.email_manager.email_config.get("smtp", {}).get("username", "").rpartition("@")[2] or None
+        for record in records:
+            to_email = record.get("publisher_email")
+            if not to_email or to_email == NO_EMAIL_PLACEHOLDER:
+                stats["skipped"] += 1
+                continue
+
+            parts = record.get("email") or self.email_manager.construct_email_content(
+                to_email=to_email,
+                game_name=record.get("game_name", ""),
+                publisher_name=record.get("publisher_name", ""),
+                appid=record.get("appid", ""),
+                steam_url="\n".join(record.get("urls", []))
+            )
+            msg = self.email_manager.build_message(
+                parts["to_email"], parts["subject"], parts["body"], self._from_header(parts["from_email"])
+            )
+            msg["Date"] = formatdate(localtime=True)
+            msg["Message-ID"] = make_msgid(domain=domain)
+            msg["X-Steam-AppID"] = str(record.get("appid", ""))
+            stats["rendered"] += 1
+            yield msg
+
+    def _from_header(self, from_email_display: str) -> str:
+        """同一个发件人只编码一次 From 头；发件人模板不含占位符时整批只有一个。"""
+        header = self._from_headers.get(from_email_display)
+        if header is None:
+            if len(self._from_headers) >= FROM_HEADER_CACHE_SIZE:
+                self._from_headers.clear()
+            header = self.email_manager.build_from_header(from_email_display)[0]
+            self._from_headers[from_email_display] = header
+        return header
@@ -0,0 +1,270 @@
+# cli.py
+"""
+命令行批量处理，不依赖 Tkinter。
+从文件或标准输入读取 Steam URL，按 AppID 处理后每个游戏输出一行 JSON 到标准输出，日志写到标准错误。
+
+    python cli.py urls.txt --csv publishers.csv > results.jsonl
+    cat urls.txt | python cli.py - > results.jsonl
+
+每次运行都会在 runs/ 下写入运行清单，中断后可以只重做失败或未处理的游戏：
+
+    python cli.py --resume runs/run-20250101-120000.jsonl >> results.jsonl
+
+各阶段耗时逐条写入与运行清单同名的 .metrics.jsonl，结束时在日志中输出 p50/p99；
+--prometheus 指定文件时另外写出 Prometheus textfile 格式的计数器和直方图。
+
+--send 与 GUI 共用发件箱 (outbox.sqlite3) 和多账号发送调度器：同一游戏不会重复发给同一收件人，
+限流和失败重试与 GUI 相同；发件箱中此前未发完的邮件也会一并发送。
+
+发行商通讯录可以与 publishers.csv 互相转换：
+
+    python cli.py --import-directory publishers.csv
+    python cli.py --export-directory publishers-backup.csv
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from steam_info_extractor import SteamInfoExtractor
+from steam_cache import SteamCache
+from publisher_directory import PublisherDirectory, DEFAULT_DIRECTORY_PATH
+from sent_history import SentHistory, DEFAULT_HISTORY_PATH
+from email_manager import EmailManager
+from batch_processor import BatchProcessor, new_result, DEFAULT_STAGE_WORKERS
+from url_classifier import classify_urls, flatten_group
+from template_compiler import TemplateError
+from run_manifest import RunManifest, default_manifest_path
+from outbox import Outbox, OutboxSender, DEFAULT_OUTBOX_PATH
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_FILENAME = "publishers.csv"
+# 每隔多少秒在日志中输出一次各阶段的队列深度
+STATS_INTERVAL = 5.0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="批量处理 Steam URL，以 JSONL 格式输出游戏信息、发行商邮箱和邮件内容。")
+    parser.add_argument("input", nargs="?", default="-", help="URL 列表文件，省略或为 - 时读取标准输入")
+    parser.add_argument("--csv", default=DEFAULT_CSV_FILENAME, help="发行商邮箱 CSV 文件 (默认: %(default)s)")
+    parser.add_argument("--workers", type=int, default=8, help="网络阶段的默认并发数 (默认: %(default)s)")
+    parser.add_argument("--stage-workers", default="",
+                        help="单独设置各阶段线程数，例如 metadata=16,help_page=4。阶段: " + ", ".join(DEFAULT_STAGE_WORKERS))
+    parser.add_argument("--queue-size", type=int, default=64, help="阶段之间的队列长度 (默认: %(default)s)")
+    parser.add_argument("--send", action="store_true", help="处理完直接发送已找到邮箱的邮件（使用 email_config.json 中的 SMTP 配置）")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY_PATH,
+                        help="发行商通讯录文件，不存在时不使用 (默认: %(default)s)")
+    parser.add_argument("--import-directory", metavar="CSV",
+                        help="把 publishers.csv 格式的文件导入 --directory 指定的通讯录后退出")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="与 --import-directory 一起使用：覆盖通讯录中之前从 CSV 导入的同名发行商（手动保存的地址不受影响）")
+    parser.add_argument("--export-directory", metavar="CSV",
+                        help="把 --directory 指定的通讯录导出为 publishers.csv 格式后退出")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH,
+                        help="发送记录文件，用于标记冷却期内已联系过的发行商，不存在时不使用 (默认: %(default)s)")
+    parser.add_argument("--outbox", default=DEFAULT_OUTBOX_PATH, help="--send 使用的发件箱文件 (默认: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用本地 Steam 数据缓存")
+    parser.add_argument("--cache-ttl", type=float, metavar="DAYS",
+                        help="Steam 数据缓存的有效期（天），默认读取 email_config.json 中的 cache_ttl_days，未配置时为 7 天")
+    parser.add_argument("--offline", action="store_true",
+                        help="离线模式：只使用本地缓存（包括已过期的条目），不访问 Steam；也可在 email_config.json 中设置 offline")
+    parser.add_argument("--manifest", help="运行清单文件路径 (默认: runs/run-<时间>.jsonl)")
+    parser.add_argument("--no-manifest", action="store_true", help="不写运行清单")
+    parser.add_argument("--resume", metavar="MANIFEST",
+                        help="从运行清单恢复：跳过已完成的游戏，只处理失败或未处理的部分，忽略 input 和 --csv/--send")
+    parser.add_argument("--metrics-log", help="各阶段耗时记录 (JSONL) 的路径 (默认: 运行清单同名的 .metrics.jsonl)")
+    parser.add_argument("--prometheus", metavar="PATH",
+                        help="写出 Prometheus textfile 格式的耗时统计，运行中定期更新，可供 node_exporter 采集")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出调试日志")
+    return parser
+
+def parse_stage_workers(text: str) -> dict:
+    """解析 "metadata=16,help_page=4" 格式的阶段线程数。"""
+    stage_workers = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_STAGE_WORKERS or not value.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"无效的阶段线程数设置: {part}")
+        stage_workers[name] = int(value)
+    return stage_workers
+
+def open_input(path: str):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8")
+
+def write_result(result: dict, out=None):
+    out = out or sys.stdout
+    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    out.flush()
+
+def write_prometheus(path: str):
+    try:
+        metrics.registry.write_prometheus(path)
+    except OSError as e:
+        logger.error(f"写出 Prometheus 统计失败: {e}")
+
+def create_send_scheduler(email_manager):
+    """返回 OutboxSender 需要的调度器工厂，smtplib 等在真正发送时才导入。"""
+    def factory(on_result):
+        from send_scheduler import SendScheduler
+        return SendScheduler(email_manager, on_result=on_result)
+    return factory
+
+def run_directory_tool(args) -> int:
+    """执行 --import-directory / --export-directory，成功返回 0。"""
+    directory = None
+    try:
+        directory = PublisherDirectory(args.directory)
+        if args.import_directory:
+            imported = directory.import_csv(args.import_directory, overwrite=args.overwrite)
+            logger.info(f"通讯录 {args.directory} 现有 {directory.count()} 个发行商（本次导入 {imported} 个）。")
+        if args.export_directory:
+            directory.export_csv(args.export_directory)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"通讯录导入/导出失败: {e}")
+        return 1
+    finally:
+        if directory is not None:
+            directory.close()
+    return 0
+
+def main(argv: list = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        stage_workers = parse_stage_workers(args.stage_workers)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stderr
+    )
+    if args.import_directory or args.export_directory:
+        return run_directory_tool(args)
+
+    manifest = None
+    resume_from = None
+    unrecognized = []
+    if args.resume:
+        try:
+            manifest = RunManifest.load(args.resume)
+        except (OSError, ValueError) as e:
+            logger.error(f"无法读取运行清单: {e}")
+            return 2
+        summary = manifest.summary()
+        logger.info(f"恢复运行清单 {args.resume}: 共 {summary['total']} 个游戏，已完成 {summary['done']}，"
+                    f"失败 {summary['failed']}，未开始 {summary['not_started']}")
+        jobs = manifest.pending_jobs()
+        resume_from = manifest.resume_points()
+        logger.info(f"其中 {len(resume_from)} 个游戏从上次完成的阶段之后继续。")
+        csv_path = manifest.options.get("csv", args.csv)
+        send = manifest.options.get("send", False)
+    else:
+        try:
+            with open_input(args.input) as source:
+                groups, unrecognized = classify_urls(source)
+        except OSError as e:
+            logger.error(f"无法读取输入: {e}")
+            return 2
+        unrecognized.extend(flatten_group(groups.pop(None, {})))
+        jobs = {appid: flatten_group(kinds) for appid, kinds in groups.items()}
+        csv_path = args.csv
+        send = args.send
+        if not args.no_manifest and jobs:
+            try:
+                manifest = RunManifest.create(args.manifest or default_manifest_path(), jobs,
+                                              {"csv": os.path.abspath(csv_path), "send": send})
+            except OSError as e:
+                logger.error(f"无法创建运行清单: {e}")
+                return 2
+
+    # 同一进程中多次运行时，统计只包含本次运行
+    metrics.registry.reset()
+    metrics_log = args.metrics_log
+    if metrics_log is None and manifest is not None:
+        metrics_log = os.path.splitext(manifest.path)[0] + ".metrics.jsonl"
+    if metrics_log:
+        try:
+            metrics.registry.open_log(metrics_log)
+        except OSError as e:
+            logger.error(f"无法创建耗时记录: {e}")
+            return 2
+
+    email_manager = EmailManager()
+    offline = args.offline or email_manager.is_offline()
+    if offline and args.no_cache:
+        logger.error("离线模式需要本地缓存，不能与 --no-cache 同时使用。")
+        return 2
+    cache = None
+    if not args.no_cache:
+        cache_ttl = args.cache_ttl * 24 * 3600 if args.cache_ttl is not None else email_manager.get_cache_ttl()
+        cache = SteamCache(ttl=cache_ttl) if cache_ttl is not None else SteamCache()
+    extractor = SteamInfoExtractor(max_workers=args.workers, cache=cache, offline=offline)
+    if offline:
+        logger.info("离线模式：只使用本地缓存，不访问 Steam。")
+    if os.path.exists(args.directory):
+        email_manager.publisher_directory = PublisherDirectory(args.directory)
+    if os.path.exists(args.history):
+        email_manager.sent_history = SentHistory(args.history)
+
+    outbox_sender = None
+    if send:
+        if not email_manager.get_smtp_accounts():
+            logger.error("没有可用的SMTP账号，请先在 email_config.json 中配置发件邮箱。")
+            return 2
+        outbox_sender = OutboxSender(Outbox(args.outbox), create_send_scheduler(email_manager))
+        outbox_sender.start()
+
+    for url in unrecognized:
+        result = new_result(None, [url])
+        result["error"] = "无法从链接中识别AppID"
+        write_result(result)
+
+    processor = BatchProcessor(extractor, email_manager, csv_path, max_workers=args.workers,
+                               stage_workers=stage_workers, queue_size=args.queue_size, outbox_sender=outbox_sender)
+    # 恢复运行时重做发送失败的游戏，发件箱中对应的失败邮件需要重新入队
+    processor.retry_failed_sends = bool(args.resume)
+    last_stats = time.monotonic()
+    try:
+        for result in processor.process_jobs(jobs, send=send, manifest=manifest, resume_from=resume_from):
+            write_result(result)
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                logger.info(f"队列深度: {processor.pipeline.format_stats()}")
+                if args.prometheus:
+                    write_prometheus(args.prometheus)
+    except TemplateError as e:
+        logger.error(f"邮件模板有误: {e}")
+        return 1
+    except KeyboardInterrupt:
+        logger.warning("已中断。")
+        return 130
+    finally:
+        if outbox_sender is not None:
+            outbox_sender.stop()
+            outbox_sender.outbox.close()
+        email_manager.close()
+        if manifest is not None:
+            manifest.close()
+        metrics.registry.close_log()
+        if args.prometheus:
+            write_prometheus(args.prometheus)
+        summary_text = metrics.registry.format_summary()
+        if summary_text:
+            logger.info("各阶段耗时:\n" + summary_text)
+    logger.info(f"处理完成，共 {len(jobs)} 个游戏，{len(unrecognized)} 个无法识别的链接。")
+    if manifest is not None:
+        summary = manifest.summary()
+        logger.info(f"运行清单 {manifest.path}: 已完成 {summary['done']}/{summary['total']}，失败 {summary['failed']}。"
+                    f"可用 --resume {manifest.path} 重试未完成的部分。")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
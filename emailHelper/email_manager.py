@@ -2,23 +2,71 @@
 import json
 import os
 import re
-import csv
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
+import threading
+import time
 import logging
 
+from publisher_index import PublisherIndex
+from publisher_matcher import split_publishers, DEFAULT_FUZZY_THRESHOLD
+from sent_history import DEFAULT_COOLDOWN_DAYS
+from template_compiler import compile_template, TemplateError, TEMPLATE_FIELDS
+from publisher_directory import SOURCE_MANUAL
+from metrics import span, SPAN_CSV_LOOKUP, SPAN_RENDER, OUTCOME_NOT_FOUND
+
+# 同一模板两次检查修改时间的最小间隔（秒）
+TEMPLATE_CHECK_INTERVAL = 1.0
+
+# 邮箱的匹配方式
+MATCH_EXACT = "exact"
+MATCH_FUZZY = "fuzzy"
+
 logger = logging.getLogger(__name__)
 
 class EmailManager:
     def __init__(self):
         self.templates_dir = "email_templates"
         self.config_file = "email_config.json"
-        self.email_config = {}
+        self._email_config = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._publisher_indexes = {}
+        self._publisher_indexes_lock = threading.Lock()
+        # 模糊匹配的最低相似度，设为 None 时关闭模糊匹配
+        self.fuzzy_threshold = DEFAULT_FUZZY_THRESHOLD
+        # 可选的 PublisherDirectory，手动保存的地址优先于 CSV
+        self.publisher_directory = None
+        # 可选的 SentHistory，用于跳过冷却期内已联系过的收件人
+        self.sent_history = None
+        # 已编译模板缓存: 模板类型 -> (CompiledTemplate, mtime_ns, 上次检查时间)
+        self._compiled_templates = {}
+        self._templates_lock = threading.Lock()
+        self._smtp_session = None
+        self._smtp_session_key = None
+        self._smtp_lock = threading.Lock()
 
         logger.debug("EmailManager 实例初始化。")
-        self._ensure_templates_exist()
-        self._load_email_config()
+
+    def load(self):
+        """
+        创建默认模板并读取邮件配置。构造时不读写磁盘，首次用到配置或模板时自动调用；
+        GUI 在窗口显示后于后台线程提前调用。
+        """
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._ensure_templates_exist()
+            self._load_email_config()
+            self._loaded = True
+
+    @property
+    def email_config(self) -> dict:
+        if not self._loaded:
+            self.load()
+        return self._email_config
+
+    @email_config.setter
+    def email_config(self, config: dict):
+        self._email_config = config
 
     def _ensure_templates_exist(self):
         if not os.path.exists(self.templates_dir):
@@ -39,6 +87,8 @@ class EmailManager:
                     f.write(default_content)
 
     def get_template_content(self, template_type: str) -> str:
+        if not self._loaded:
+            self.load()
         template_path = os.path.join(self.templates_dir, f"{template_type}.txt")
         try:
             with open(template_path, "r", encoding="utf-8") as f:
@@ -51,16 +101,64 @@ class EmailManager:
             return ""
 
     def save_template_content(self, template_type: str, content: str) -> bool:
+        if not self._loaded:
+            self.load()
         template_path = os.path.join(self.templates_dir, f"{template_type}.txt")
+        try:
+            compile_template(template_type, content.strip())
+        except TemplateError as e:
+            logger.error(f"模板未保存: {e}")
+            return False
         try:
             with open(template_path, "w", encoding="utf-8") as f:
                 f.write(content)
+            self._invalidate_template(template_type)
             logger.info(f"模板已保存: {template_path}")
             return True
         except Exception as e:
             logger.exception(f"保存模板失败: {template_path}")
             return False
 
+    def validate_template(self, template_type: str, content: str) -> str:
+        """检查模板内容，有错误时返回错误说明，没有错误时返回 None。"""
+        try:
+            compile_template(template_type, content.strip())
+            return None
+        except TemplateError as e:
+            return str(e)
+
+    def get_compiled_template(self, template_type: str):
+        """
+        返回已编译的模板。模板文件修改时间变化或通过 save_template_content 保存后重新编译。
+        模板中有未知占位符时抛出 TemplateError。
+        """
+        template_path = os.path.join(self.templates_dir, f"{template_type}.txt")
+        now = time.monotonic()
+        with self._templates_lock:
+            cached = self._compiled_templates.get(template_type)
+            if cached and now - cached[2] < TEMPLATE_CHECK_INTERVAL:
+                return cached[0]
+            try:
+                mtime_ns = os.stat(template_path).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if cached and cached[1] == mtime_ns:
+                self._compiled_templates[template_type] = (cached[0], mtime_ns, now)
+                return cached[0]
+
+            compiled = compile_template(template_type, self.get_template_content(template_type))
+            self._compiled_templates[template_type] = (compiled, mtime_ns, now)
+            logger.debug(f"模板已编译: {template_type}，占位符: {compiled.fields}")
+            return compiled
+
+    def compile_templates(self):
+        """编译全部模板，批量处理前调用可以在开始前发现模板错误。"""
+        return {template_type: self.get_compiled_template(template_type) for template_type in TEMPLATE_FIELDS}
+
+    def _invalidate_template(self, template_type: str):
+        with self._templates_lock:
+            self._compiled_templates.pop(template_type, None)
+
     def _load_email_config(self):
         try:
             with open(self.config_file, "r", encoding="utf-8") as f:
@@ -80,6 +178,7 @@ class EmailManager:
         try:
             with open(self.config_file, "w", encoding="utf-8") as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
+            self.email_config = config
             logger.info(f"邮件配置已保存: {self.config_file}")
             return True
         except Exception as e:
@@ -89,15 +188,15 @@ class EmailManager:
     def construct_email_content(self, to_email: str, game_name: str, publisher_name: str, appid: str, steam_url: str) -> dict:
         """
         构造邮件内容，包括主题、发件人显示名称和正文。
+        模板有错误时抛出 TemplateError。
         """
-        subject_template = self.get_template_content("subject")
-        body_template = self.get_template_content("body")
-        from_email_display_template = self.get_template_content("from")
+        values = {"game_name": game_name, "publisher_name": publisher_name, "appid": appid, "steam_url": steam_url}
 
         # 替换占位符
-        subject = subject_template.format(game_name=game_name, publisher_name=publisher_name, appid=appid)
-        body = body_template.format(game_name=game_name, publisher_name=publisher_name, appid=appid, steam_url=steam_url)
-        from_email_display = from_email_display_template.format(game_name=game_name, publisher_name=publisher_name, appid=appid)
+        with span(SPAN_RENDER):
+            subject = self.get_compiled_template("subject").render(values)
+            body = self.get_compiled_template("body").render(values)
+            from_email_display = self.get_compiled_template("from").render(values)
 
         # 获取发件人邮箱地址（从配置中读取）
         smtp_username = self.email_config.get("smtp", {}).get("username", "")
@@ -114,72 +213,210 @@ class EmailManager:
             "body": body
         }
 
-    def send_email(self, to_email: str, subject: str, body: str, from_email_display: str) -> tuple[bool, str]:
+    def get_smtp_accounts(self) -> list:
+        """
+        返回所有发件账号配置。优先使用 smtp_accounts 列表，没有时使用单个 smtp 配置。
+        每个账号可选 rate_per_minute（每分钟发送数）和 daily_quota（每日额度）。
+        """
+        accounts = self.email_config.get("smtp_accounts")
+        if not accounts:
+            smtp_config = self.email_config.get("smtp", {})
+            accounts = [smtp_config] if smtp_config else []
+        required = ("host", "port", "username", "password")
+        valid = [account for account in accounts if all(account.get(name) for name in required)]
+        if len(valid) < len(accounts):
+            logger.warning(f"有 {len(accounts) - len(valid)} 个SMTP账号配置不完整，已忽略。")
+        return valid
+
+    def build_from_header(self, from_email_display: str) -> tuple[str, str]:
+        """
+        解析 "显示名称 <邮箱地址>"，返回 (编码后的 From 头, 发件邮箱地址)。
+        批量生成邮件时同一发件人只需调用一次。
+        """
+        from email.utils import formataddr
+        match = re.match(r"^(.*?) <(.*?)>$", from_email_display)
+        if match:
+            display_name = match.group(1).strip()
+            from_email = match.group(2).strip()
+        else:
+            display_name = from_email_display # 如果格式不匹配，则直接使用整个字符串作为显示名称
+            from_email = self.email_config.get("smtp", {}).get("username", "") # 并使用配置中的邮箱地址
+        return formataddr((display_name, from_email), charset='utf-8'), from_email
+
+    def build_message(self, to_email: str, subject: str, body: str, from_header: str) -> "MIMEText":
+        """构造 MIME 邮件。from_header 为 build_from_header 返回的 From 头。"""
+        # email.mime 和 smtplib 只在生成或发送邮件时才导入，不拖慢程序启动
+        from email.mime.text import MIMEText
+        from email.header import Header
+        msg = MIMEText(body, 'plain', 'utf-8')
+        msg['From'] = from_header
+        msg['To'] = to_email
+        msg['Subject'] = Header(subject, 'utf-8')
+        return msg
+
+    def get_cooldown_days(self) -> float:
+        """同一收件人两次联系之间的最少天数，配置为 0 时不限制。"""
+        try:
+            return float(self.email_config.get("cooldown_days", DEFAULT_COOLDOWN_DAYS))
+        except (TypeError, ValueError):
+            logger.warning(f"配置中的 cooldown_days 无效，使用默认值 {DEFAULT_COOLDOWN_DAYS}。")
+            return DEFAULT_COOLDOWN_DAYS
+
+    def get_cache_ttl(self):
+        """配置中 Steam 数据缓存的有效期（秒），未配置或无效时返回 None，使用 SteamCache 的默认值。"""
+        value = self.email_config.get("cache_ttl_days")
+        if value is None:
+            return None
+        try:
+            return float(value) * 24 * 3600
+        except (TypeError, ValueError):
+            logger.warning("配置中的 cache_ttl_days 无效，使用默认缓存有效期。")
+            return None
+
+    def is_offline(self) -> bool:
+        """配置中是否开启离线模式（只读取缓存，不访问 Steam）。"""
+        return bool(self.email_config.get("offline", False))
+
+    def check_cooldown(self, to_email: str):
+        """收件人在冷却期内已联系过时返回说明文字，否则返回 None。"""
+        cooldown_days = self.get_cooldown_days()
+        if self.sent_history is None or cooldown_days <= 0 or not to_email:
+            return None
+        last_sent = self.sent_history.contacted_within(to_email, cooldown_days)
+        if last_sent is None:
+            return None
+        last_sent_text = time.strftime("%Y-%m-%d", time.localtime(last_sent))
+        return f"{to_email} 已于 {last_sent_text} 联系过，仍在 {cooldown_days:g} 天冷却期内。"
+
+    def record_sent(self, to_email: str, appid: str = None):
+        if self.sent_history is not None:
+            self.sent_history.record(to_email, appid)
+
+    def send_email(self, to_email: str, subject: str, body: str, from_email_display: str, appid: str = None) -> tuple[bool, str]:
         """
         发送邮件。
         from_email_display: 包含显示名称和邮箱地址的字符串，例如 "显示名称 <邮箱地址>"
+        收件人在冷却期内已联系过时不发送。
         """
+        cooldown_message = self.check_cooldown(to_email)
+        if cooldown_message:
+            logger.warning(f"跳过发送: {cooldown_message}")
+            return False, cooldown_message
+
         smtp_config = self.email_config.get("smtp", {})
         smtp_host = smtp_config.get("host")
         smtp_port = smtp_config.get("port")
         smtp_username = smtp_config.get("username")
         smtp_password = smtp_config.get("password")
-        use_tls = smtp_config.get("use_tls", True)
 
         if not all([smtp_host, smtp_port, smtp_username, smtp_password]):
             logger.error("SMTP配置不完整，请检查配置。")
             return False, "SMTP配置不完整，请检查配置。"
 
         try:
-            # 解析发件人显示名称和邮箱地址
-            match = re.match(r"^(.*?) <(.*?)>$", from_email_display)
-            if match:
-                display_name = match.group(1).strip()
-                from_email = match.group(2).strip()
-            else:
-                display_name = from_email_display # 如果格式不匹配，则直接使用整个字符串作为显示名称
-                from_email = smtp_username # 并使用配置中的邮箱地址
-
-            msg = MIMEText(body, 'plain', 'utf-8')
-            msg['From'] = Header(display_name, 'utf-8')
-            msg['To'] = to_email
-            msg['Subject'] = Header(subject, 'utf-8')
-
-            server = smtplib.SMTP_SSL(smtp_host, smtp_port) if use_tls else smtplib.SMTP(smtp_host, smtp_port)
-            if use_tls:
-                server.connect(smtp_host, smtp_port) # 显式调用 connect
-            else:
-                server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.sendmail(from_email, [to_email], msg.as_string())
-            server.quit()
+            from_header, from_email = self.build_from_header(from_email_display)
+            msg = self.build_message(to_email, subject, body, from_header)
+
+            # 复用已登录的连接，避免每封邮件都重新握手和登录
+            self._get_smtp_session(smtp_config).send(from_email, [to_email], msg.as_string())
 
             logger.info(f"邮件发送成功，收件人: {to_email}")
+            self.record_sent(to_email, appid)
             return True, "邮件发送成功！"
 
         except Exception as e:
             logger.exception(f"邮件发送失败，收件人: {to_email}")
             return False, str(e)
             
-    def get_email(self, game_name: str, publisher_name: str, csv_path: str) -> str:
+    def _get_smtp_session(self, smtp_config: dict) -> "SMTPSession":
+        """返回与当前 SMTP 配置对应的会话，配置变化时关闭旧连接。"""
+        from smtp_session import SMTPSession
+        key = tuple(smtp_config.get(name) for name in ("host", "port", "username", "password", "use_tls"))
+        with self._smtp_lock:
+            if self._smtp_session is None or self._smtp_session_key != key:
+                if self._smtp_session is not None:
+                    self._smtp_session.close()
+                self._smtp_session = SMTPSession.from_config(smtp_config)
+                self._smtp_session_key = key
+            return self._smtp_session
+
+    def close(self):
+        """关闭复用中的 SMTP 连接。"""
+        with self._smtp_lock:
+            if self._smtp_session is not None:
+                self._smtp_session.close()
+                self._smtp_session = None
+                self._smtp_session_key = None
+
+    def get_email(self, game_name: str, publisher_name: str, csv_path: str, appid: str = None) -> str:
         """
-        从 CSV 文件中查找发行商的邮箱地址。
+        从 CSV 文件中查找发行商的邮箱地址。CSV 只在首次查询或文件变化时加载一次。
+        依次尝试：归一化后的完整名称、拆分后的单个发行商名、三元组模糊匹配。
+        配置了发行商通讯录时，先按 AppID 和发行商名查找通讯录。
         """
+        return self.find_email(game_name, publisher_name, csv_path, appid)[0]
+
+    def find_email(self, game_name: str, publisher_name: str, csv_path: str, appid: str = None) -> tuple:
+        """与 get_email 相同，返回 (邮箱, 匹配方式)，模糊匹配到的邮箱为 MATCH_FUZZY，找不到时为 (None, None)。"""
+        with span(SPAN_CSV_LOOKUP) as timing:
+            email, match = self._find_email(game_name, publisher_name, csv_path, appid)
+            if not email:
+                timing.outcome = OUTCOME_NOT_FOUND
+            return email, match
+
+    def _find_email(self, game_name: str, publisher_name: str, csv_path: str, appid: str = None) -> tuple:
+        if self.publisher_directory is not None:
+            entry = (appid and self.publisher_directory.get_by_appid(appid)) \
+                or self.publisher_directory.get_by_publisher(publisher_name)
+            # 只有手动保存的地址优先于 CSV；从 CSV 导入的旧副本不能掩盖 CSV 的修改或用户另选的 CSV
+            if entry and entry["source"] == SOURCE_MANUAL:
+                logger.info(f"在发行商通讯录中找到 {game_name} (发行商: {publisher_name}) 的邮箱地址: {entry['email']}")
+                return entry["email"], MATCH_EXACT
+
         try:
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row['Publisher'].strip() == publisher_name.strip():
-                        logger.info(f"找到 {game_name} (发行商: {publisher_name}) 的邮箱地址: {row['Email']}")
-                        return row['Email'].strip()
-                logger.warning(f"未找到 {game_name} (发行商: {publisher_name}) 的邮箱地址")
-                return None
+            index = self._get_publisher_index(csv_path)
+            email = index.lookup(publisher_name)
+            if email:
+                logger.info(f"找到 {game_name} (发行商: {publisher_name}) 的邮箱地址: {email}")
+                return email, MATCH_EXACT
+
+            # 多个发行商拼接的名称，逐个查找
+            names = split_publishers(publisher_name)
+            if len(names) > 1:
+                for name in names:
+                    email = index.lookup(name)
+                    if email:
+                        logger.info(f"通过发行商 '{name}' 找到 {game_name} 的邮箱地址: {email}")
+                        return email, MATCH_EXACT
+
+            if self.fuzzy_threshold is not None:
+                for name in names:
+                    candidates = index.fuzzy_candidates(name, limit=1)
+                    if candidates and candidates[0][0] >= self.fuzzy_threshold:
+                        score, matched_name = candidates[0]
+                        email = index.lookup(matched_name)
+                        if email:
+                            logger.warning(f"模糊匹配: '{name}' -> '{matched_name}' (相似度 {score:.2f})，邮箱地址: {email}")
+                            return email, MATCH_FUZZY
+
+            logger.warning(f"未找到 {game_name} (发行商: {publisher_name}) 的邮箱地址")
+            return None, None
         except FileNotFoundError:
             logger.error(f"CSV 文件未找到: {csv_path}")
-            return None
+            return None, None
         except Exception as e:
             logger.exception(f"查找邮箱地址时发生错误: {e}")
-            return None
+            return None, None
+
+    def _get_publisher_index(self, csv_path: str) -> PublisherIndex:
+        """每个 CSV 文件共用一个索引，文件变化时由索引自行重新加载。"""
+        key = os.path.abspath(csv_path)
+        with self._publisher_indexes_lock:
+            index = self._publisher_indexes.get(key)
+            if index is None:
+                index = PublisherIndex(key)
+                self._publisher_indexes[key] = index
+            return index
 
 # 示例用法 (仅用于测试此模块)
 if __name__ == "__main__":
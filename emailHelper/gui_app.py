@@ -1,16 +1,28 @@
 # gui_app.py
+import time
+# 开始导入的时间，--measure-startup 据此计算导入耗时
+IMPORT_STARTED_AT = time.perf_counter()
 import tkinter as tk
-import requests
 import logging
 import os
+import sys
+import threading
 
 from ui.input_frame import InputFrame
 from ui.info_frame import InfoFrame
 from ui.email_frame import EmailFrame
 from ui.button_frame import ButtonFrame
+from ui.ui_queue import UIUpdateQueue
 
 from steam_info_extractor import SteamInfoExtractor
+from steam_cache import SteamCache
+from publisher_directory import PublisherDirectory, DEFAULT_DIRECTORY_PATH
+from sent_history import SentHistory
 from email_manager import EmailManager
+from batch_processor import EMAIL_SOURCE_HELP_PAGE, EMAIL_SOURCE_FUZZY, STATUS_RECENTLY_CONTACTED, rerender_results
+from template_compiler import TemplateError
+from outbox import Outbox, OutboxSender, STATE_QUEUED, STATE_SENT, STATE_FAILED
+from task_runner import TaskRunner
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -31,23 +43,137 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
 DEFAULT_CSV_FILENAME = "publishers.csv"
+STARTUP_TASK = "startup"
+# 设置该环境变量或使用 --measure-startup 参数时，输出启动各阶段耗时后退出
+MEASURE_STARTUP_ENV = "STEAM_HELPER_MEASURE_STARTUP"
+# 发行商邮箱标签按来源着色，其余来源为绿色
+EMAIL_SOURCE_COLORS = {
+    EMAIL_SOURCE_HELP_PAGE: "purple",
+    EMAIL_SOURCE_FUZZY: "dark orange",
+}
+
+def ensure_default_csv():
+    if os.path.exists(DEFAULT_CSV_FILENAME):
+        logger.info(f"默认CSV文件 '{DEFAULT_CSV_FILENAME}' 已存在。")
+        return
+    try:
+        with open(DEFAULT_CSV_FILENAME, "w", encoding="utf-8", newline="") as f:
+            f.write("Publisher,Email\n")
+            f.write("Valve,contact@valvesoftware.com\n")
+            f.write("CD Projekt Red,pr@cdprojektred.com\n")
+            f.write("Ubisoft,press@ubisoft.com\n")
+            f.write("Paradox Interactive,press@paradoxplaza.com\n")
+            f.write("EnderAvaritia,ender.avaritia@example.com\n")
+            f.write("Alice Publication,alice.pub@example.com\n")
+            f.write("Eternal Alice Media,eternal.alice@example.com\n")
+        logger.info(f"已创建默认CSV文件: {DEFAULT_CSV_FILENAME}")
+    except Exception as e:
+        logger.error(f"创建默认CSV文件失败: {e}")
 
 class SteamEmailApp(tk.Tk):
-    def __init__(self):
+    """
+    主窗口。启动时只创建控件，窗口显示后再在后台读取模板和配置、打开缓存、发送历史、发件箱等 SQLite 文件
+    并预先导入 requests/lxml；处理任务开始前等待 ready，在此之前处理和发送按钮保持禁用。
+    """
+    def __init__(self, measure_startup: bool = False):
+        init_started_at = time.perf_counter()
         super().__init__()
         self.title("Steam 发行商邮件助手")
         self.geometry("800x700")
 
+        # 缓存、发送历史和发件箱在窗口显示后由后台初始化打开
         self.extractor = SteamInfoExtractor()
         self.email_manager = EmailManager()
+        # 后台初始化（通讯录、发件箱等）完成后置位
+        self.ready = threading.Event()
+        # 所有后台任务共用固定数量的线程，可以取消
+        self.task_runner = TaskRunner()
+        self.outbox = None
+        self.outbox_sender = None
 
         self._create_widgets()
+        self._set_buttons_state("disabled")
+        # 工作线程对界面的所有更新都经由该队列，在主线程中按帧合并执行
+        self.ui_queue = UIUpdateQueue(self)
+        self.ui_queue.start()
         self._update_status("准备就绪，请输入Steam URL。", "info")
         logger.info("应用程序启动。")
 
         # 保存游戏名和发行商名，以便在修改邮箱地址时使用
         self.game_name = ""
         self.steam_publisher_name = ""
+        # 主窗口当前显示的结果字典，修改模板或配置后据此重新渲染，无需重新抓取
+        self.current_result = None
+        self.batch_window = None
+
+        self.measure_startup = measure_startup
+        self._startup_times = {
+            "import_ms": (init_started_at - IMPORT_STARTED_AT) * 1000,
+            "init_ms": (time.perf_counter() - init_started_at) * 1000,
+        }
+        self._init_started_at = init_started_at
+        # 第一轮空闲任务中 Tk 完成窗口的映射和绘制，之后的第一个定时器即为窗口已显示
+        self.after_idle(lambda: self.after(0, self._on_window_shown))
+
+    def _on_window_shown(self):
+        self._startup_times["shown_ms"] = (time.perf_counter() - self._init_started_at) * 1000
+        logger.info("启动耗时：导入 {import_ms:.0f} ms，创建窗口 {init_ms:.0f} ms，窗口显示 {shown_ms:.0f} ms".format(
+            **self._startup_times))
+        self.task_runner.submit(STARTUP_TASK, self._run_startup_logic)
+
+    def _run_startup_logic(self, task):
+        """窗口显示后在后台执行的初始化：读取模板和配置、打开各个 SQLite 文件、预先导入网络相关模块。"""
+        started_at = time.perf_counter()
+        try:
+            try:
+                ensure_default_csv()
+                self.email_manager.load()
+                self.email_manager.publisher_directory = self._open_publisher_directory()
+                self._open_stores()
+            finally:
+                # 处理和发送只依赖以上几项，不必等预先导入完成
+                self.ready.set()
+                self.ui_queue.call(self._set_buttons_state, "normal")
+            self.extractor.warm_up()
+        except Exception:
+            logger.exception("后台初始化失败。")
+        finally:
+            self._startup_times["background_ms"] = (time.perf_counter() - started_at) * 1000
+            self.ui_queue.call(self._on_startup_finished)
+
+    def _open_stores(self):
+        """打开 appdetails 缓存、发送历史和发件箱，并启动发件线程继续发送上次未发完的邮件。"""
+        cache_ttl = self.email_manager.get_cache_ttl()
+        self.extractor.cache = SteamCache(ttl=cache_ttl) if cache_ttl is not None else SteamCache()
+        self.extractor.offline = self.email_manager.is_offline()
+        self.email_manager.sent_history = SentHistory()
+        outbox = Outbox()
+        self.outbox_sender = OutboxSender(
+            outbox,
+            self._create_send_scheduler,
+            on_result=self._on_outbox_result
+        )
+        self.outbox = outbox
+        self.outbox_sender.start()
+
+    def _on_startup_finished(self):
+        logger.info(f"后台初始化完成，耗时 {self._startup_times['background_ms']:.0f} ms。")
+        if self.measure_startup:
+            print(" ".join(f"{name}={value:.1f}" for name, value in self._startup_times.items()))
+            self.quit()
+
+    def _create_send_scheduler(self, on_result):
+        # smtplib 等只在发件箱真正有邮件要发时才导入
+        from send_scheduler import SendScheduler
+        return SendScheduler(self.email_manager, on_result=on_result)
+
+    def _open_publisher_directory(self):
+        """打开发行商通讯录。通讯录只保存手动修改的地址，CSV 中的地址直接从 CSV 查找，不导入。"""
+        try:
+            return PublisherDirectory(DEFAULT_DIRECTORY_PATH)
+        except Exception as e:
+            logger.exception(f"打开发行商通讯录失败: {e}")
+            return None
 
     def _create_widgets(self):
         self.input_frame = InputFrame(self, self)
@@ -74,24 +200,33 @@ class SteamEmailApp(tk.Tk):
 
     def _update_status(self, message: str, message_type: str = "info"):
         """
-        更新状态栏信息。
+        更新状态栏信息（需在主线程调用，工作线程请使用 post_status）。
         message_type: "info", "warning", "error", "success"
         """
-        color = "black"
+        self._log_status(message, message_type)
+        self._set_status_label(message, message_type)
+        self.update_idletasks()
+
+    def post_status(self, message: str, message_type: str = "info", log: bool = True):
+        """
+        从任意线程更新状态栏。消息立即写入日志，状态栏在下一帧只显示最新的一条。
+        高频的进度消息可以传 log=False，只更新状态栏。
+        """
+        if log:
+            self._log_status(message, message_type)
+        self.ui_queue.post("status", self._set_status_label, message, message_type)
+
+    def _log_status(self, message: str, message_type: str):
         if message_type == "error":
-            color = "red"
             logger.error(message)
         elif message_type == "warning":
-            color = "orange"
             logger.warning(message)
-        elif message_type == "success":
-            color = "green"
+        else: # info, success
             logger.info(message)
-        else: # info
-            logger.info(message)
-        
+
+    def _set_status_label(self, message: str, message_type: str):
+        color = {"error": "red", "warning": "orange", "success": "green"}.get(message_type, "black")
         self.input_frame.status_label.config(text=message, fg=color)
-        self.update_idletasks()
 
     # 以下方法移动到对应的 Frame 类中，只保留调用
     def _paste_from_clipboard(self):
@@ -106,25 +241,114 @@ class SteamEmailApp(tk.Tk):
     def _configure_email_window(self):
         self.input_frame._configure_email_window()
 
-    def _start_process_url_thread(self):
-        self.input_frame._start_process_url_thread()
+    def _start_process_url_task(self):
+        self.input_frame._start_process_url_task()
+
+    def _queue_email(self):
+        self.button_frame._queue_email()
+
+    def _on_outbox_result(self, entry: dict, success: bool, message: str):
+        """发件箱每处理完一封邮件调用一次（在后台线程中）。"""
+        if success:
+            state = STATE_SENT
+        elif entry["attempts"] >= self.outbox_sender.max_attempts:
+            state = STATE_FAILED
+        else:
+            state = STATE_QUEUED
+        # 一帧内的多次状态更新合并为一次表格刷新
+        self.ui_queue.append("send_state", self.set_send_states, (entry["appid"], state))
+        counts = self.outbox.counts()
+        summary = f"待发 {counts[STATE_QUEUED]}，已发送 {counts[STATE_SENT]}，失败 {counts[STATE_FAILED]}"
+        if success:
+            self.post_status(f"邮件已发送至 {entry['to_email']}。发件箱：{summary}", "success")
+        else:
+            self.post_status(f"发往 {entry['to_email']} 的邮件发送失败: {message}。发件箱：{summary}", "warning")
 
-    def _run_process_url_logic(self):
-        self.input_frame._run_process_url_logic()
+    def set_send_state(self, appid: str, state: str):
+        """在批量结果表格中更新该游戏的发送状态（需在主线程调用）。"""
+        self.set_send_states([(appid, state)])
 
-    def _start_send_email_thread(self):
-        self.button_frame._start_send_email_thread()
+    def set_send_states(self, updates: list):
+        """一次更新多个游戏的发送状态，updates 为按发生顺序排列的 (appid, state)（需在主线程调用）。"""
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.set_send_states(updates)
 
-    def _run_send_email_logic(self):
-        self.button_frame._run_send_email_logic()
+    def close(self):
+        """退出前停止后台发件线程并关闭连接。"""
+        self.task_runner.shutdown(timeout=5)
+        self.ui_queue.stop()
+        if self.outbox_sender is not None:
+            self.outbox_sender.stop(timeout=5)
+        if self.outbox is not None:
+            self.outbox.close()
+        self.email_manager.close()
+        if self.email_manager.sent_history is not None:
+            self.email_manager.sent_history.close()
+        if self.extractor.cache is not None:
+            self.extractor.cache.close()
 
     def _clear_output_fields(self):
         self.info_frame._clear_output_fields()
         self.email_frame._clear_email_fields()
 
+    def _show_game_result(self, result: dict):
+        """把批量处理中某个游戏的结果显示到信息和邮件区域（需在主线程调用）。"""
+        self._clear_output_fields()
+        self.current_result = result
+        self.game_name = result["game_name"]
+        self.steam_publisher_name = result["publisher_name"]
+
+        self.info_frame.appid_label.config(text=result["appid"])
+        self.info_frame.game_name_label.config(text=result["game_name"])
+        if result["publisher_email"]:
+            email_color = EMAIL_SOURCE_COLORS.get(result["email_source"], "green")
+            self.info_frame.publisher_email_label.config(text=result["publisher_email"], fg=email_color)
+            self.info_frame.publisher_name_label.config(text=result["publisher_name"], fg="blue")
+        else:
+            self.info_frame.publisher_email_label.config(text="未找到该发行商的邮箱", fg="red")
+            self.info_frame.publisher_name_label.config(text=f"{result['publisher_name']} (未匹配到邮箱)", fg="red")
+
+        email = result["email"]
+        if email:
+            self.email_frame.email_subject_label.config(text=email["subject"])
+            self.email_frame.email_to_label.config(text=email["to_email"])
+            self.email_frame.email_from_label.config(text=email["from_email"])
+            self.email_frame.email_text_area.insert(tk.END, email["body"])
+        if result["status"] == STATUS_RECENTLY_CONTACTED:
+            self._update_status(f"AppID {result['appid']}: {result['error']}", "warning")
+        elif not email and result["error"]:
+            self._update_status(f"AppID {result['appid']} 处理失败: {result['error']}", "error")
+
+    def _rerender_results(self, results: list = None):
+        """
+        修改模板、发件配置或发行商信息后，用已缓存的游戏和发行商信息重新生成邮件，不重新抓取。
+        results 省略时重新渲染主窗口当前结果和批量结果窗口中的全部结果。
+        """
+        if results is None:
+            results = []
+            if self.batch_window is not None and self.batch_window.winfo_exists():
+                results.extend(self.batch_window.results)
+            if self.current_result is not None and all(r is not self.current_result for r in results):
+                results.append(self.current_result)
+        if not results:
+            return
+        start = time.perf_counter()
+        try:
+            count = rerender_results(self.email_manager, results)
+        except TemplateError as e:
+            self._update_status(f"邮件模板有误，未能重新生成邮件: {e}", "error")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.refresh_results(results)
+        if self.current_result is not None and any(r is self.current_result for r in results):
+            self._show_game_result(self.current_result)
+        self._update_status(f"已按新设置重新生成 {count} 封邮件（{elapsed_ms:.0f} ms，未重新获取数据）。", "success")
+
     def _clear_fields(self):
         self.input_frame._clear_input_fields()
         self._clear_output_fields()
+        self.current_result = None
         self._update_status("所有字段已清空，准备就绪。", "info")
         logger.info("所有输入和输出字段已清空。")
 
@@ -135,23 +359,8 @@ class SteamEmailApp(tk.Tk):
         self.info_frame._edit_publisher_email()
 
 if __name__ == "__main__":
-    if not os.path.exists(DEFAULT_CSV_FILENAME):
-        try:
-            with open(DEFAULT_CSV_FILENAME, "w", encoding="utf-8", newline="") as f:
-                f.write("Publisher,Email\n")
-                f.write("Valve,contact@valvesoftware.com\n")
-                f.write("CD Projekt Red,pr@cdprojektred.com\n")
-                f.write("Ubisoft,press@ubisoft.com\n")
-                f.write("Paradox Interactive,press@paradoxplaza.com\n")
-                f.write("EnderAvaritia,ender.avaritia@example.com\n")
-                f.write("Alice Publication,alice.pub@example.com\n")
-                f.write("Eternal Alice Media,eternal.alice@example.com\n")
-            logger.info(f"已创建默认CSV文件: {DEFAULT_CSV_FILENAME}")
-        except Exception as e:
-            logger.error(f"创建默认CSV文件失败: {e}")
-    else:
-        logger.info(f"默认CSV文件 '{DEFAULT_CSV_FILENAME}' 已存在。")
-
-    app = SteamEmailApp()
+    measure_startup = "--measure-startup" in sys.argv[1:] or bool(os.environ.get(MEASURE_STARTUP_ENV))
+    app = SteamEmailApp(measure_startup=measure_startup)
     app.mainloop()
+    app.close()
     logger.info("应用程序退出。")
@@ -0,0 +1,215 @@
+# metrics.py
+"""
+各处理阶段的耗时统计。
+
+    from metrics import span
+
+    with span("appdetails") as s:
+        ...
+        s.outcome = "cache_hit"   # 可选，默认正常结束为 ok，抛出异常为 error
+
+耗时按 (阶段, 结果) 汇总到直方图，可以随时取 p50/p99；
+打开运行日志后每个 span 追加一行 JSON，结束时可写出 Prometheus textfile 格式的计数器和直方图，
+供 node_exporter 的 textfile collector 采集。
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上限（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 每个 (阶段, 结果) 保留的原始样本上限，超过后随机替换，用于计算分位数
+MAX_SAMPLES = 50000
+METRIC_PREFIX = "steam_helper"
+DEFAULT_PROMETHEUS_FILENAME = "steam_helper.prom"
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_CACHE_HIT = "cache_hit"
+OUTCOME_NOT_FOUND = "not_found"
+
+# 各阶段名称
+SPAN_URL_PARSE = "url_parse"
+SPAN_APPDETAILS = "appdetails"
+SPAN_CSV_LOOKUP = "csv_lookup"
+SPAN_HELP_PAGE = "help_page"
+SPAN_RENDER = "render"
+SPAN_SMTP_CONNECT = "smtp_connect"
+SPAN_SMTP_LOGIN = "smtp_login"
+SPAN_SMTP_SEND = "smtp_send"
+
+class _Series:
+    __slots__ = ("bucket_counts", "count", "sum", "max", "samples")
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = []
+
+class Span:
+    """一次计时，用作上下文管理器。可在退出前设置 outcome 标记结果（例如 cache_hit）。"""
+    __slots__ = ("metrics", "name", "outcome", "_started_at")
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+        self.outcome = None
+        self._started_at = 0.0
+
+    def __enter__(self):
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started_at
+        outcome = OUTCOME_ERROR if exc_type is not None else (self.outcome or OUTCOME_OK)
+        self.metrics.record(self.name, elapsed, outcome)
+        return False
+
+class Metrics:
+    """线程安全的耗时统计。"""
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS, max_samples: int = MAX_SAMPLES):
+        self.buckets = tuple(sorted(buckets))
+        self.max_samples = max_samples
+        self._series = {}
+        self._lock = threading.Lock()
+        self._log = None
+
+    def span(self, name: str) -> Span:
+        return Span(self, name)
+
+    def record(self, name: str, seconds: float, outcome: str = OUTCOME_OK):
+        key = (name, outcome)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series.bucket_counts[index] += 1
+                    break
+            series.count += 1
+            series.sum += seconds
+            series.max = max(series.max, seconds)
+            if len(series.samples) < self.max_samples:
+                series.samples.append(seconds)
+            else:
+                # 蓄水池抽样，样本数固定时仍能代表全部记录
+                slot = random.randrange(series.count)
+                if slot < self.max_samples:
+                    series.samples[slot] = seconds
+            if self._log is not None:
+                self._log.write(json.dumps({"ts": round(time.time(), 3), "stage": name, "outcome": outcome,
+                                            "ms": round(seconds * 1000, 3)}) + "\n")
+
+    def open_log(self, path: str):
+        """开始把每个 span 追加写入 JSONL 运行日志，已打开的日志先关闭。"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._lock:
+            self._close_log_locked()
+            self._log = open(path, "a", encoding="utf-8")
+        logger.info(f"耗时记录写入: {path}")
+
+    def close_log(self):
+        with self._lock:
+            self._close_log_locked()
+
+    def _close_log_locked(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def summary(self) -> list:
+        """各 (阶段, 结果) 的 {"stage", "outcome", "count", "p50", "p99", "max", "mean"}，耗时单位为秒。"""
+        with self._lock:
+            items = [(key, series.count, series.sum, series.max, sorted(series.samples))
+                     for key, series in self._series.items()]
+        rows = []
+        for (name, outcome), count, total, maximum, samples in sorted(items):
+            rows.append({
+                "stage": name,
+                "outcome": outcome,
+                "count": count,
+                "p50": percentile(samples, 50),
+                "p99": percentile(samples, 99),
+                "max": maximum,
+                "mean": total / count if count else 0.0,
+            })
+        return rows
+
+    def format_summary(self) -> str:
+        lines = []
+        for row in self.summary():
+            lines.append(f"{row['stage']:<13} {row['outcome']:<9} 次数 {row['count']:>7}  "
+                         f"p50 {row['p50'] * 1000:9.2f} ms  p99 {row['p99'] * 1000:9.2f} ms  "
+                         f"最大 {row['max'] * 1000:9.2f} ms")
+        return "\n".join(lines)
+
+    def format_prometheus(self) -> str:
+        with self._lock:
+            items = sorted((key, list(series.bucket_counts), series.count, series.sum)
+                           for key, series in self._series.items())
+        duration = f"{METRIC_PREFIX}_stage_duration_seconds"
+        total = f"{METRIC_PREFIX}_stage_total"
+        lines = [
+            f"# HELP {duration} 各处理阶段耗时（秒）",
+            f"# TYPE {duration} histogram",
+        ]
+        for (name, outcome), bucket_counts, count, seconds in items:
+            labels = f'stage="{name}",outcome="{outcome}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{duration}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{duration}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{duration}_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"{duration}_count{{{labels}}} {count}")
+        lines.append(f"# HELP {total} 各处理阶段执行次数")
+        lines.append(f"# TYPE {total} counter")
+        for (name, outcome), _, count, _ in items:
+            lines.append(f'{total}{{stage="{name}",outcome="{outcome}"}} {count}')
+        lines.append(f"# HELP {METRIC_PREFIX}_metrics_written_timestamp_seconds 写出统计的时间")
+        lines.append(f"# TYPE {METRIC_PREFIX}_metrics_written_timestamp_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_metrics_written_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """写出 Prometheus textfile 格式。先写临时文件再替换，采集方不会读到写了一半的文件。"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.format_prometheus())
+        os.replace(temp_path, path)
+        logger.info(f"耗时统计已写入: {path}")
+
+def default_log_path(runs_dir: str) -> str:
+    return os.path.join(runs_dir, time.strftime("metrics-%Y%m%d-%H%M%S.jsonl"))
+
+def percentile(sorted_samples: list, q: float) -> float:
+    """已排序样本的第 q 百分位数（最近秩法），没有样本时返回 0。"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_samples) * q / 100))
+    return sorted_samples[rank - 1]
+
+# 进程内共用的统计，各模块通过 span() 记录
+registry = Metrics()
+
+def span(name: str) -> Span:
+    return registry.span(name)
@@ -0,0 +1,330 @@
+# outbox.py
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_PATH = "outbox.sqlite3"
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 30.0
+MAX_RETRY_DELAY = 3600.0
+IDLE_POLL_INTERVAL = 5.0
+# wait_for 检查发件线程或调用方是否已停止的间隔
+WAIT_POLL_INTERVAL = 1.0
+
+# 发件箱状态
+STATE_QUEUED = "queued"
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+
+def idempotency_key(appid: str, recipient: str) -> str:
+    """同一游戏发给同一收件人只算一封邮件。"""
+    return hashlib.sha1(f"{appid}|{recipient.strip().lower()}".encode("utf-8")).hexdigest()
+
+class Outbox:
+    """
+    基于 SQLite 的持久化发件箱。每封邮件经历 queued → sending → sent/failed，
+    以 (AppID, 收件人) 生成的幂等键去重，重复入队不会产生第二封邮件。
+
+    程序在发送中途退出时，状态为 sending 的邮件会在下次启动时重新入队。
+    为了让这一小段窗口内的重发可以被识别，每封邮件的 Message-ID 由幂等键固定生成。
+    """
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 状态变化必须在返回前落盘
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idem_key TEXT NOT NULL UNIQUE,
+                appid TEXT,
+                to_email TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                from_email TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox (state, next_attempt_at)")
+        self._conn.commit()
+        self._recover()
+
+    def _recover(self):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET state = ?, updated_at = ? WHERE state = ?",
+                (STATE_QUEUED, time.time(), STATE_SENDING)
+            )
+        if cursor.rowcount:
+            logger.warning(f"发件箱中有 {cursor.rowcount} 封邮件在上次运行时发送中断，已重新入队。")
+
+    def enqueue(self, appid: str, to_email: str, subject: str, body: str, from_email: str) -> tuple:
+        """
+        加入发件箱，返回 (是否新加入, 当前状态)。
+        已存在同一 (AppID, 收件人) 的邮件时不会重复加入。
+        """
+        key = idempotency_key(appid or "", to_email)
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute("""
+                INSERT OR IGNORE INTO outbox
+                    (idem_key, appid, to_email, subject, body, from_email, state, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, appid, to_email, subject, body, from_email, STATE_QUEUED, now, now, now))
+            if cursor.rowcount:
+                return True, STATE_QUEUED
+            state = self._conn.execute("SELECT state FROM outbox WHERE idem_key = ?", (key,)).fetchone()[0]
+        logger.info(f"发件箱中已有 AppID {appid} 发往 {to_email} 的邮件（状态: {state}），不再重复加入。")
+        return False, state
+
+    def enqueue_many(self, entries) -> list:
+        """
+        在一个事务中加入多封邮件，entries 为 (appid, to_email, subject, body, from_email) 序列。
+        返回新加入的邮件在 entries 中的下标，已存在的 (AppID, 收件人) 会被跳过。
+        """
+        now = time.time()
+        added = []
+        with self._lock, self._conn:
+            for index, (appid, to_email, subject, body, from_email) in enumerate(entries):
+                cursor = self._conn.execute("""
+                    INSERT OR IGNORE INTO outbox
+                        (idem_key, appid, to_email, subject, body, from_email, state, next_attempt_at, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (idempotency_key(appid or "", to_email), appid, to_email, subject, body, from_email,
+                      STATE_QUEUED, now, now, now))
+                if cursor.rowcount:
+                    added.append(index)
+        return added
+
+    def claim(self, limit: int = 1) -> list:
+        """取出最多 limit 封到期的待发邮件，并标记为 sending。"""
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute("""
+                SELECT id, idem_key, appid, to_email, subject, body, from_email, attempts
+                FROM outbox WHERE state = ? AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?
+            """, (STATE_QUEUED, now, limit)).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(STATE_SENDING, now, row[0]) for row in rows]
+                )
+        fields = ("id", "idem_key", "appid", "to_email", "subject", "body", "from_email", "attempts")
+        return [dict(zip(fields, row), attempts=row[7] + 1) for row in rows]
+
+    def mark_sent(self, entry_id: int):
+        self._set_state(entry_id, STATE_SENT, None)
+
+    def mark_failed(self, entry_id: int, error: str, retry_delay: float = None):
+        """记录一次失败。给出 retry_delay 时重新入队等待重试，否则标记为 failed。"""
+        if retry_delay is None:
+            self._set_state(entry_id, STATE_FAILED, error)
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (STATE_QUEUED, error, now + retry_delay, now, entry_id)
+            )
+
+    def requeue(self, appid: str, to_email: str) -> bool:
+        """把该 (AppID, 收件人) 发送失败的邮件重新入队并重新计算重试次数，返回是否重新入队。"""
+        key = idempotency_key(appid or "", to_email)
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET state = ?, attempts = 0, next_attempt_at = ?, updated_at = ? "
+                "WHERE idem_key = ? AND state = ?",
+                (STATE_QUEUED, now, now, key, STATE_FAILED)
+            )
+        return cursor.rowcount > 0
+
+    def retry_failed(self) -> list:
+        """把所有 failed 的邮件重新入队，重新计算重试次数，返回这些邮件的 AppID。"""
+        now = time.time()
+        with self._lock, self._conn:
+            appids = [row[0] for row in self._conn.execute(
+                "SELECT appid FROM outbox WHERE state = ?", (STATE_FAILED,)
+            )]
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE state = ?",
+                (STATE_QUEUED, now, now, STATE_FAILED)
+            )
+        return appids
+
+    def next_due_in(self) -> float:
+        """距离下一封待发邮件到期的秒数，没有待发邮件时返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE state = ?", (STATE_QUEUED,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def get_state(self, appid: str, to_email: str) -> tuple:
+        """该 (AppID, 收件人) 的 (状态, 最近一次错误)，不在发件箱中时返回 (None, None)。"""
+        key = idempotency_key(appid or "", to_email)
+        with self._lock:
+            row = self._conn.execute("SELECT state, last_error FROM outbox WHERE idem_key = ?", (key,)).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        counts = {STATE_QUEUED: 0, STATE_SENDING: 0, STATE_SENT: 0, STATE_FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def _set_state(self, entry_id: int, state: str, error):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (state, error, time.time(), entry_id)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class OutboxSender:
+    """
+    后台发件线程：不断从发件箱取出到期的邮件，交给 SendScheduler 发送，
+    失败时按带抖动的指数退避重新入队，超过 max_attempts 次后标记为 failed。
+    on_result(entry, success, message) 在工作线程中调用。
+    """
+    def __init__(self, outbox: Outbox, scheduler_factory, on_result=None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY):
+        self.outbox = outbox
+        self.scheduler_factory = scheduler_factory
+        self.on_result = on_result
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        # 幂等键 -> [完成事件, (是否成功, 说明)]，供 wait_for 等待某封邮件的最终结果
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """有新邮件入队时调用，立即开始发送。"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait_for(self, appid: str, to_email: str, cancelled=None) -> tuple:
+        """
+        等待该 (AppID, 收件人) 的邮件发送成功或多次失败后被放弃，返回 (是否成功, 说明)。
+        失败后等待重试的过程也包括在内。发件线程停止或 cancelled() 返回 True 时不再等待，
+        邮件仍留在发件箱中，之后继续发送。
+        """
+        key = idempotency_key(appid or "", to_email)
+        with self._waiters_lock:
+            waiter = self._waiters.setdefault(key, [threading.Event(), None])
+        try:
+            # 先登记再查状态，登记之前已经结束的邮件也不会漏掉
+            state, error = self.outbox.get_state(appid, to_email)
+            if state == STATE_SENT:
+                return True, "此前已发送过，未重复发送。"
+            if state == STATE_FAILED:
+                return False, error or "发件箱中已标记为发送失败"
+            if state is None:
+                return False, "邮件不在发件箱中"
+            while not waiter[0].wait(WAIT_POLL_INTERVAL):
+                if self._stopping.is_set() or (cancelled is not None and cancelled()):
+                    return False, "已停止等待，邮件仍在发件箱中，之后会继续发送"
+            return waiter[1]
+        finally:
+            with self._waiters_lock:
+                if self._waiters.get(key) is waiter:
+                    del self._waiters[key]
+
+    def _run(self):
+        scheduler = None
+        try:
+            while not self._stopping.is_set():
+                due_in = self.outbox.next_due_in()
+                if due_in is None or due_in > 0:
+                    self._wakeup.wait(IDLE_POLL_INTERVAL if due_in is None else min(due_in, IDLE_POLL_INTERVAL))
+                    self._wakeup.clear()
+                    continue
+
+                if scheduler is None:
+                    try:
+                        scheduler = self.scheduler_factory(self._on_scheduler_result)
+                    except ValueError as e:
+                        logger.error(f"发件箱无法开始发送: {e}")
+                        self._wakeup.wait(IDLE_POLL_INTERVAL)
+                        self._wakeup.clear()
+                        continue
+
+                entries = self.outbox.claim(limit=max(1, len(scheduler.accounts) * 2))
+                for entry in entries:
+                    scheduler.submit({
+                        "to_email": entry["to_email"],
+                        "subject": entry["subject"],
+                        "body": entry["body"],
+                        "from_email": entry["from_email"],
+                        "message_id": f"<{entry['idem_key']}@steam-curator-outbox>",
+                        "appid": entry["appid"],
+                        "entry": entry,
+                    })
+                # 等待这一批处理完，期间仍可响应停止请求
+                while not scheduler.join(timeout=1.0):
+                    if self._stopping.is_set():
+                        return
+        except Exception:
+            logger.exception("发件箱后台线程异常退出。")
+        finally:
+            if scheduler is not None:
+                scheduler.shutdown()
+
+    def _on_scheduler_result(self, job: dict, success: bool, message: str, username):
+        entry = job["entry"]
+        if success:
+            self.outbox.mark_sent(entry["id"])
+        elif entry["attempts"] >= self.max_attempts:
+            logger.error(f"发件箱邮件多次发送失败，已放弃 (AppID: {entry['appid']}, 收件人: {entry['to_email']}): {message}")
+            self.outbox.mark_failed(entry["id"], message)
+        else:
+            ceiling = min(MAX_RETRY_DELAY, self.base_delay * (2 ** (entry["attempts"] - 1)))
+            delay = random.uniform(ceiling / 2, ceiling)
+            logger.warning(f"发件箱邮件发送失败，{delay:.0f} 秒后重试 (第 {entry['attempts']} 次, 收件人: {entry['to_email']}): {message}")
+            self.outbox.mark_failed(entry["id"], message, retry_delay=delay)
+        if success or entry["attempts"] >= self.max_attempts:
+            with self._waiters_lock:
+                waiter = self._waiters.get(entry["idem_key"])
+            if waiter is not None:
+                waiter[1] = (success, message)
+                waiter[0].set()
+        if self.on_result is not None:
+            try:
+                self.on_result(entry, success, message)
+            except Exception:
+                logger.exception("发件箱结果回调出错")
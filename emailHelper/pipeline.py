@@ -0,0 +1,193 @@
+# pipeline.py
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+# 队列满或空时等待的间隔，期间检查是否已停止
+POLL_INTERVAL = 0.2
+
+_STOP = object()
+
+class Stage:
+    """
+    流水线中的一个阶段。func(item) 处理一个元素并返回是否继续交给下一阶段，
+    返回 False 的元素直接作为结果输出。
+    """
+    def __init__(self, name: str, func, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.active = 0
+        self.done = 0
+        self._exited = 0
+
+class Pipeline:
+    """
+    多阶段并发流水线。每个阶段有自己的工作线程数，阶段之间用有界队列连接：
+    下游阶段处理不过来时队列被填满，上游阶段的 put 会阻塞，从而把压力一直传回输入端，
+    内存占用只与队列大小有关，与元素总数无关。
+
+    on_error(item, exc) 在阶段函数抛出异常时调用，该元素随后作为结果输出。
+    on_stage_done(stage_name, item) 在某个阶段处理完一个元素、要交给下一阶段继续处理时调用（在工作线程中）；
+    阶段函数返回 False、抛出异常或是最后一个阶段时不调用，此时元素直接作为结果输出。
+
+    cancel() 之后不再开始处理新的元素，正在阶段函数中处理的元素完成当前阶段后直接作为结果输出，
+    run() 把它们全部产出后结束；仍在队列中排队的元素被丢弃。
+    """
+    def __init__(self, stages: list, on_error=None, output_size: int = DEFAULT_QUEUE_SIZE, on_stage_done=None):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段。")
+        self.stages = stages
+        self.on_error = on_error
+        self.on_stage_done = on_stage_done
+        self._output = queue.Queue(maxsize=output_size)
+        # 已请求取消：不再开始新的元素
+        self._stopping = threading.Event()
+        # 已停止：run() 的调用方不再读取结果，所有线程立即退出
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running_workers = 0
+
+    def run(self, items):
+        """
+        把 items 送入流水线，按完成顺序逐个产出结果。
+        取消后先产出正在处理的元素，再结束迭代。
+        调用方提前停止迭代（break 或异常）时，流水线会停止并丢弃尚未处理完的元素。
+        """
+        self._start(items)
+        try:
+            while True:
+                try:
+                    item = self._output.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    # 工作线程先输出元素再退出，全部退出且输出队列为空时，取消前在处理的元素都已产出
+                    if self._stopping.is_set() and self._idle() and self._output.empty():
+                        break
+                    continue
+                if item is _STOP:
+                    break
+                yield item
+        finally:
+            self.stop()
+
+    def stop(self):
+        """停止所有阶段并等待线程退出，尚未处理完的元素被丢弃。不能在阶段函数中调用。"""
+        self.cancel()
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+
+    def cancel(self):
+        """请求停止，不等待；可以在任何线程中调用。run() 会在正在处理的元素输出后结束。"""
+        self._stopping.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopping.is_set()
+
+    def stats(self) -> list:
+        """各阶段的 (名称, 队列中数量, 处理中数量, 已完成数量)，用于调整并发数和队列大小。"""
+        with self._lock:
+            return [(stage.name, stage.queue.qsize(), stage.active, stage.done) for stage in self.stages]
+
+    def format_stats(self) -> str:
+        return " | ".join(f"{name} 排队 {queued} 处理中 {active} 完成 {done}"
+                          for name, queued, active, done in self.stats())
+
+    def _idle(self) -> bool:
+        with self._lock:
+            return self._running_workers == 0
+
+    def _start(self, items):
+        feeder = threading.Thread(target=self._feed, args=(items,), name="pipeline-feed", daemon=True)
+        self._threads.append(feeder)
+        self._running_workers = sum(stage.workers for stage in self.stages)
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), daemon=True,
+                                          name=f"pipeline-{stage.name}-{n}")
+                self._threads.append(thread)
+        for thread in self._threads:
+            thread.start()
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """阻塞写入队列，直到成功或流水线停止。"""
+        while not self._stopping.is_set():
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _emit(self, target: queue.Queue, item):
+        """
+        把处理完的元素交给下一阶段或输出。取消后（包括正在等待下一阶段队列时）改为直接输出，
+        下一阶段不会再处理它；只有 run() 的调用方不再读取结果时才放弃。
+        """
+        while not self._closed.is_set():
+            if self._stopping.is_set():
+                target = self._output
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _feed(self, items):
+        first = self.stages[0]
+        try:
+            for item in items:
+                if self._stopping.is_set() or not self._put(first.queue, item):
+                    return
+        except Exception:
+            logger.exception("读取流水线输入时出错")
+        for _ in range(first.workers):
+            self._put(first.queue, _STOP)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while not self._stopping.is_set():
+            try:
+                item = stage.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                break
+
+            with self._lock:
+                stage.active += 1
+            try:
+                keep_going = stage.func(item)
+                if keep_going and not is_last and self.on_stage_done is not None:
+                    self.on_stage_done(stage.name, item)
+            except Exception as e:
+                logger.exception(f"流水线阶段 {stage.name} 处理出错")
+                if self.on_error is not None:
+                    self.on_error(item, e)
+                keep_going = False
+            with self._lock:
+                stage.active -= 1
+                stage.done += 1
+
+            target = self._output if (is_last or not keep_going) else self.stages[index + 1].queue
+            self._emit(target, item)
+
+        with self._lock:
+            stage._exited += 1
+            self._running_workers -= 1
+            last_worker = stage._exited == stage.workers
+        # 本阶段最后一个退出的线程负责通知下一阶段结束；取消时各阶段自行退出，不需要通知
+        if last_worker and not self._stopping.is_set():
+            if is_last:
+                self._put(self._output, _STOP)
+            else:
+                following = self.stages[index + 1]
+                for _ in range(following.workers):
+                    self._put(following.queue, _STOP)
@@ -0,0 +1,192 @@
+# publisher_directory.py
+import csv
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from publisher_matcher import normalize_publisher_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY_PATH = "publishers.sqlite3"
+CSV_FIELDS = ["Publisher", "Email"]
+
+# 地址来源：手动保存的优先于 CSV；从 CSV 导入的行只作备份，查找时不覆盖 CSV 本身
+SOURCE_MANUAL = "manual"
+SOURCE_CSV = "csv"
+
+class PublisherDirectory:
+    """
+    基于 SQLite 的发行商通讯录。按归一化发行商名存储，一行一个发行商；
+    AppID 单独存放在 publisher_apps 表中，同一发行商可以对应多个游戏。
+    修改单个地址只需一次事务内的 upsert，不再重写整个 CSV；
+    同时支持与现有 publishers.csv 格式互相导入导出，导入的行标记为 csv 来源。
+    """
+    def __init__(self, path: str = DEFAULT_DIRECTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # 多个进程（GUI 与批处理）同时写入时，由 SQLite 的文件锁保证一致，这里只需等待锁释放
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS publishers (
+                norm_name TEXT PRIMARY KEY,
+                publisher TEXT NOT NULL,
+                email TEXT NOT NULL,
+                appid TEXT,
+                game_name TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_publishers_email ON publishers (email)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS publisher_apps (
+                appid TEXT PRIMARY KEY,
+                norm_name TEXT NOT NULL,
+                game_name TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._migrate()
+        self._conn.commit()
+        logger.debug(f"发行商通讯录已打开: {path}")
+
+    def _migrate(self):
+        """旧版本的通讯录没有 source 列，AppID 记在 publishers 表中。"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(publishers)")}
+        if "source" in columns:
+            return
+        self._conn.execute(f"ALTER TABLE publishers ADD COLUMN source TEXT NOT NULL DEFAULT '{SOURCE_MANUAL}'")
+        # 旧版本从 CSV 导入的行不带 AppID 和游戏名，手动保存的行总会带上
+        self._conn.execute("UPDATE publishers SET source = ? WHERE appid IS NULL AND game_name IS NULL",
+                           (SOURCE_CSV,))
+        self._conn.execute("""
+            INSERT OR IGNORE INTO publisher_apps (appid, norm_name, game_name, updated_at)
+            SELECT appid, norm_name, game_name, updated_at FROM publishers WHERE appid IS NOT NULL
+        """)
+        logger.info(f"发行商通讯录已升级: {self.path}")
+
+    def upsert(self, publisher: str, email: str, appid: str = None, game_name: str = None) -> bool:
+        """新增或更新一个发行商的邮箱（手动来源）。提供 appid 时记录该游戏属于这个发行商。"""
+        norm_name = normalize_publisher_name(publisher)
+        if not norm_name or not email:
+            logger.warning(f"发行商名或邮箱为空，跳过保存: {publisher!r} {email!r}")
+            return False
+        try:
+            now = time.time()
+            with self._lock, self._conn:
+                self._conn.execute("""
+                    INSERT INTO publishers (norm_name, publisher, email, appid, game_name, updated_at, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(norm_name) DO UPDATE SET
+                        publisher = excluded.publisher,
+                        email = excluded.email,
+                        appid = COALESCE(excluded.appid, publishers.appid),
+                        game_name = COALESCE(excluded.game_name, publishers.game_name),
+                        updated_at = excluded.updated_at,
+                        source = excluded.source
+                """, (norm_name, publisher.strip(), email.strip(), appid, game_name, now, SOURCE_MANUAL))
+                if appid:
+                    self._conn.execute("""
+                        INSERT INTO publisher_apps (appid, norm_name, game_name, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(appid) DO UPDATE SET
+                            norm_name = excluded.norm_name,
+                            game_name = COALESCE(excluded.game_name, publisher_apps.game_name),
+                            updated_at = excluded.updated_at
+                    """, (str(appid), norm_name, game_name, now))
+            logger.info(f"已保存发行商 '{publisher}' 的邮箱: {email}")
+            return True
+        except sqlite3.Error:
+            logger.exception(f"保存发行商 '{publisher}' 的邮箱失败")
+            return False
+
+    def delete(self, publisher: str) -> bool:
+        norm_name = normalize_publisher_name(publisher)
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM publishers WHERE norm_name = ?", (norm_name,))
+            self._conn.execute("DELETE FROM publisher_apps WHERE norm_name = ?", (norm_name,))
+        return cursor.rowcount > 0
+
+    def get_by_publisher(self, publisher: str) -> dict:
+        return self._fetch_one("norm_name = ?", normalize_publisher_name(publisher))
+
+    def get_by_appid(self, appid: str) -> dict:
+        if not appid:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT norm_name FROM publisher_apps WHERE appid = ?", (str(appid),)).fetchone()
+        return self._fetch_one("norm_name = ?", row[0]) if row else None
+
+    def get_by_email(self, email: str) -> dict:
+        return self._fetch_one("email = ? ORDER BY updated_at DESC", email.strip())
+
+    def _fetch_one(self, where: str, value) -> dict:
+        """按条件返回一行，找不到时返回 None。"""
+        if not value:
+            return None
+        fields = ("publisher", "email", "appid", "game_name", "updated_at", "source")
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(fields)} FROM publishers WHERE {where} LIMIT 1", (value,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(fields, row))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM publishers").fetchone()[0]
+
+    def import_csv(self, csv_path: str, overwrite: bool = False) -> int:
+        """
+        从 publishers.csv 格式（Publisher,Email）导入，整个文件在一个事务中完成。
+        导入的行标记为 csv 来源，查找邮箱时不会覆盖 CSV 文件本身的内容。
+        overwrite 为 False 时不覆盖通讯录中已有的发行商；为 True 时也只覆盖 csv 来源的行，手动保存的地址保留。
+        返回导入的行数。
+        """
+        now = time.time()
+        conflict = "DO UPDATE SET publisher = excluded.publisher, email = excluded.email, " \
+                   f"updated_at = excluded.updated_at WHERE publishers.source = '{SOURCE_CSV}'" \
+            if overwrite else "DO NOTHING"
+
+        def rows():
+            with open(csv_path, "r", encoding="utf-8-sig", newline="") as csvfile:
+                for row in csv.DictReader(csvfile):
+                    publisher = (row.get("Publisher") or "").strip()
+                    email = (row.get("Email") or "").strip()
+                    norm_name = normalize_publisher_name(publisher)
+                    if norm_name and email:
+                        yield norm_name, publisher, email, now, SOURCE_CSV
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT INTO publishers (norm_name, publisher, email, updated_at, source) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT(norm_name) {conflict}",
+                rows()
+            )
+            imported = self._conn.total_changes - before
+        logger.info(f"已从 {csv_path} 导入 {imported} 个发行商")
+        return imported
+
+    def export_csv(self, csv_path: str) -> int:
+        """导出为 publishers.csv 格式，先写临时文件再替换，避免导出中断时损坏原文件。"""
+        temp_path = csv_path + ".tmp"
+        exported = 0
+        with self._lock:
+            cursor = self._conn.execute("SELECT publisher, email FROM publishers ORDER BY publisher")
+            with open(temp_path, "w", encoding="utf-8", newline="") as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(CSV_FIELDS)
+                for row in cursor:
+                    writer.writerow(row)
+                    exported += 1
+        os.replace(temp_path, csv_path)
+        logger.info(f"已导出 {exported} 个发行商到 {csv_path}")
+        return exported
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
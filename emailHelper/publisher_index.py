@@ -0,0 +1,347 @@
+# publisher_index.py
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import logging
+from array import array
+
+from publisher_matcher import normalize_publisher_name, TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# 旁路索引文件格式：
+#   文件头: 魔数, 版本, CSV mtime_ns, CSV 大小, 条目数, Publisher 列号, Email 列号
+#   条目:   (发行商名哈希, 该行在 CSV 中的字节偏移)，按哈希排序
+SIDECAR_SUFFIX = ".idx"
+SIDECAR_MAGIC = b"PUBIDX\0\0"
+SIDECAR_VERSION = 2
+HEADER_STRUCT = struct.Struct("<8sIqqQHH")
+ENTRY_STRUCT = struct.Struct("<QQ")
+
+# 三元组旁路索引文件格式（<csv>.tri），同样绑定 CSV 的修改时间和大小：
+#   文件头: 魔数, 版本, CSV mtime_ns, CSV 大小, 名称数, 三元组数, 倒排条目数, 名称区字节数
+#   名称表: (名称在名称区中的偏移, 字节数, 三元组个数)
+#   三元组表: (三元组哈希, 倒排起始位置, 倒排长度)，按哈希排序
+#   倒排区: 名称编号 (uint32)
+#   名称区: UTF-8 编码的归一化名称
+TRIGRAM_SUFFIX = ".tri"
+TRIGRAM_MAGIC = b"PUBTRI\0\0"
+TRIGRAM_VERSION = 1
+TRIGRAM_HEADER_STRUCT = struct.Struct("<8sIqqQQQQ")
+NAME_STRUCT = struct.Struct("<QII")
+GRAM_STRUCT = struct.Struct("<QQI")
+POSTING_STRUCT = struct.Struct("<I")
+
+def name_hash(normalized_name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalized_name.encode("utf-8"), digest_size=8).digest(), "little")
+
+def file_signature(path: str) -> tuple:
+    """返回文件的 (mtime, size)，用于判断文件是否变化。"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _read_record(f) -> tuple:
+    """
+    从二进制文件的当前位置读取一条 CSV 记录（引号内可以包含换行），
+    返回 (字段列表, 记录起始偏移)；到达文件末尾时返回 (None, 偏移)。
+    """
+    offset = f.tell()
+    data = f.readline()
+    if not data:
+        return None, offset
+    while data.count(b'"') % 2 == 1:
+        more = f.readline()
+        if not more:
+            break
+        data += more
+    text = data.decode("utf-8-sig" if offset == 0 else "utf-8", errors="replace")
+    fields = next(csv.reader([text]), [])
+    return fields, offset
+
+class TrigramSidecar(TrigramIndex):
+    """
+    mmap 打开的三元组旁路索引，查询方式与内存中的 TrigramIndex 相同，
+    但只读取查询用到的倒排和候选名称，不需要重新读取 CSV。
+    """
+    def __init__(self, mm, name_count: int, gram_count: int, posting_count: int):
+        self._mmap = mm
+        self._name_count = name_count
+        self._gram_count = gram_count
+        self._names_start = TRIGRAM_HEADER_STRUCT.size
+        self._grams_start = self._names_start + name_count * NAME_STRUCT.size
+        self._postings_start = self._grams_start + gram_count * GRAM_STRUCT.size
+        self._blob_start = self._postings_start + posting_count * POSTING_STRUCT.size
+
+    def posting(self, gram: str):
+        target = name_hash(gram)
+        lo, hi = 0, self._gram_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if GRAM_STRUCT.unpack_from(self._mmap, self._grams_start + mid * GRAM_STRUCT.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self._gram_count:
+            return None
+        gram_hash, start, length = GRAM_STRUCT.unpack_from(self._mmap, self._grams_start + lo * GRAM_STRUCT.size)
+        if gram_hash != target:
+            return None
+        return struct.unpack_from(f"<{length}I", self._mmap, self._postings_start + start * POSTING_STRUCT.size)
+
+    def name(self, name_id: int) -> str:
+        offset, size, _ = NAME_STRUCT.unpack_from(self._mmap, self._names_start + name_id * NAME_STRUCT.size)
+        start = self._blob_start + offset
+        return self._mmap[start:start + size].decode("utf-8")
+
+    def gram_count(self, name_id: int) -> int:
+        return NAME_STRUCT.unpack_from(self._mmap, self._names_start + name_id * NAME_STRUCT.size)[2]
+
+    def close(self):
+        self._mmap.close()
+
+class PublisherIndex:
+    """
+    发行商邮箱 CSV 的索引，以归一化的发行商名为键。
+
+    首次加载时在 CSV 旁生成一个排序好的二进制旁路索引（<csv>.idx），记录发行商名哈希
+    与行偏移，并绑定 CSV 的修改时间和大小。之后只需 mmap 该文件、二分查找哈希，再回到
+    CSV 中读取对应的那一行，启动耗时和常驻内存都不随 CSV 大小增长。
+    CSV 变化时自动重建；旁路文件无法写入时退回到完整的内存字典。
+    模糊匹配用的三元组索引同样写成旁路文件（<csv>.tri），每个版本的 CSV 只在第一次模糊查询时建立一次。
+    """
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self.sidecar_path = csv_path + SIDECAR_SUFFIX
+        self.trigram_path = csv_path + TRIGRAM_SUFFIX
+        self._signature = None
+        self._mmap = None
+        self._count = 0
+        self._publisher_col = 0
+        self._email_col = 1
+        self._emails = None
+        self._trigram_index = None
+        self._lock = threading.Lock()
+
+    def lookup(self, publisher_name: str) -> str:
+        """查找发行商的邮箱，找不到时返回 None。CSV 不存在时抛出 FileNotFoundError。"""
+        key = normalize_publisher_name(publisher_name)
+        if not key:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            if self._emails is not None:
+                return self._emails.get(key)
+            return self._lookup_sidecar(key)
+
+    def fuzzy_candidates(self, publisher_name: str, limit: int = 5) -> list:
+        """
+        返回与发行商名相似的 CSV 发行商 [(相似度, 归一化名称), ...]。
+        三元组旁路索引与当前 CSV 匹配时直接 mmap 打开；否则读取一遍 CSV 建立并写入旁路文件，CSV 变化后重建。
+        """
+        key = normalize_publisher_name(publisher_name)
+        if not key:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            if self._trigram_index is None:
+                self._trigram_index = self._load_trigram_index()
+            return self._trigram_index.candidates(key, limit=limit)
+
+    def close(self):
+        with self._lock:
+            self._close_mmap()
+
+    def _ensure_loaded(self):
+        signature = file_signature(self.csv_path)
+        if signature == self._signature:
+            return
+        self._close_mmap()
+        self._emails = None
+        if not self._open_sidecar(signature):
+            try:
+                self._build_sidecar(signature)
+            except OSError as e:
+                logger.warning(f"无法写入旁路索引 {self.sidecar_path}: {e}，改用内存索引。")
+                self._emails = self._load_dict()
+            else:
+                if not self._open_sidecar(signature):
+                    self._emails = self._load_dict()
+        self._signature = signature
+
+    def _close_mmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if isinstance(self._trigram_index, TrigramSidecar):
+            self._trigram_index.close()
+        self._trigram_index = None
+
+    def _open_sidecar(self, signature: tuple) -> bool:
+        """打开与当前 CSV 匹配的旁路索引，不存在或已过期时返回 False。"""
+        try:
+            with open(self.sidecar_path, "rb") as f:
+                header = f.read(HEADER_STRUCT.size)
+                if len(header) < HEADER_STRUCT.size:
+                    return False
+                magic, version, mtime_ns, size, count, publisher_col, email_col = HEADER_STRUCT.unpack(header)
+                if magic != SIDECAR_MAGIC or version != SIDECAR_VERSION or (mtime_ns, size) != signature:
+                    return False
+                if os.fstat(f.fileno()).st_size != HEADER_STRUCT.size + count * ENTRY_STRUCT.size:
+                    return False
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取旁路索引失败: {self.sidecar_path} - {e}")
+            return False
+        self._count = count
+        self._publisher_col = publisher_col
+        self._email_col = email_col
+        logger.debug(f"已打开旁路索引: {self.sidecar_path}，共 {count} 条")
+        return True
+
+    def _iter_rows(self):
+        """逐条读取 CSV，产出 (发行商名, 邮箱, 行偏移)，并记录表头中的列号。"""
+        with open(self.csv_path, "rb") as f:
+            header, _ = _read_record(f)
+            if not header:
+                return
+            header = [column.strip() for column in header]
+            self._publisher_col = header.index("Publisher")
+            self._email_col = header.index("Email")
+            while True:
+                fields, offset = _read_record(f)
+                if fields is None:
+                    break
+                if len(fields) <= max(self._publisher_col, self._email_col):
+                    continue
+                yield fields[self._publisher_col], fields[self._email_col].strip(), offset
+
+    def _build_sidecar(self, signature: tuple):
+        entries = []
+        for publisher, email, offset in self._iter_rows():
+            key = normalize_publisher_name(publisher)
+            if key and email:
+                entries.append((name_hash(key), offset))
+        # 同一哈希按偏移排序，保证同名发行商以第一行为准
+        entries.sort()
+
+        temp_path = self.sidecar_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER_STRUCT.pack(SIDECAR_MAGIC, SIDECAR_VERSION, signature[0], signature[1],
+                                       len(entries), self._publisher_col, self._email_col))
+            for entry in entries:
+                f.write(ENTRY_STRUCT.pack(*entry))
+        os.replace(temp_path, self.sidecar_path)
+        logger.info(f"已生成旁路索引: {self.sidecar_path}，共 {len(entries)} 个发行商")
+
+    def _load_dict(self) -> dict:
+        emails = {}
+        for publisher, email, _ in self._iter_rows():
+            key = normalize_publisher_name(publisher)
+            if key and email and key not in emails:
+                emails[key] = email
+        logger.info(f"已加载发行商索引: {self.csv_path}，共 {len(emails)} 个发行商")
+        return emails
+
+    def _entry(self, i: int) -> tuple:
+        return ENTRY_STRUCT.unpack_from(self._mmap, HEADER_STRUCT.size + i * ENTRY_STRUCT.size)
+
+    def _lookup_sidecar(self, key: str) -> str:
+        target = name_hash(key)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self._count or self._entry(lo)[0] != target:
+            return None
+
+        # 哈希相同的条目逐个回到 CSV 中核对发行商名，排除哈希碰撞
+        with open(self.csv_path, "rb") as f:
+            i = lo
+            while i < self._count:
+                entry_hash, offset = self._entry(i)
+                if entry_hash != target:
+                    break
+                f.seek(offset)
+                fields, _ = _read_record(f)
+                if fields and len(fields) > max(self._publisher_col, self._email_col) \
+                        and normalize_publisher_name(fields[self._publisher_col]) == key:
+                    return fields[self._email_col].strip()
+                i += 1
+        return None
+
+    def _load_trigram_index(self) -> TrigramIndex:
+        if self._emails is not None:
+            # 旁路索引不可写时名称已经在内存里，不再写三元组旁路文件
+            return TrigramIndex(self._emails)
+        index = self._open_trigram_sidecar(self._signature)
+        if index is not None:
+            return index
+        memory_index = TrigramIndex(dict.fromkeys(
+            normalize_publisher_name(publisher) for publisher, email, _ in self._iter_rows() if email))
+        try:
+            self._write_trigram_sidecar(memory_index, self._signature)
+        except OSError as e:
+            logger.warning(f"无法写入三元组旁路索引 {self.trigram_path}: {e}，改用内存索引。")
+            return memory_index
+        return self._open_trigram_sidecar(self._signature) or memory_index
+
+    def _open_trigram_sidecar(self, signature: tuple):
+        """打开与当前 CSV 匹配的三元组旁路索引，不存在或已过期时返回 None。"""
+        try:
+            with open(self.trigram_path, "rb") as f:
+                header = f.read(TRIGRAM_HEADER_STRUCT.size)
+                if len(header) < TRIGRAM_HEADER_STRUCT.size:
+                    return None
+                magic, version, mtime_ns, size, name_count, gram_count, posting_count, blob_size = \
+                    TRIGRAM_HEADER_STRUCT.unpack(header)
+                if magic != TRIGRAM_MAGIC or version != TRIGRAM_VERSION or (mtime_ns, size) != signature:
+                    return None
+                expected_size = (TRIGRAM_HEADER_STRUCT.size + name_count * NAME_STRUCT.size + gram_count * GRAM_STRUCT.size
+                                 + posting_count * POSTING_STRUCT.size + blob_size)
+                if os.fstat(f.fileno()).st_size != expected_size:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取三元组旁路索引失败: {self.trigram_path} - {e}")
+            return None
+        logger.debug(f"已打开三元组旁路索引: {self.trigram_path}，共 {name_count} 个名称")
+        return TrigramSidecar(mm, name_count, gram_count, posting_count)
+
+    def _write_trigram_sidecar(self, index: TrigramIndex, signature: tuple):
+        grams = sorted((name_hash(gram), posting) for gram, posting in index.postings())
+        encoded_names = [index.name(name_id).encode("utf-8") for name_id in range(len(index.names))]
+        posting_count = sum(len(posting) for _, posting in grams)
+        blob_size = sum(len(encoded) for encoded in encoded_names)
+
+        temp_path = self.trigram_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(TRIGRAM_HEADER_STRUCT.pack(TRIGRAM_MAGIC, TRIGRAM_VERSION, signature[0], signature[1],
+                                               len(encoded_names), len(grams), posting_count, blob_size))
+            offset = 0
+            for name_id, encoded in enumerate(encoded_names):
+                f.write(NAME_STRUCT.pack(offset, len(encoded), index.gram_count(name_id)))
+                offset += len(encoded)
+            start = 0
+            for gram_hash, posting in grams:
+                f.write(GRAM_STRUCT.pack(gram_hash, start, len(posting)))
+                start += len(posting)
+            for _, posting in grams:
+                posting = array("I", posting)
+                if sys.byteorder != "little":
+                    posting.byteswap()
+                f.write(posting.tobytes())
+            for encoded in encoded_names:
+                f.write(encoded)
+        os.replace(temp_path, self.trigram_path)
+        logger.info(f"已生成三元组旁路索引: {self.trigram_path}，共 {len(encoded_names)} 个名称、{len(grams)} 个三元组")
@@ -0,0 +1,134 @@
+# publisher_matcher.py
+import re
+import unicodedata
+import logging
+from array import array
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 发行商名末尾常见的公司类型后缀（归一化、去掉标点后的形式）
+LEGAL_SUFFIXES = {
+    "ltd", "limited", "inc", "incorporated", "llc", "llp", "lp", "plc", "corp", "corporation",
+    "co", "company", "gmbh", "ag", "kg", "ug", "ab", "oy", "as", "asa", "aps", "sa", "sas", "sarl",
+    "srl", "spa", "bv", "nv", "kk", "pty", "pte", "sro", "sp", "zoo", "kft", "doo", "ooo",
+}
+# 中日韩公司类型词，可能出现在名称的开头或结尾
+CJK_LEGAL_TERMS = (
+    "股份有限公司", "有限责任公司", "有限公司", "株式会社", "株式會社", "有限会社", "合同会社", "주식회사",
+)
+_PUNCT_REMOVE_PATTERN = re.compile(r"[.'’]")
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+_PUBLISHER_SPLIT_PATTERN = re.compile(r"\s*[,;/、，；]\s*|\s+&\s+")
+
+# 每次查询最多统计的倒排条目数。优先使用最稀有的三元组，热门三元组（如公共前缀）不参与粗筛
+MAX_POSTINGS_SCAN = 3000
+DEFAULT_FUZZY_THRESHOLD = 0.85
+
+def normalize_publisher_name(name: str) -> str:
+    """
+    发行商名归一化：Unicode NFKC、忽略大小写、去掉标点和公司类型后缀
+    （如 Ltd、Inc、GmbH、株式会社）。如果去掉后缀后为空，则保留后缀。
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKC", name).casefold()
+    basic = " ".join(text.split())
+
+    for term in CJK_LEGAL_TERMS:
+        text = text.replace(term, " ")
+    text = _PUNCT_REMOVE_PATTERN.sub("", text)
+    words = _NON_WORD_PATTERN.sub(" ", text).split()
+    while words and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+
+    if words:
+        return " ".join(words)
+    return _NON_WORD_PATTERN.sub(" ", basic).strip() or basic
+
+def split_publishers(name: str) -> list:
+    """
+    把多个发行商拼接的字符串（例如 get_game_info_from_appid 用 ", " 拼接的结果）拆成单个名称。
+    只剩公司类型后缀的片段（如 "Foo, Inc." 中的 "Inc."）会并回前一个名称。
+    """
+    if not name:
+        return []
+    parts = []
+    for part in _PUBLISHER_SPLIT_PATTERN.split(name):
+        part = part.strip()
+        if not part:
+            continue
+        words = _NON_WORD_PATTERN.sub(" ", _PUNCT_REMOVE_PATTERN.sub("", part.casefold())).split()
+        if parts and words and all(word in LEGAL_SUFFIXES for word in words):
+            parts[-1] = f"{parts[-1]}, {part}"
+        else:
+            parts.append(part)
+    return parts
+
+def trigrams(normalized_name: str) -> set:
+    padded = f"  {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex:
+    """
+    归一化发行商名的三元组倒排索引，用于给出按相似度（Dice 系数）排序的模糊候选。
+    """
+    def __init__(self, names):
+        self.names = []
+        self._lengths = array("I")
+        postings = {}
+        for name in names:
+            if not name:
+                continue
+            name_id = len(self.names)
+            self.names.append(name)
+            grams = trigrams(name)
+            self._lengths.append(len(grams))
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(name_id)
+        self._postings = postings
+        logger.info(f"已建立发行商三元组索引，共 {len(self.names)} 个名称、{len(postings)} 个三元组")
+
+    def candidates(self, normalized_name: str, limit: int = 5, min_score: float = 0.3) -> list:
+        """返回 [(相似度, 名称), ...]，按相似度从高到低排列。"""
+        query = trigrams(normalized_name)
+        if not query:
+            return []
+        postings = sorted(filter(None, map(self.posting, query)), key=len)
+        counts = Counter()
+        scanned = 0
+        for posting in postings:
+            if scanned and scanned + len(posting) > MAX_POSTINGS_SCAN:
+                break
+            counts.update(posting)
+            scanned += len(posting)
+
+        # 先按稀有三元组命中数粗筛，再对少量候选计算精确的 Dice 系数
+        shortlist = [name_id for name_id, _ in counts.most_common(max(limit * 10, 50))]
+        query_size = len(query)
+        scored = []
+        for name_id in shortlist:
+            name = self.name(name_id)
+            common = len(query & trigrams(name))
+            score = 2 * common / (query_size + self.gram_count(name_id))
+            if score >= min_score:
+                scored.append((score, name))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:limit]
+
+    def postings(self):
+        """所有 (三元组, 名称编号数组)，用于写出旁路索引。"""
+        return self._postings.items()
+
+    def posting(self, gram: str):
+        """包含该三元组的名称编号，没有时返回 None。"""
+        return self._postings.get(gram)
+
+    def name(self, name_id: int) -> str:
+        return self.names[name_id]
+
+    def gram_count(self, name_id: int) -> int:
+        return self._lengths[name_id]
@@ -0,0 +1,140 @@
+# rate_limiter.py
+import random
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 各主机的默认速率 (每秒请求数, 突发容量)
+DEFAULT_HOST_LIMITS = {
+    "store.steampowered.com": (1.5, 5),
+    "help.steampowered.com": (0.5, 2),
+    "steamcommunity.com": (1.0, 3),
+}
+FALLBACK_LIMIT = (1.0, 3)
+
+class TokenBucket:
+    """
+    令牌桶。rate 会根据 429 的出现情况动态调整，但不会超过 max_rate 或低于 min_rate。
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.max_rate = rate
+        self.min_rate = rate / 20
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """阻塞直到取得一个令牌。"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """
+    按主机划分的共享限速器。所有发往 Steam 的请求都应先调用 acquire()，
+    收到响应后调用 on_success() 或 on_throttled()。
+
+    - 每个主机一个令牌桶；
+    - 遇到 429/503 时优先遵循 Retry-After，否则使用带抖动的指数退避；
+    - 最近一段时间内 429 越多，速率降得越低；持续成功后再逐步恢复。
+    """
+    def __init__(self, host_limits: dict = None, base_backoff: float = 2.0,
+                 max_backoff: float = 300.0, window: float = 60.0):
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        if host_limits:
+            self.host_limits.update(host_limits)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.window = window
+        self._buckets = {}
+        self._throttle_events = {}
+        self._consecutive_throttles = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, capacity = self.host_limits.get(host, FALLBACK_LIMIT)
+                bucket = TokenBucket(rate, capacity)
+                self._buckets[host] = bucket
+                self._throttle_events[host] = deque()
+                self._consecutive_throttles[host] = 0
+            return bucket
+
+    def acquire(self, host: str):
+        self._bucket(host).acquire()
+
+    def on_success(self, host: str):
+        bucket = self._bucket(host)
+        with self._lock:
+            self._consecutive_throttles[host] = 0
+        with bucket.lock:
+            # 加性恢复：每次成功只回升一小步
+            if bucket.rate < bucket.max_rate:
+                bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate * 0.02)
+
+    def on_throttled(self, host: str, retry_after: str = None) -> float:
+        """
+        记录一次限流响应，返回调用方在重试前应等待的秒数。
+        """
+        bucket = self._bucket(host)
+        now = time.monotonic()
+        with self._lock:
+            events = self._throttle_events[host]
+            events.append(now)
+            while events and now - events[0] > self.window:
+                events.popleft()
+            recent = len(events)
+            self._consecutive_throttles[host] += 1
+            attempt = self._consecutive_throttles[host]
+
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            # 全抖动指数退避，最近 429 越多基数越大
+            ceiling = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1)) * max(1, recent / 2))
+            delay = random.uniform(ceiling / 2, ceiling)
+
+        with bucket.lock:
+            # 乘性降速
+            bucket.rate = max(bucket.min_rate, bucket.rate / 2)
+            bucket.tokens = 0
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+
+        logger.warning(f"{host} 返回限流响应，{delay:.1f} 秒后重试，当前速率 {bucket.rate:.2f} 次/秒"
+                       f"（最近 {self.window:.0f} 秒内限流 {recent} 次）")
+        return delay
+
+def parse_retry_after(value) -> float:
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    # email.utils 导入较慢，只有遇到 HTTP 日期格式时才需要
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
@@ -0,0 +1,152 @@
+# run_manifest.py
+import json
+import os
+import threading
+import time
+import logging
+
+from batch_processor import STATUS_OK, STATUS_NO_EMAIL, STATUS_RECENTLY_CONTACTED, STATUS_NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUNS_DIR = "runs"
+MANIFEST_VERSION = 1
+# 每写入多少条记录执行一次 fsync；每条记录本身都会立即 flush
+FSYNC_EVERY = 100
+
+# 不需要重新处理的最终状态；Steam 中不存在的 AppID 重试也不会成功，同样不再重做
+FINAL_STATUSES = {STATUS_OK, STATUS_NO_EMAIL, STATUS_RECENTLY_CONTACTED, STATUS_NOT_FOUND}
+
+def default_manifest_path(runs_dir: str = DEFAULT_RUNS_DIR) -> str:
+    return os.path.join(runs_dir, time.strftime("run-%Y%m%d-%H%M%S.jsonl"))
+
+class RunManifest:
+    """
+    批量任务的运行清单（JSONL，只追加）。第一行记录任务参数，随后每个 AppID 一行 queued 记录，
+    处理过程中每完成一个阶段（并要继续下一阶段）追加一行带当时结果的 stage 记录，
+    游戏处理完时追加一行带完整结果的 result 记录。恢复时未完成的游戏从最后完成的阶段之后继续。
+    同一 AppID 以最后一条记录为准；进程中途退出时最后一行可能不完整，读取时忽略。
+    """
+    def __init__(self, path: str, options: dict, entries: dict, fp=None):
+        self.path = path
+        self.options = options
+        # appid -> {"urls": [...], "stage": 最后完成的阶段, "partial": 该阶段完成时的结果, "result": 结果字典或 None}
+        self.entries = entries
+        self._fp = fp
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+    @classmethod
+    def create(cls, path: str, jobs: dict, options: dict = None):
+        """新建运行清单。jobs: {appid: [url, ...]}；options 为恢复时需要的任务参数（csv 路径等）。"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        options = dict(options or {})
+        entries = {appid: {"urls": list(urls), "stage": None, "partial": None, "result": None}
+                   for appid, urls in jobs.items()}
+        fp = open(path, "x", encoding="utf-8")
+        manifest = cls(path, options, entries, fp)
+        manifest._write({"type": "run", "version": MANIFEST_VERSION, "created_at": time.time(), "options": options})
+        for appid, entry in entries.items():
+            manifest._write({"type": "queued", "appid": appid, "urls": entry["urls"]})
+        manifest._sync()
+        logger.info(f"已创建运行清单: {path}，共 {len(entries)} 个游戏")
+        return manifest
+
+    @classmethod
+    def load(cls, path: str):
+        """读取已有的运行清单，之后的记录继续追加到同一文件。"""
+        options = None
+        entries = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"运行清单第 {line_number} 行不完整，已忽略: {path}")
+                    continue
+                record_type = record.get("type")
+                if record_type == "run":
+                    options = record.get("options", {})
+                elif record_type == "queued":
+                    entries[record["appid"]] = {"urls": record.get("urls", []), "stage": None, "partial": None,
+                                                "result": None}
+                elif record_type in ("stage", "result") and record.get("appid") in entries:
+                    entry = entries[record["appid"]]
+                    if record_type == "stage":
+                        entry["stage"] = record.get("stage")
+                        entry["partial"] = record.get("result")
+                    else:
+                        entry["result"] = record.get("result")
+        if options is None:
+            raise ValueError(f"不是有效的运行清单: {path}")
+        fp = open(path, "a", encoding="utf-8")
+        # 上次写到一半的行之后另起一行，避免与新记录连在一起
+        if fp.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    fp.write("\n")
+        return cls(path, options, entries, fp)
+
+    def is_done(self, appid: str) -> bool:
+        result = self.entries[appid]["result"]
+        if not result or result.get("status") not in FINAL_STATUSES:
+            return False
+        # 需要发送的任务，已找到邮箱但没有发送成功的也要重做
+        if self.options.get("send") and result.get("status") == STATUS_OK:
+            return bool(result.get("sent"))
+        return True
+
+    def pending_jobs(self) -> dict:
+        """尚未完成（失败或从未处理）的 {appid: [url, ...]}。"""
+        return {appid: entry["urls"] for appid, entry in self.entries.items() if not self.is_done(appid)}
+
+    def resume_points(self) -> dict:
+        """未完成且有阶段记录的游戏 {appid: (最后完成的阶段, 该阶段完成时的结果)}，恢复时从下一阶段继续。"""
+        return {appid: (entry["stage"], entry["partial"]) for appid, entry in self.entries.items()
+                if entry["stage"] and entry["partial"] and not self.is_done(appid)}
+
+    def summary(self) -> dict:
+        done = sum(1 for appid in self.entries if self.is_done(appid))
+        failed = sum(1 for appid, entry in self.entries.items() if entry["result"] and not self.is_done(appid))
+        return {"total": len(self.entries), "done": done, "failed": failed,
+                "not_started": len(self.entries) - done - failed}
+
+    def record_stage(self, appid: str, stage: str, result: dict):
+        """记录某个游戏完成了一个阶段，result 为此时的结果，恢复时从这里继续。"""
+        entry = self.entries[appid]
+        entry["stage"] = stage
+        entry["partial"] = result
+        self._write({"type": "stage", "appid": appid, "stage": stage, "result": result})
+
+    def record_result(self, result: dict):
+        self.entries[result["appid"]]["result"] = result
+        self._write({"type": "result", "appid": result["appid"], "result": result})
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fp.write(line)
+            self._fp.flush()
+            self._unsynced += 1
+            if self._unsynced >= FSYNC_EVERY:
+                self._sync_locked()
+
+    def _sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        try:
+            os.fsync(self._fp.fileno())
+        except OSError:
+            logger.exception(f"同步运行清单失败: {self.path}")
+        self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None and not self._fp.closed:
+                self._sync_locked()
+                self._fp.close()
@@ -0,0 +1,243 @@
+# send_scheduler.py
+import datetime
+import json
+import os
+import queue
+import re
+import smtplib
+import threading
+import time
+import logging
+
+from rate_limiter import TokenBucket
+from smtp_session import SMTPSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUOTA_FILE = "smtp_quota.json"
+DEFAULT_RATE_PER_MINUTE = 10
+DEFAULT_DAILY_QUOTA = 400
+# 表示限流或额度用尽的 SMTP 响应码：账号暂停一段时间，邮件交给其他账号
+THROTTLE_CODES = {421, 450, 451, 452, 454, 554}
+TEMPORARY_COOLDOWN = 120.0
+PERMANENT_COOLDOWN = 3600.0
+# 所有账号都被限流时，同一封邮件在同一账号上最多尝试的次数（每次等该账号暂停结束后重新排队）
+MAX_THROTTLE_RETRIES = 3
+
+class QuotaStore:
+    """按账号记录当天已发送的邮件数，保存在 JSON 文件中，跨天自动清零。"""
+    def __init__(self, path: str = DEFAULT_QUOTA_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except FileNotFoundError:
+            self._data = {}
+        except (OSError, json.JSONDecodeError):
+            logger.exception(f"读取发送额度文件失败: {path}")
+            self._data = {}
+
+    def sent_today(self, username: str) -> int:
+        with self._lock:
+            entry = self._data.get(username, {})
+            return entry.get("sent", 0) if entry.get("date") == _today() else 0
+
+    def record(self, username: str):
+        with self._lock:
+            entry = self._data.get(username, {})
+            if entry.get("date") != _today():
+                entry = {"date": _today(), "sent": 0}
+            entry["sent"] += 1
+            self._data[username] = entry
+            # 先写临时文件再替换，中途退出不会留下写了一半的额度文件
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, indent=4, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except OSError:
+                logger.exception(f"保存发送额度文件失败: {self.path}")
+
+def _today() -> str:
+    return datetime.date.today().isoformat()
+
+class SMTPAccount:
+    """一个发件账号：独立的 SMTP 会话、发送速率和每日额度。"""
+    def __init__(self, config: dict, quota_store: QuotaStore):
+        self.config = config
+        self.username = config.get("username")
+        self.daily_quota = int(config.get("daily_quota", DEFAULT_DAILY_QUOTA))
+        rate_per_minute = float(config.get("rate_per_minute", DEFAULT_RATE_PER_MINUTE))
+        self.bucket = TokenBucket(rate_per_minute / 60.0, 1)
+        self.session = SMTPSession.from_config(config)
+        self.quota_store = quota_store
+        self.jobs = queue.Queue()
+        self.pending = 0
+        self.suspended_until = 0.0
+        self.throttle_count = 0
+
+    def remaining_quota(self) -> int:
+        return max(0, self.daily_quota - self.quota_store.sent_today(self.username))
+
+    def available(self) -> bool:
+        return self.remaining_quota() > 0 and time.monotonic() >= self.suspended_until
+
+    def suspend(self, code: int):
+        self.throttle_count += 1
+        if code >= 500:
+            delay = PERMANENT_COOLDOWN
+        else:
+            delay = min(PERMANENT_COOLDOWN, TEMPORARY_COOLDOWN * (2 ** (self.throttle_count - 1)))
+        self.suspended_until = time.monotonic() + delay
+        logger.warning(f"发件账号 {self.username} 被限流 (SMTP {code})，暂停 {delay:.0f} 秒。")
+
+class SendScheduler:
+    """
+    多账号发送调度器。每个账号一个工作线程，新邮件分配给“剩余额度减去待发数量”最多的账号，
+    因此发送量按各账号剩余额度加权分布。某个账号返回限流类的 4xx/5xx 响应时暂停该账号，
+    邮件改由其他账号发送；没有其他账号可用时，等暂停结束后重新排队，在同一账号上最多尝试 MAX_THROTTLE_RETRIES 次。
+
+    job 为字典：to_email, subject, body, from_email（"显示名称 <邮箱>"，实际发件地址会替换为所用账号），
+    可选的 message_id 会写入 Message-ID 头；可以附带 appid 等其他字段，原样传给回调。
+    on_result(job, success, message, username) 在工作线程中调用。
+    """
+    def __init__(self, email_manager, accounts: list = None, quota_store: QuotaStore = None, on_result=None):
+        self.email_manager = email_manager
+        self.quota_store = quota_store or QuotaStore()
+        account_configs = accounts if accounts is not None else email_manager.get_smtp_accounts()
+        self.accounts = [SMTPAccount(config, self.quota_store) for config in account_configs]
+        if not self.accounts:
+            raise ValueError("没有可用的SMTP账号，请检查配置。")
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._unfinished = 0
+        self._all_done = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._threads = []
+        for account in self.accounts:
+            thread = threading.Thread(target=self._worker, args=(account,), daemon=True,
+                                      name=f"smtp-{account.username}")
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"发送调度器已启动，共 {len(self.accounts)} 个发件账号。")
+
+    def submit(self, job: dict):
+        with self._lock:
+            self._unfinished += 1
+        self._dispatch(job, tried=())
+
+    def join(self, timeout: float = None) -> bool:
+        """等待已提交的邮件全部处理完，返回是否在超时前完成。"""
+        with self._all_done:
+            return self._all_done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def shutdown(self):
+        self._stopping.set()
+        for account in self.accounts:
+            account.jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        for account in self.accounts:
+            account.session.close()
+
+    def _dispatch(self, job: dict, tried: tuple):
+        """
+        tried 为这封邮件被限流过的账号名（可重复）。先选没有限流过的账号；都限流过时，
+        交给最早结束暂停的账号重新排队，工作线程会等到暂停结束再发送。
+        """
+        with self._lock:
+            with_quota = [account for account in self.accounts if account.remaining_quota() > account.pending]
+            candidates = [account for account in with_quota if account.username not in tried]
+            if candidates:
+                # 优先选可用的账号，再按“剩余额度 - 待发数量”加权
+                account = max(candidates, key=lambda a: (a.available(), a.remaining_quota() - a.pending))
+            else:
+                retry = [account for account in with_quota if tried.count(account.username) < MAX_THROTTLE_RETRIES]
+                account = min(retry, key=lambda a: a.suspended_until) if retry else None
+            if account is not None:
+                account.pending += 1
+        if account is None:
+            self._finish(job, False, "所有发件账号的额度已用完或均被限流。", None)
+            return
+        if account.username in tried:
+            logger.info(f"没有其他可用的发件账号，发往 {job['to_email']} 的邮件等待 {account.username} 暂停结束后重试。")
+        account.jobs.put((job, tried))
+
+    def _worker(self, account: SMTPAccount):
+        while True:
+            item = account.jobs.get()
+            if item is None or self._stopping.is_set():
+                return
+            job, tried = item
+            wait = account.suspended_until - time.monotonic()
+            if wait > 0 and self._stopping.wait(wait):
+                return
+            account.bucket.acquire()
+            try:
+                self._send(account, job)
+            except smtplib.SMTPResponseException as e:
+                with self._lock:
+                    account.pending -= 1
+                if e.smtp_code in THROTTLE_CODES:
+                    account.suspend(e.smtp_code)
+                    self._dispatch(job, tried + (account.username,))
+                    self._redistribute(account)
+                else:
+                    logger.error(f"发件账号 {account.username} 发送失败 (收件人: {job['to_email']}): {e}")
+                    self._finish(job, False, str(e), account.username)
+                continue
+            except Exception as e:
+                with self._lock:
+                    account.pending -= 1
+                logger.exception(f"发件账号 {account.username} 发送失败 (收件人: {job['to_email']})")
+                self._finish(job, False, str(e), account.username)
+                continue
+
+            with self._lock:
+                account.pending -= 1
+                account.throttle_count = 0
+            account.quota_store.record(account.username)
+            self.email_manager.record_sent(job["to_email"], job.get("appid"))
+            logger.info(f"邮件发送成功，收件人: {job['to_email']}，发件账号: {account.username}")
+            self._finish(job, True, "邮件发送成功！", account.username)
+
+    def _redistribute(self, account: SMTPAccount):
+        """账号被暂停后，把它队列中尚未发送的邮件转给其他账号。这些邮件没有在该账号上尝试过，tried 保持不变。"""
+        moved = []
+        while True:
+            try:
+                item = account.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                account.jobs.put(None)
+                break
+            moved.append(item)
+        if not moved:
+            return
+        with self._lock:
+            account.pending -= len(moved)
+        for job, tried in moved:
+            self._dispatch(job, tried)
+        logger.info(f"已将发件账号 {account.username} 的 {len(moved)} 封待发邮件转给其他账号。")
+
+    def _send(self, account: SMTPAccount, job: dict):
+        match = re.match(r"^(.*?) <(.*?)>$", job.get("from_email", ""))
+        display_name = match.group(1).strip() if match else job.get("from_email", "")
+        from_header, from_email = self.email_manager.build_from_header(f"{display_name} <{account.username}>")
+        msg = self.email_manager.build_message(job["to_email"], job["subject"], job["body"], from_header)
+        if job.get("message_id"):
+            msg["Message-ID"] = job["message_id"]
+        account.session.send(from_email, [job["to_email"]], msg.as_string())
+
+    def _finish(self, job: dict, success: bool, message: str, username):
+        if self.on_result is not None:
+            try:
+                self.on_result(job, success, message, username)
+            except Exception:
+                logger.exception("发送结果回调出错")
+        with self._all_done:
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._all_done.notify_all()
@@ -0,0 +1,83 @@
+# sent_history.py
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = "sent_history.sqlite3"
+DEFAULT_COOLDOWN_DAYS = 90
+
+def normalize_recipient(recipient: str) -> str:
+    return recipient.strip().lower()
+
+class SentHistory:
+    """
+    已发送邮件记录，按 (收件人, AppID) 存储最近一次发送时间和发送次数。
+    表使用 WITHOUT ROWID，主键即数据本身，多年的记录也只占很小的文件；
+    打开时不加载任何数据，查询只走一次主键索引。
+    """
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sent_history (
+                recipient TEXT NOT NULL,
+                appid TEXT NOT NULL,
+                last_sent_at INTEGER NOT NULL,
+                sent_count INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (recipient, appid)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        logger.debug(f"发送记录已打开: {path}")
+
+    def record(self, recipient: str, appid: str = None, sent_at: float = None):
+        """记录一次发送。"""
+        sent_at = int(sent_at if sent_at is not None else time.time())
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("""
+                    INSERT INTO sent_history (recipient, appid, last_sent_at) VALUES (?, ?, ?)
+                    ON CONFLICT(recipient, appid) DO UPDATE SET
+                        last_sent_at = MAX(sent_history.last_sent_at, excluded.last_sent_at),
+                        sent_count = sent_history.sent_count + 1
+                """, (normalize_recipient(recipient), str(appid or ""), sent_at))
+        except sqlite3.Error:
+            logger.exception(f"保存发送记录失败: {recipient}")
+
+    def last_sent(self, recipient: str, appid: str = None):
+        """
+        返回最近一次发送的时间戳，从未发送过时返回 None。
+        不指定 appid 时返回发给该收件人的任何一封邮件中最近的一次。
+        """
+        with self._lock:
+            if appid is None:
+                row = self._conn.execute(
+                    "SELECT MAX(last_sent_at) FROM sent_history WHERE recipient = ?",
+                    (normalize_recipient(recipient),)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT last_sent_at FROM sent_history WHERE recipient = ? AND appid = ?",
+                    (normalize_recipient(recipient), str(appid))
+                ).fetchone()
+        return row[0] if row else None
+
+    def contacted_within(self, recipient: str, cooldown_days: float, appid: str = None):
+        """在冷却期内联系过该收件人时返回上次发送时间戳，否则返回 None。"""
+        last = self.last_sent(recipient, appid)
+        if last is None or last < time.time() - cooldown_days * 86400:
+            return None
+        return last
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sent_history").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,127 @@
+# smtp_session.py
+import smtplib
+import threading
+import time
+import logging
+
+from metrics import span, SPAN_SMTP_CONNECT, SPAN_SMTP_LOGIN, SPAN_SMTP_SEND
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MESSAGES = 50       # 每个连接最多发送的邮件数，之后重新连接
+DEFAULT_IDLE_TIMEOUT = 60.0     # 连接空闲超过该秒数后不再复用
+NOOP_AFTER_IDLE = 5.0           # 空闲超过该秒数时，发送前先用 NOOP 检查连接是否还活着
+
+class SMTPSession:
+    """
+    复用已登录的 SMTP 连接，避免每封邮件都重新进行 TLS 握手和 AUTH。
+    发送前按需用 NOOP 检查连接，连接断开时自动重连；
+    发送数量达到 max_messages 或空闲超过 idle_timeout 后重新建立连接。
+    """
+    def __init__(self, host: str, port: int, username: str, password: str, use_tls: bool = True,
+                 max_messages: int = DEFAULT_MAX_MESSAGES, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._server = None
+        self._sent_on_connection = 0
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, smtp_config: dict, **kwargs):
+        return cls(smtp_config.get("host"), smtp_config.get("port"), smtp_config.get("username"),
+                   smtp_config.get("password"), smtp_config.get("use_tls", True), **kwargs)
+
+    def send(self, from_email: str, to_addrs: list, message: str):
+        """
+        发送一封邮件。连接在发送过程中断开时重连并重试一次，其他 SMTP 错误直接抛出。
+        """
+        with self._lock:
+            server = self._ensure_connection()
+            try:
+                with span(SPAN_SMTP_SEND):
+                    server.sendmail(from_email, to_addrs, message)
+            except smtplib.SMTPServerDisconnected:
+                logger.warning(f"SMTP 连接已断开，重新连接后重试: {self.host}")
+                self._discard()
+                server = self._ensure_connection()
+                with span(SPAN_SMTP_SEND):
+                    server.sendmail(from_email, to_addrs, message)
+            except smtplib.SMTPResponseException as e:
+                # 421 表示服务器即将关闭连接，下次发送需要重新连接
+                if e.smtp_code == 421:
+                    self._discard()
+                raise
+            self._sent_on_connection += 1
+            self._last_used = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _ensure_connection(self):
+        now = time.monotonic()
+        if self._server is not None:
+            idle = now - self._last_used
+            if self._sent_on_connection >= self.max_messages:
+                logger.debug(f"SMTP 连接已发送 {self._sent_on_connection} 封邮件，重新连接。")
+                self._close()
+            elif idle > self.idle_timeout:
+                logger.debug(f"SMTP 连接已空闲 {idle:.0f} 秒，重新连接。")
+                self._close()
+            elif idle > NOOP_AFTER_IDLE and not self._is_alive():
+                logger.info("SMTP 连接已失效，重新连接。")
+                self._discard()
+        if self._server is None:
+            self._connect()
+        return self._server
+
+    def _connect(self):
+        logger.info(f"连接 SMTP 服务器: {self.host}:{self.port}")
+        with span(SPAN_SMTP_CONNECT):
+            if self.use_tls:
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                server.starttls()
+        try:
+            with span(SPAN_SMTP_LOGIN):
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._sent_on_connection = 0
+        self._last_used = time.monotonic()
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self):
+        """正常退出当前连接。"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+
+    def _discard(self):
+        """丢弃已失效的连接，不再发送 QUIT。"""
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        self._server = None
@@ -0,0 +1,138 @@
+# steam_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "steam_cache.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600        # 正常结果缓存 7 天
+DEFAULT_NEGATIVE_TTL = 24 * 3600   # success: false 的结果缓存 1 天
+DEFAULT_MAX_ENTRIES = 50000
+
+class SteamCache:
+    """
+    基于 SQLite 的持久化缓存，用于保存 Steam 接口的结果。
+    条目按 (namespace, key) 区分，支持 TTL、负缓存以及按最近访问时间淘汰。
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                negative INTEGER NOT NULL DEFAULT 0,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        self._conn.commit()
+        logger.debug(f"缓存已打开: {path}")
+
+    def get(self, namespace: str, key: str, allow_stale: bool = False):
+        """
+        读取缓存条目。
+        返回 (hit, value)：未命中或已过期时 hit 为 False；负缓存命中时 value 为 None。
+        allow_stale: 为 True 时忽略 TTL（离线模式使用）。
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, negative, stored_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+            if row is None:
+                return False, None
+
+            value, negative, stored_at = row
+            ttl = self.negative_ttl if negative else self.ttl
+            if not allow_stale and now - stored_at > ttl:
+                return False, None
+
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key)
+            )
+            self._conn.commit()
+
+        if negative:
+            return True, None
+        return True, json.loads(value)
+
+    def set(self, namespace: str, key: str, value):
+        """写入一条正常结果。"""
+        self._store(namespace, key, json.dumps(value, ensure_ascii=False), False)
+
+    def set_negative(self, namespace: str, key: str):
+        """记录一条负结果（例如 appdetails 返回 success: false）。"""
+        self._store(namespace, key, None, True)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            self._conn.commit()
+
+    def clear(self, namespace: str = None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+        logger.info(f"缓存已清空: {namespace or '全部'}")
+
+    def _store(self, namespace: str, key: str, value, negative: bool):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, negative, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, int(negative), now, now)
+            )
+            self._writes_since_prune += 1
+            # 每隔一段写入才检查一次容量，避免每次写入都做 COUNT
+            if self._writes_since_prune >= 100:
+                self._prune_locked()
+            self._conn.commit()
+
+    def _prune_locked(self):
+        self._writes_since_prune = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE rowid IN "
+                "(SELECT rowid FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            logger.info(f"缓存条目超过上限 {self.max_entries}，已淘汰 {overflow} 条最久未访问的条目。")
+
+    def prune(self):
+        """立即按容量上限淘汰旧条目。"""
+        with self._lock:
+            self._prune_locked()
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
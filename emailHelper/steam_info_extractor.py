@@ -1,34 +1,105 @@
-import requests
-from lxml import html
 import re
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+from rate_limiter import HostRateLimiter
+from metrics import span, SPAN_APPDETAILS, SPAN_HELP_PAGE, OUTCOME_CACHE_HIT, OUTCOME_ERROR
+from url_classifier import classify_url
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_LANGUAGE = "schinese"
+APPDETAILS_CACHE_NAMESPACE = "appdetails"
+DEFAULT_MAX_RETRIES = 4
+THROTTLE_STATUS_CODES = (429, 503)
+HELP_EMAIL_CACHE_NAMESPACE = "help_email"
+HELP_PAGE_URL = "https://help.steampowered.com/zh-cn/wizard/HelpWithGameTechnicalIssue?appid={appid}"
+EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+SUPPORT_ROW_MARKER = b'help_official_support_row'
+STREAM_CHUNK_SIZE = 16 * 1024
+# 支持信息 div 的最大长度，标签不配对时读到这么多就停止
+SUPPORT_ROW_MAX_BYTES = 64 * 1024
+_DIV_TAG_PATTERN = re.compile(rb"<(/?)div\b", re.IGNORECASE)
+
 class SteamInfoExtractor:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
-        })
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, cache=None,
+                 language: str = DEFAULT_LANGUAGE, offline: bool = False,
+                 rate_limiter: HostRateLimiter = None, max_retries: int = DEFAULT_MAX_RETRIES):
+        """
+        cache: 可选的 SteamCache 实例，用于缓存 appdetails 结果。
+        offline: 离线模式，只读取缓存（包括已过期的条目），不发起网络请求。
+        rate_limiter: 所有请求共用的按主机限速器，默认新建一个。
+        """
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.language = language
+        self.offline = offline
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.help_scraper = HelpPageEmailScraper(self)
+
+    @property
+    def session(self):
+        """首次发起请求时才导入 requests 并建立会话，requests 导入较慢，不放在程序启动路径上。"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    session.headers.update({
+                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
+                    })
+                    # 连接池大小需不小于并发数，否则多余的线程会反复新建连接
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, 10))
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def warm_up(self):
+        """提前导入 requests、lxml 并建立会话，GUI 在窗口显示后于后台调用，首次处理时不必再等待导入。"""
+        import lxml.html
+        return self.session
+
+    def fetch(self, url: str, timeout: float = 10, **kwargs):
+        """
+        经过限速器发送 GET 请求。遇到 429/503 时按 Retry-After 或退避时间等待后重试，
+        超过重试次数后返回最后一次响应，由调用方自行 raise_for_status()。
+        """
+        host = urlsplit(url).hostname or ""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(host)
+            response = self.session.get(url, timeout=timeout, **kwargs)
+            if response.status_code not in THROTTLE_STATUS_CODES:
+                self.rate_limiter.on_success(host)
+                return response
+
+            delay = self.rate_limiter.on_throttled(host, response.headers.get("Retry-After"))
+            if attempt == self.max_retries:
+                logger.error(f"请求 {url} 多次被限流，放弃重试。")
+                break
+            response.close()
+            time.sleep(delay)
+        return response
 
     def extract_appid_from_url(self, url: str) -> str:
         """
-        从 Steam URL 中提取 AppID。支持商店页面和评测页面。
+        从 Steam URL 中提取 AppID。支持商店页面、评测页面、社区页面和鉴赏家页面。
         """
         if url is None:  # 检查 URL 是否为 None
             logger.warning("传入的 URL 为 None")
             return None
         try:
-            # 尝试从商店页面 URL 提取
-            match = re.search(r"app/(\d+)", url)
-            if match:
-                return match.group(1)
-
-            # 尝试从评测页面 URL 提取
-            match = re.search(r"recommended/(\d+)", url)
-            if match:
-                return match.group(1)
+            _, appid = classify_url(url)
+            if appid:
+                return appid
 
             logger.warning(f"无法从URL提取AppID: {url}")
             return None
@@ -39,10 +110,34 @@ class SteamInfoExtractor:
     def get_game_info_from_appid(self, appid: str) -> dict:
         """
         从 Steam API 获取游戏信息，包括游戏名和发行商。
+        配置了缓存时优先读取缓存；请求失败时退回到已过期的缓存条目。
+        API 明确返回该 AppID 不存在 (success: false) 时返回空字典，重试也不会有结果；
+        网络错误、离线等暂时无法获取的情况返回 None，之后可以重试。
         """
-        url = f"https://store.steampowered.com/api/appdetails?appids={appid}&l=schinese"
+        if not self.offline:
+            # 首次调用时导入 requests 并建立会话，不计入 appdetails 的耗时
+            self.session
+        with span(SPAN_APPDETAILS) as timing:
+            return self._get_game_info_from_appid(appid, timing)
+
+    def _get_game_info_from_appid(self, appid: str, timing) -> dict:
+        appid = str(appid)
+        cache_key = f"{appid}:{self.language}"
+
+        if self.cache is not None:
+            hit, cached = self.cache.get(APPDETAILS_CACHE_NAMESPACE, cache_key, allow_stale=self.offline)
+            if hit:
+                logger.debug(f"AppID {appid} 命中缓存")
+                timing.outcome = OUTCOME_CACHE_HIT
+                return cached or {}
+        if self.offline:
+            logger.warning(f"离线模式下缓存中没有 AppID {appid} 的游戏信息")
+            return None
+
+        import requests  # 延迟导入，见 session
+        url = f"https://store.steampowered.com/api/appdetails?appids={appid}&l={self.language}"
         try:
-            response = self.session.get(url, timeout=10)
+            response = self.fetch(url, timeout=10)
             response.raise_for_status()  # 检查HTTP错误
             data = response.json()
 
@@ -56,20 +151,197 @@ class SteamInfoExtractor:
                 if not publisher_name:
                     logger.warning(f"无法从API提取发行商名: {url}")
 
-                return {
+                game_info = {
                     "game_name": game_name,
                     "publisher_name": publisher_name
                 }
-            else:
-                logger.warning(f"AppID {appid} 在 API 响应中不存在或请求失败: {url}")
+                if self.cache is not None:
+                    self.cache.set(APPDETAILS_CACHE_NAMESPACE, cache_key, game_info)
+                return game_info
+            elif appid in data:
+                logger.warning(f"Steam 商店中不存在 AppID {appid}: {url}")
+                if self.cache is not None:
+                    self.cache.set_negative(APPDETAILS_CACHE_NAMESPACE, cache_key)
                 return {}
+            else:
+                logger.warning(f"API 响应中没有 AppID {appid}: {url}")
+                timing.outcome = OUTCOME_ERROR
+                return None
 
         except requests.exceptions.RequestException as e:
             logger.error(f"网络请求错误: {url} - {e}")
-            return {}
+            timing.outcome = OUTCOME_ERROR
+            return self._get_stale_game_info(cache_key)
         except Exception as e:
             logger.exception(f"解析 API 响应时发生错误: {url}")
-            return {}
+            timing.outcome = OUTCOME_ERROR
+            return None
+
+    def _get_stale_game_info(self, cache_key: str) -> dict:
+        """网络请求失败时，尝试使用已过期的缓存条目，没有时返回 None。"""
+        if self.cache is None:
+            return None
+        hit, cached = self.cache.get(APPDETAILS_CACHE_NAMESPACE, cache_key, allow_stale=True)
+        if hit and cached:
+            logger.warning(f"网络请求失败，使用已过期的缓存结果: {cache_key}")
+            return cached
+        return None
+
+    def get_game_info_many(self, appids, max_workers: int = None):
+        """
+        并发获取多个 AppID 的游戏信息，按完成顺序逐个产出结果。
+        每个结果为 (appid, game_info, error)：成功时 error 为 None，
+        失败时 game_info 为 {}、error 为错误说明。单个 AppID 失败不会中断整批。
+        max_workers: 并发请求数上限，默认使用实例的 max_workers。
+        """
+        workers = max_workers or self.max_workers
+        # 去重并保持原有顺序
+        unique_appids = list(dict.fromkeys(str(appid) for appid in appids if appid))
+        if not unique_appids:
+            return
+
+        logger.info(f"开始并发获取 {len(unique_appids)} 个 AppID 的游戏信息，并发数: {workers}")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="appdetails") as executor:
+            futures = {executor.submit(self.get_game_info_from_appid, appid): appid for appid in unique_appids}
+            try:
+                for future in as_completed(futures):
+                    appid = futures[future]
+                    try:
+                        game_info = future.result()
+                    except Exception as e:
+                        logger.exception(f"获取 AppID {appid} 的游戏信息时发生错误")
+                        yield appid, {}, str(e)
+                        continue
+                    if game_info:
+                        yield appid, game_info, None
+                    else:
+                        yield appid, {}, "无法获取游戏信息"
+            finally:
+                # 调用方提前停止迭代时，取消尚未开始的请求
+                for future in futures:
+                    future.cancel()
+
+class HelpPageEmailScraper:
+    """
+    从 Steam 帮助页面 (HelpWithGameTechnicalIssue) 提取游戏的官方支持邮箱。
+    以流式方式读取响应，读到 help_official_support_row 所在的 div 结束后立即停止下载，
+    只把这一小段 HTML 交给 lxml 解析。提取结果按 AppID 缓存。
+    """
+    def __init__(self, extractor: SteamInfoExtractor):
+        self.extractor = extractor
+        self._memory_cache = {}
+        self._lock = threading.Lock()
+
+    def get_support_email(self, appid: str) -> str:
+        """
+        返回帮助页面上的支持邮箱，页面中没有邮箱时返回 None。
+        网络错误会以 requests 异常的形式抛出，由调用方决定如何提示。
+        """
+        if not self.extractor.offline:
+            # 首次调用时导入 requests、lxml 并建立会话，不计入 help_page 的耗时
+            self.extractor.warm_up()
+        with span(SPAN_HELP_PAGE) as timing:
+            return self._get_support_email(str(appid), timing)
+
+    def _get_support_email(self, appid: str, timing) -> str:
+        with self._lock:
+            if appid in self._memory_cache:
+                timing.outcome = OUTCOME_CACHE_HIT
+                return self._memory_cache[appid]
+
+        cache = self.extractor.cache
+        if cache is not None:
+            hit, cached = cache.get(HELP_EMAIL_CACHE_NAMESPACE, appid, allow_stale=self.extractor.offline)
+            if hit:
+                logger.debug(f"AppID {appid} 的帮助页面邮箱命中缓存")
+                timing.outcome = OUTCOME_CACHE_HIT
+                self._remember(appid, cached)
+                return cached
+        if self.extractor.offline:
+            logger.warning(f"离线模式下缓存中没有 AppID {appid} 的帮助页面邮箱")
+            return None
+
+        help_url = HELP_PAGE_URL.format(appid=appid)
+        response = self.extractor.fetch(help_url, timeout=10, stream=True)
+        try:
+            response.raise_for_status()
+            fragment, bytes_read = self._read_support_row(response)
+        finally:
+            response.close()
+
+        email = self._parse_email(fragment) if fragment else None
+        logger.debug(f"帮助页面读取 {bytes_read} 字节后停止 (AppID: {appid})")
+        if email:
+            logger.info(f"从 Steam 帮助页面提取到邮箱地址: {email} (AppID: {appid})")
+        else:
+            logger.warning(f"Steam 帮助页面中没有找到邮箱地址 (AppID: {appid})")
+
+        if cache is not None:
+            if email:
+                cache.set(HELP_EMAIL_CACHE_NAMESPACE, appid, email)
+            else:
+                cache.set_negative(HELP_EMAIL_CACHE_NAMESPACE, appid)
+        self._remember(appid, email)
+        return email
+
+    def _remember(self, appid: str, email):
+        with self._lock:
+            self._memory_cache[appid] = email
+
+    @staticmethod
+    def _read_support_row(response) -> tuple:
+        """
+        逐块读取响应，返回 (支持信息所在 div 的 HTML 片段, 已读取字节数)。
+        按 div 的嵌套层数找到与之配对的结束标签，内部嵌套的 div 不会截断片段；
+        标签不配对时最多读取 SUPPORT_ROW_MAX_BYTES。页面中没有该 div 时片段为 None。
+        """
+        buffer = b""
+        discarded = 0
+        start = -1
+        scan = 0
+        depth = 0
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if not chunk:
+                continue
+            buffer += chunk
+            if start < 0:
+                marker = buffer.find(SUPPORT_ROW_MARKER)
+                if marker < 0:
+                    # 只保留可能跨块的尾部，避免缓存整页
+                    keep = len(SUPPORT_ROW_MARKER) + 64
+                    discarded += max(0, len(buffer) - keep)
+                    buffer = buffer[-keep:]
+                    continue
+                start = buffer.rfind(b"<div", 0, marker)
+                if start < 0:
+                    start = marker
+                scan = start
+            for match in _DIV_TAG_PATTERN.finditer(buffer, scan):
+                if match.end() >= len(buffer):
+                    # 标签可能被分到下一块，读到下一块后再判断
+                    break
+                scan = match.end()
+                depth += -1 if match.group(1) else 1
+                if depth <= 0:
+                    # 片段不含最外层的结束标签，lxml 会自动补全
+                    return buffer[start:match.start()], discarded + len(buffer)
+            if len(buffer) - start >= SUPPORT_ROW_MAX_BYTES:
+                return buffer[start:start + SUPPORT_ROW_MAX_BYTES], discarded + len(buffer)
+        if start >= 0:
+            return buffer[start:], discarded + len(buffer)
+        return None, discarded + len(buffer)
+
+    @staticmethod
+    def _parse_email(fragment: bytes) -> str:
+        try:
+            from lxml import html  # 只有抓取帮助页面时才需要，延迟导入
+            element = html.fragment_fromstring(fragment.decode("utf-8", errors="replace"), create_parent="div")
+            text = element.xpath('string(.//div[contains(@class, "help_official_support_row")])') or element.text_content()
+        except Exception:
+            logger.exception("解析帮助页面片段时发生错误")
+            text = fragment.decode("utf-8", errors="replace")
+        match = EMAIL_PATTERN.search(text)
+        return match.group(0) if match else None
 
 if __name__ == '__main__':
     # 示例用法
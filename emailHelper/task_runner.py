@@ -0,0 +1,181 @@
+# task_runner.py
+import collections
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_WORKERS = 3
+# 计算吞吐量时参考最近多少秒内的完成情况
+THROUGHPUT_WINDOW = 30.0
+
+class TaskCancelled(Exception):
+    """任务已被取消。"""
+
+class CancellationToken:
+    """
+    任务的取消标记。工作代码在适当的位置检查 cancelled 或调用 raise_if_cancelled()，
+    也可以通过 add_callback 注册取消时要执行的动作（例如停止流水线）。
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("执行取消回调时出错")
+
+    def add_callback(self, callback):
+        """注册取消回调；已经取消时立即执行。"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待最多 timeout 秒，期间被取消则提前返回 True。"""
+        return self._event.wait(timeout)
+
+class ProgressTracker:
+    """记录完成数量，按最近一段时间的完成速度估算吞吐量和剩余时间。"""
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.done = 0
+        self.started_at = time.monotonic()
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def advance(self, count: int = 1):
+        now = time.monotonic()
+        with self._lock:
+            self.done += count
+            self._recent.append((now, self.done))
+            while len(self._recent) > 2 and now - self._recent[0][0] > THROUGHPUT_WINDOW:
+                self._recent.popleft()
+
+    def snapshot(self) -> dict:
+        """返回 {"done", "total", "rate" (个/秒), "eta" (秒，无法估算时为 None), "elapsed"}。"""
+        now = time.monotonic()
+        with self._lock:
+            done = self.done
+            if len(self._recent) >= 2 and now > self._recent[0][0]:
+                first_time, first_done = self._recent[0]
+                rate = (done - first_done) / (now - first_time)
+            else:
+                elapsed = now - self.started_at
+                rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - done)
+        eta = remaining / rate if rate > 0 else None
+        return {"done": done, "total": self.total, "rate": rate, "eta": eta, "elapsed": now - self.started_at}
+
+    def format(self) -> str:
+        snapshot = self.snapshot()
+        text = f"已完成 {snapshot['done']}/{snapshot['total']} · {snapshot['rate']:.1f} 个/秒"
+        if snapshot["eta"] is not None and snapshot["done"] < snapshot["total"]:
+            text += f" · 预计剩余 {format_duration(snapshot['eta'])}"
+        return text
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} 秒"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} 分 {seconds} 秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} 小时 {minutes} 分"
+
+class Task:
+    def __init__(self, name: str):
+        self.name = name
+        self.token = CancellationToken()
+        self.progress = ProgressTracker()
+        self.future = None
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+class TaskRunner:
+    """
+    固定线程数的后台任务执行器，代替每次点击都新建线程。
+    每个任务有名字，同名任务同时只能运行一个；任务函数的第一个参数是 Task，
+    通过 task.token 检查取消，通过 task.progress 报告进度。
+    """
+    def __init__(self, max_workers: int = DEFAULT_TASK_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func, *args, **kwargs):
+        """提交任务并返回 Task；同名任务仍在运行时返回 None。"""
+        with self._lock:
+            current = self._tasks.get(name)
+            if current is not None and current.running:
+                logger.info(f"任务 {name} 仍在运行，忽略新的请求。")
+                return None
+            task = Task(name)
+            self._tasks[name] = task
+            task.future = self._executor.submit(self._run, task, func, args, kwargs)
+        return task
+
+    def get(self, name: str):
+        with self._lock:
+            task = self._tasks.get(name)
+        return task if task is not None and task.running else None
+
+    def cancel(self, name: str) -> bool:
+        task = self.get(name)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def shutdown(self, timeout: float = None):
+        """取消所有任务并等待它们结束。"""
+        with self._lock:
+            tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for task in tasks:
+            if task.future is None:
+                continue
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                task.future.result(timeout=remaining)
+            except Exception:
+                pass
+
+    def _run(self, task: Task, func, args, kwargs):
+        try:
+            return func(task, *args, **kwargs)
+        except TaskCancelled:
+            logger.info(f"任务 {task.name} 已取消。")
+        except Exception:
+            logger.exception(f"任务 {task.name} 出错")
+            raise
@@ -0,0 +1,72 @@
+# template_compiler.py
+from string import Formatter
+
+# 各类模板允许使用的占位符
+TEMPLATE_FIELDS = {
+    "subject": ("game_name", "publisher_name", "appid"),
+    "body": ("game_name", "publisher_name", "appid", "steam_url"),
+    "from": ("game_name", "publisher_name", "appid"),
+}
+
+_formatter = Formatter()
+
+class TemplateError(ValueError):
+    """模板格式错误或使用了不支持的占位符。"""
+
+class CompiledTemplate:
+    """
+    预先解析好的模板：字面文本与占位符交替保存，渲染时只需拼接，不再重复解析格式串。
+    """
+    def __init__(self, template_type: str, source: str, parts: list):
+        self.template_type = template_type
+        self.source = source
+        self._parts = parts
+        self.fields = tuple(dict.fromkeys(field for _, field, _, _ in parts if field))
+
+    def render(self, values: dict) -> str:
+        pieces = []
+        for literal, field, format_spec, conversion in self._parts:
+            if literal:
+                pieces.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            pieces.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(pieces)
+
+def compile_template(template_type: str, source: str) -> CompiledTemplate:
+    """
+    解析模板并检查占位符，发现未知占位符或格式错误时抛出 TemplateError。
+    """
+    allowed = TEMPLATE_FIELDS.get(template_type)
+    if allowed is None:
+        raise TemplateError(f"未知的模板类型: {template_type}")
+    try:
+        parsed = list(_formatter.parse(source))
+    except ValueError as e:
+        raise TemplateError(f"模板 '{template_type}' 格式错误: {e}") from e
+
+    parts = []
+    for literal, field, format_spec, conversion in parsed:
+        if field is not None:
+            if field not in allowed:
+                allowed_text = ", ".join(f"{{{name}}}" for name in allowed)
+                shown = f"{{{field}}}" if field else "{}"
+                raise TemplateError(f"模板 '{template_type}' 中有不支持的占位符 {shown}，可用的占位符: {allowed_text}")
+            if format_spec and ("{" in format_spec):
+                raise TemplateError(f"模板 '{template_type}' 中的占位符 {{{field}}} 不支持嵌套格式")
+            if format_spec:
+                try:
+                    format("", format_spec)
+                except ValueError as e:
+                    raise TemplateError(f"模板 '{template_type}' 中的占位符 {{{field}}} 格式说明无效: {e}") from e
+            if conversion not in (None, "r", "s", "a"):
+                raise TemplateError(f"模板 '{template_type}' 中的占位符 {{{field}}} 使用了未知的转换 !{conversion}")
+        parts.append((literal, field, format_spec, conversion))
+    return CompiledTemplate(template_type, source, parts)
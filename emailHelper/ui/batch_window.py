@@ -0,0 +1,296 @@
+# ui/batch_window.py
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+import logging
+
+from batch_processor import STATUS_OK, STATUS_RECENTLY_CONTACTED, EMAIL_SOURCE_HELP_PAGE, EMAIL_SOURCE_FUZZY
+from bulk_renderer import BulkEmailRenderer
+from outbox import STATE_QUEUED, STATE_SENT, STATE_FAILED
+from ui.results_model import ResultsModel, FILTERS
+from ui.results_table import ResultsTable
+
+# 后台任务名，同名任务同时只运行一个
+PROCESS_TASK = "process_urls"
+EXPORT_TASK = "export_drafts"
+QUEUE_SEND_TASK = "queue_send_all"
+
+# 输入筛选文字后等待多久再筛选，避免每敲一个字都扫描全部结果
+FILTER_DELAY_MS = 200
+
+def row_color(result: dict) -> str:
+    if result.get("send_state") == STATE_FAILED:
+        return "red"
+    if result.get("send_state") == STATE_SENT or result.get("sent"):
+        return "green"
+    if result["status"] == STATUS_RECENTLY_CONTACTED:
+        return "gray"
+    if result["status"] != STATUS_OK:
+        return "red"
+    if result["email_source"] == EMAIL_SOURCE_HELP_PAGE:
+        return "purple"
+    if result["email_source"] == EMAIL_SOURCE_FUZZY:
+        return "dark orange"
+    return "black"
+
+class BatchResultsWindow(tk.Toplevel):
+    """
+    批量处理结果表格。表格只绘制可见的行，几万个结果也能流畅滚动、排序和筛选；
+    选中一项时才把该游戏的信息和邮件显示到主窗口中，
+    可以逐个检查后发送，也可以一次发送所有已找到邮箱的游戏。
+    """
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.model = ResultsModel()
+        # 全部结果（按加入顺序），与模型共用同一个列表
+        self.results = self.model.rows
+        self._filter_after_id = None
+        self.title("批量处理结果")
+        self.geometry("760x520")
+        self._create_widgets()
+
+    def _create_widgets(self):
+        filter_frame = tk.Frame(self)
+        filter_frame.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(filter_frame, text="筛选:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self._schedule_filter())
+        tk.Entry(filter_frame, textvariable=self.filter_var, width=30).pack(side=tk.LEFT, padx=5)
+        self.filter_combobox = ttk.Combobox(filter_frame, state="readonly", width=14,
+                                            values=[title for title, _ in FILTERS])
+        self.filter_combobox.current(0)
+        self.filter_combobox.bind("<<ComboboxSelected>>", lambda event: self._apply_filter())
+        self.filter_combobox.pack(side=tk.LEFT, padx=5)
+
+        self.table = ResultsTable(self, self.model, row_style=row_color, on_select=self._on_select)
+        self.table.pack(fill="both", expand=True, padx=10, pady=10)
+
+        progress_frame = tk.Frame(self)
+        progress_frame.pack(fill="x", padx=10)
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill="x", expand=True)
+        self.stop_button = tk.Button(progress_frame, text="停止", command=self._stop_processing)
+        self.stop_button.pack(side=tk.RIGHT, padx=5)
+        self.progress_label = tk.Label(self, text="", anchor="w")
+        self.progress_label.pack(fill="x", padx=10)
+
+        self.summary_label = tk.Label(self, text="", anchor="w")
+        self.summary_label.pack(fill="x", padx=10)
+
+        # 各处理阶段的队列深度，便于调整并发数
+        self.stats_label = tk.Label(self, text="", anchor="w", fg="gray")
+        self.stats_label.pack(fill="x", padx=10)
+
+        button_frame = tk.Frame(self)
+        button_frame.pack(pady=10)
+
+        self.send_all_button = tk.Button(button_frame, text="发送全部已找到邮箱的邮件", command=self._queue_send_all)
+        self.send_all_button.pack(side=tk.LEFT, padx=5)
+
+        self.retry_button = tk.Button(button_frame, text="重试发送失败的邮件", command=self._retry_failed)
+        self.retry_button.pack(side=tk.LEFT, padx=5)
+
+        self.export_button = tk.Button(button_frame, text="导出草稿 (mbox)", command=self._start_export_thread)
+        self.export_button.pack(side=tk.LEFT, padx=5)
+
+        self.export_eml_button = tk.Button(button_frame, text="导出草稿 (.eml)", command=self._start_eml_export_thread)
+        self.export_eml_button.pack(side=tk.LEFT, padx=5)
+
+        tk.Button(button_frame, text="关闭", command=self.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def add_result(self, result: dict):
+        """追加一个游戏的处理结果（需在主线程调用）。"""
+        self.add_results([result])
+
+    def add_results(self, results: list):
+        """一次追加多个结果，表格和摘要只刷新一次（需在主线程调用）。"""
+        self.model.add(results)
+        self.table.refresh()
+        self._update_summary()
+
+    def refresh_results(self, results: list = None):
+        """结果内容变化（重新生成邮件、发送状态更新）后刷新表格，results 省略时刷新全部（需在主线程调用）。"""
+        rows = None
+        if results is not None:
+            ids = {id(result) for result in results}
+            rows = [row for row, result in enumerate(self.model.rows) if id(result) in ids]
+        self.model.refresh(rows)
+        self.table.refresh()
+        self._update_summary()
+
+    def set_send_state(self, appid: str, state: str):
+        """更新某个游戏的发送状态（需在主线程调用）。"""
+        self.set_send_states([(appid, state)])
+
+    def set_send_states(self, updates: list):
+        """
+        批量更新发送状态，updates 为按发生顺序排列的 (appid, state)，同一游戏以最后一次为准。
+        有筛选或排序时刷新需要重建视图，所以整批只刷新一次（需在主线程调用）。
+        """
+        rows = set()
+        for appid, state in updates:
+            for row in self.model.find(appid):
+                self.model.rows[row]["send_state"] = state
+                rows.add(row)
+        if rows:
+            self.model.refresh(sorted(rows))
+            self.table.refresh()
+            self._update_summary()
+
+    def _schedule_filter(self):
+        if self._filter_after_id is not None:
+            self.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.after(FILTER_DELAY_MS, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_after_id = None
+        _, filter_key = FILTERS[self.filter_combobox.current()]
+        self.model.set_filter(filter_key, self.filter_var.get())
+        self.table.first = 0
+        self.table.refresh()
+        self._update_summary()
+
+    def _update_summary(self):
+        found = self.model.count(("status", STATUS_OK))
+        text = f"共 {len(self.results)} 个游戏，已找到邮箱 {found} 个"
+        sent = self.model.count(("send", STATE_SENT))
+        queued = self.model.count(("send", STATE_QUEUED))
+        if sent or queued:
+            text += f"，已发送 {sent} 个，待发送 {queued} 个"
+        if len(self.model) != len(self.results):
+            text += f"，当前显示 {len(self.model)} 个"
+        self.summary_label.config(text=text + "。")
+
+    def set_progress(self, done: int, total: int, text: str):
+        """显示处理进度：完成数量、吞吐量和预计剩余时间（需在主线程调用）。"""
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        self.progress_label.config(text=text)
+        if done >= total:
+            self.stop_button.config(state="disabled")
+
+    def _stop_processing(self):
+        if self.app.task_runner.cancel(PROCESS_TASK):
+            self.stop_button.config(state="disabled")
+            self.app._update_status("正在停止批量处理，等待进行中的请求完成...", "warning")
+
+    def set_pipeline_stats(self, text: str):
+        if self.winfo_exists():
+            self.stats_label.config(text=text)
+
+    def _on_select(self, result: dict):
+        self.app._show_game_result(result)
+
+    def _start_export_thread(self):
+        mbox_path = filedialog.asksaveasfilename(
+            parent=self,
+            title="导出邮件草稿",
+            defaultextension=".mbox",
+            filetypes=[("mbox files", "*.mbox"), ("All files", "*.*")]
+        )
+        if mbox_path:
+            self._submit_export(mbox_path, as_eml=False)
+
+    def _start_eml_export_thread(self):
+        output_dir = filedialog.askdirectory(parent=self, title="选择 .eml 草稿的保存目录")
+        if output_dir:
+            self._submit_export(output_dir, as_eml=True)
+
+    def _submit_export(self, path: str, as_eml: bool):
+        if self.app.task_runner.submit(EXPORT_TASK, self._run_export_logic, list(self.results), path, as_eml) is None:
+            self.app._update_status("已有导出任务在运行。", "warning")
+            return
+        self.export_button.config(state="disabled")
+        self.export_eml_button.config(state="disabled")
+
+    def _run_export_logic(self, task, results: list, path: str, as_eml: bool):
+        logger = logging.getLogger(__name__)
+        try:
+            renderer = BulkEmailRenderer(self.app.email_manager)
+            stats = renderer.render_to_eml_dir(results, path) if as_eml else renderer.render_to_mbox(results, path)
+            self.app.post_status(
+                f"已导出 {stats['rendered']} 封邮件草稿到 {path}，跳过 {stats['skipped']} 个未找到邮箱的游戏。", "success")
+        except Exception as e:
+            logger.exception("导出邮件草稿失败。")
+            self.app.post_status(f"导出邮件草稿失败: {e}", "error")
+        finally:
+            self.app.ui_queue.call(self._on_export_finished)
+
+    def _on_export_finished(self):
+        if self.winfo_exists():
+            self.export_button.config(state="normal")
+            self.export_eml_button.config(state="normal")
+
+    def _queue_send_all(self):
+        pending = [result for result in self.results if result["status"] == STATUS_OK]
+        if not pending:
+            messagebox.showwarning("无可发送邮件", "没有已找到邮箱的游戏。", parent=self)
+            return
+        if self.app.outbox is None:
+            messagebox.showerror("发件箱不可用", "发件箱未能打开，请查看日志。", parent=self)
+            return
+        if not messagebox.askyesno("确认发送", f"确定要发送 {len(pending)} 封邮件吗？", parent=self):
+            return
+        if self.app.task_runner.submit(QUEUE_SEND_TASK, self._run_queue_send_all_logic, pending) is None:
+            self.app._update_status("正在加入发件箱，请稍候。", "warning")
+            return
+        self.send_all_button.config(state="disabled")
+
+    def _run_queue_send_all_logic(self, task, pending: list):
+        """把邮件全部加入发件箱，由后台发件线程通过多账号调度器发送，已发送过的不会重复加入。"""
+        logger = logging.getLogger(__name__)
+        try:
+            added_indexes = self.app.outbox.enqueue_many(
+                (result["appid"], result["email"]["to_email"], result["email"]["subject"],
+                 result["email"]["body"], result["email"]["from_email"])
+                for result in pending
+            )
+        except Exception as e:
+            logger.exception("加入发件箱失败。")
+            self.app.post_status(f"加入发件箱失败: {e}", "error")
+        else:
+            self.app.outbox_sender.wake()
+            # 只标记真正加入的行，发件箱中已有的邮件保持原来的发送状态
+            self.app.ui_queue.call(self._mark_queued, [pending[index] for index in added_indexes])
+            added = len(added_indexes)
+            skipped = len(pending) - added
+            logger.info(f"批量加入发件箱 {added} 封，跳过已在发件箱中的 {skipped} 封。")
+            self.app.post_status(
+                f"已将 {added} 封邮件加入发件箱，正在后台发送；{skipped} 封此前已加入过，未重复发送。", "info")
+        finally:
+            self.app.ui_queue.call(self._on_send_all_finished)
+
+    def _mark_queued(self, pending: list):
+        for result in pending:
+            if result.get("send_state") is None:
+                result["send_state"] = STATE_QUEUED
+        if self.winfo_exists():
+            self.refresh_results(pending)
+
+    def _retry_failed(self):
+        """把发件箱中所有发送失败的邮件重新入队。"""
+        if self.app.outbox is None:
+            messagebox.showerror("发件箱不可用", "发件箱未能打开，请查看日志。", parent=self)
+            return
+        try:
+            appids = self.app.outbox.retry_failed()
+        except Exception as e:
+            logging.getLogger(__name__).exception("重试发送失败的邮件时出错。")
+            self.app._update_status(f"重试发送失败的邮件时出错: {e}", "error")
+            return
+        if not appids:
+            self.app._update_status("发件箱中没有发送失败的邮件。", "info")
+            return
+        self.app.outbox_sender.wake()
+        rows = [row for appid in dict.fromkeys(appids) for row in self.model.find(appid)
+                if self.model.rows[row].get("send_state") == STATE_FAILED]
+        for row in rows:
+            self.model.rows[row]["send_state"] = STATE_QUEUED
+        if rows:
+            self.model.refresh(rows)
+            self.table.refresh()
+            self._update_summary()
+        self.app._update_status(f"已将 {len(appids)} 封发送失败的邮件重新加入发件箱。", "info")
+
+    def _on_send_all_finished(self):
+        if self.winfo_exists():
+            self.send_all_button.config(state="normal")
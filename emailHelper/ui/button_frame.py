@@ -1,8 +1,10 @@
 # ui/button_frame.py
 import tkinter as tk
-import requests
 import logging
 
+from batch_processor import NO_EMAIL_PLACEHOLDER
+from outbox import STATE_QUEUED, STATE_SENT
+
 class ButtonFrame(tk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent)
@@ -11,7 +13,7 @@ class ButtonFrame(tk.Frame):
         self._create_widgets()
 
     def _create_widgets(self):
-        self.send_email_button = tk.Button(self, text="发送邮件", command=self._start_send_email_thread)
+        self.send_email_button = tk.Button(self, text="发送邮件", command=self._queue_email)
         self.send_email_button.pack(side=tk.LEFT, padx=5)
 
         self.clear_button = tk.Button(self, text="清空所有", command=self._clear_fields)
@@ -20,56 +22,48 @@ class ButtonFrame(tk.Frame):
         self.exit_button = tk.Button(self, text="退出", command=self.app.quit)
         self.exit_button.pack(side=tk.RIGHT, padx=5)
 
-    def _start_send_email_thread(self):
-        """在单独的线程中启动邮件发送逻辑，避免GUI卡死。"""
-        self.app._set_buttons_state("disabled")
-        self.app._update_status("正在后台发送邮件，请稍候...", "info")
+    def _queue_email(self):
+        """把当前邮件加入发件箱，由后台发件线程发送，失败时自动重试。"""
         logger = logging.getLogger(__name__)
-        logger.info("启动邮件发送线程。")
-        thread = threading.Thread(target=self._run_send_email_logic)
-        thread.start()
-
-    def _run_send_email_logic(self):
-        """实际执行邮件发送的逻辑，在单独线程中运行。"""
+        appid = self.app.info_frame.appid_label.cget("text")
         to_email = self.app.email_frame.email_to_label.cget("text")
         subject = self.app.email_frame.email_subject_label.cget("text")
         # 这里的 from_email_display 已经是组合后的 "显示名称 <邮箱地址>" 格式
-        from_email_display = self.app.email_frame.email_from_label.cget("text") 
+        from_email_display = self.app.email_frame.email_from_label.cget("text")
         body = self.app.email_frame.email_text_area.get(1.0, tk.END).strip()
 
-        try:
-            if not to_email or to_email == "未找到邮箱":
-                self.app.after(0, lambda: self.app._update_status("发送失败：收件人邮箱地址无效。", "error"))
-                return
-            if not subject:
-                self.app.after(0, lambda: self.app._update_status("发送失败：邮件主题不能为空。", "error"))
-                return
-            # 检查SMTP配置中的用户名（实际发件邮箱）
-            if not self.app.email_manager.email_config.get("smtp", {}).get("username"):
-                self.app.after(0, lambda: self.app._update_status("发送失败：请先在“配置邮件服务”中设置您的发件邮箱地址。", "error"))
-                return
-
-            # 从SMTP配置中获取发件邮箱地址
-            from_email_address = self.app.email_manager.email_config["smtp"]["username"]
-
-            # 使用 EmailManager 发送邮件
-            if self.app.email_manager.send_email(to_email, subject, body, from_email_address, from_email_display):
-                self.app.after(0, lambda: self.app._update_status(f"邮件已成功发送至 {to_email}！", "success"))
-                logger = logging.getLogger(__name__)
-                logger.info(f"邮件已成功发送至 {to_email}。")
-            else:
-                self.app.after(0, lambda: self.app._update_status("发送失败：请检查您的邮件服务配置和网络连接。", "error"))
-                logger = logging.getLogger(__name__)
-                logger.error("邮件发送失败。")
+        if not to_email or to_email == NO_EMAIL_PLACEHOLDER:
+            self.app._update_status("发送失败：收件人邮箱地址无效。", "error")
+            return
+        if not subject:
+            self.app._update_status("发送失败：邮件主题不能为空。", "error")
+            return
+        if not self.app.email_manager.get_smtp_accounts():
+            self.app._update_status("发送失败：请先在“配置邮件服务”中设置您的发件邮箱地址。", "error")
+            return
+        if self.app.outbox is None:
+            self.app._update_status("发送失败：发件箱未能打开，请查看日志。", "error")
+            return
+        cooldown_message = self.app.email_manager.check_cooldown(to_email)
+        if cooldown_message:
+            self.app._update_status(f"未发送：{cooldown_message}", "warning")
+            return
 
+        try:
+            added, state = self.app.outbox.enqueue(appid, to_email, subject, body, from_email_display)
         except Exception as e:
-            self.app.after(0, lambda e=e: self.app._update_status(f"发送邮件时发生意外错误: {e}", "error"))
-            logger = logging.getLogger(__name__)
-            logger.exception("发送邮件时发生未捕获的异常。")
-        finally:
-            self.app.after(0, lambda: self.app._set_buttons_state("normal"))
-            logger = logging.getLogger(__name__)
-            logger.info("邮件发送线程结束。")
+            logger.exception("加入发件箱失败。")
+            self.app._update_status(f"加入发件箱失败: {e}", "error")
+            return
+
+        self.app.set_send_state(appid, STATE_QUEUED if added else state)
+        if added:
+            self.app.outbox_sender.wake()
+            self.app._update_status(f"邮件已加入发件箱，正在后台发送至 {to_email}。", "info")
+        elif state == STATE_SENT:
+            self.app._update_status(f"AppID {appid} 的邮件此前已发送至 {to_email}，不会重复发送。", "warning")
+        else:
+            self.app._update_status(f"AppID {appid} 发往 {to_email} 的邮件已在发件箱中（状态: {state}）。", "warning")
 
     def _clear_fields(self):
         self.app._clear_fields()
@@ -1,6 +1,5 @@
 # ui/email_frame.py
 import tkinter as tk
-import requests
 from tkinter import scrolledtext
 
 class EmailFrame(tk.LabelFrame):
@@ -2,8 +2,9 @@
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import logging
-import csv  # 导入 csv 模块
-import os
+import re
+
+from batch_processor import EMAIL_SOURCE_MANUAL, STATUS_OK, STATUS_NO_EMAIL
 
 class InfoFrame(tk.LabelFrame):
     def __init__(self, parent, app):
@@ -42,7 +43,7 @@ class InfoFrame(tk.LabelFrame):
         self.edit_publisher_email_button = tk.Button(edit_buttons_frame, text="修改发行商邮箱", command=self._edit_publisher_email)
         self.edit_publisher_email_button.pack(side=tk.LEFT, padx=5)
         
-        self.save_button = tk.Button(edit_buttons_frame, text="保存", command=self._save_to_csv)
+        self.save_button = tk.Button(edit_buttons_frame, text="保存", command=self._save_to_directory)
         self.save_button.pack(side=tk.LEFT, padx=5)
 
  
@@ -60,33 +61,40 @@ class InfoFrame(tk.LabelFrame):
                                             initialvalue=self.publisher_name_label.cget("text"))
         if new_name:
             self.publisher_name_label.config(text=new_name)
-            self.app._update_status(f"发行商名称已修改为: {new_name}", "info")
             logger.info(f"发行商名称已修改为: {new_name}")
+            result = self.app.current_result
+            if result is not None and result["game_name"]:
+                result["publisher_name"] = new_name
+                self.app._rerender_results([result])
+            self.app._update_status(f"发行商名称已修改为: {new_name}", "info")
 
     def _edit_publisher_email(self):
         dialog = tk.Toplevel(self)
         dialog.title("编辑发行商邮箱")
 
         # 获取当前邮箱地址
-        current_email = self.publisher_email_var.get()
+        current_email = self.publisher_email_label.cget("text")
+        if not self._validate_email(current_email):
+            current_email = ""
 
         # 创建标签和输入框
         tk.Label(dialog, text="新的邮箱地址:").grid(row=0, column=0, padx=5, pady=5)
-        email_entry = tk.Entry(dialog)
+        email_entry = tk.Entry(dialog, width=40)
         email_entry.insert(0, current_email)
         email_entry.grid(row=0, column=1, padx=5, pady=5)
 
         def confirm_email():
-            """确认修改邮箱地址。"""
-            new_email = email_entry.get()
-            # 在这里添加验证逻辑，例如检查邮箱格式是否正确
+            """确认修改邮箱地址，并保存到发行商通讯录。"""
+            new_email = email_entry.get().strip()
             if not self._validate_email(new_email):
-                messagebox.showerror("错误", "邮箱地址格式不正确！")
+                messagebox.showerror("错误", "邮箱地址格式不正确！", parent=dialog)
                 return
 
-            # 更新邮箱地址
             self.publisher_email_var.set(new_email)
+            self.publisher_email_label.config(text=new_email, fg="green")
+            self._save_to_directory()
             dialog.destroy()
+            self._apply_email_to_current_result(new_email)
 
         def cancel_email():
             """取消修改邮箱地址。"""
@@ -99,81 +107,41 @@ class InfoFrame(tk.LabelFrame):
         cancel_button = tk.Button(dialog, text="取消", command=cancel_email)
         cancel_button.grid(row=1, column=1, padx=5, pady=5)
 
-        # 邮箱验证函数 (需要自己实现)
+    def _apply_email_to_current_result(self, new_email: str):
+        """把手动填写的邮箱写回当前结果，并重新生成邮件，使收件人随之更新。"""
+        result = self.app.current_result
+        if result is None or not result["game_name"]:
+            return
+        result["publisher_email"] = new_email
+        result["email_source"] = EMAIL_SOURCE_MANUAL
+        if result["status"] == STATUS_NO_EMAIL:
+            result["status"] = STATUS_OK
+            result["error"] = None
+        self.app._rerender_results([result])
+
     def _validate_email(self, email):
         """验证邮箱地址格式是否正确。"""
-        # 使用正则表达式或其他方法进行验证
-        import re
         pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
         return re.match(pattern, email) is not None
-        def save_email():
-            """保存邮箱地址到CSV文件。"""
-            new_email = email_entry.get().strip()
-            if not new_email:
-                messagebox.showerror("错误", "邮箱地址不能为空。")
-                return
 
-            csv_path = self.app.input_frame.csv_path_entry.get().strip()
-            if not csv_path:
-                messagebox.showerror("错误", "请先选择或输入CSV文件路径。")
-                return
-
-            game_name = self.game_name_label.cget("text")
-            publisher_name = self.publisher_name_label.cget("text")
-
-            try:
-                # 读取现有的 CSV 数据
-                data = []
-                header = None
-                with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
-                    reader = csv.reader(csvfile)
-                    header = next(reader)  # 读取标题行
-                    for row in reader:
-                        data.append(row)
-
-                # 查找要更新的行
-                updated = False
-                for row in data:
-                    if len(row) >= 3 and row[0] == game_name and row[1] == publisher_name:
-                        row[2] = new_email  # 更新邮箱地址
-                        updated = True
-                        break
-
-                # 如果没有找到匹配的行，则添加新行
-                if not updated:
-                    data.append([game_name, publisher_name, new_email])
-
-                # 写回 CSV 文件
-                with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(header)  # 写入标题行
-                    writer.writerows(data)
-
-                self.publisher_email_label.config(text=new_email)
-                self.app._update_status(f"发行商邮箱已修改为: {new_email} 并已保存到 CSV 文件。", "info")
-                logger.info(f"发行商邮箱已修改为: {new_email} 并已保存到 CSV 文件。")
-                dialog.destroy()  # 关闭对话框
-
-            except Exception as e:
-                messagebox.showerror("错误", f"保存CSV文件时发生错误: {e}")
-                logger.exception(f"保存CSV文件时发生错误: {e}")
-
-    def _save_to_csv(self):
-        """将数据保存到 CSV 文件。"""
-        # 获取所有需要保存的数据
-        app_id = self.app_id_var.get()
-        game_name = self.game_name_var.get()
-        publisher_email = self.publisher_email_var.get()
-        # ... 获取其他需要保存的数据
-
-        # 构建 CSV 行
-        data = [app_id, game_name, publisher_email, ...]  # 确保顺序与 CSV 文件中的列顺序一致
-
-        # 写入 CSV 文件
-        try:
-            with open("data.csv", "a", newline="", encoding="utf-8") as csvfile:  # 使用追加模式 "a"
-                writer = csv.writer(csvfile)
-                writer.writerow(data)
-            messagebox.showinfo("成功", "数据已成功保存到 CSV 文件！")
-        except Exception as e:
-            messagebox.showerror("错误", f"保存到 CSV 文件时发生错误：{e}")
\ No newline at end of file
+    def _save_to_directory(self):
+        """把当前的发行商名和邮箱保存到发行商通讯录（单行 upsert，不重写 CSV）。"""
+        logger = logging.getLogger(__name__)
+        directory = self.app.email_manager.publisher_directory
+        if directory is None:
+            messagebox.showerror("错误", "发行商通讯录不可用，请查看日志。")
+            return
+
+        publisher_name = self.app.steam_publisher_name or self.publisher_name_label.cget("text")
+        publisher_email = self.publisher_email_label.cget("text")
+        if not publisher_name or not self._validate_email(publisher_email):
+            messagebox.showerror("错误", "请先获取发行商信息并填写有效的邮箱地址。")
+            return
+
+        appid = self.appid_label.cget("text") or None
+        game_name = self.game_name_label.cget("text") or None
+        if directory.upsert(publisher_name, publisher_email, appid=appid, game_name=game_name):
+            self.app._update_status(f"发行商 '{publisher_name}' 的邮箱 {publisher_email} 已保存到通讯录。", "success")
+            logger.info(f"发行商 '{publisher_name}' 的邮箱 {publisher_email} 已保存到通讯录。")
+        else:
+            messagebox.showerror("错误", "保存到发行商通讯录时发生错误。")
@@ -2,15 +2,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
-import pyperclip
 import threading
+import time
 import logging
-import requests
-import re
-from lxml import html  # 添加这一行
+
+from url_classifier import classify_urls, flatten_group
+from batch_processor import (
+    BatchProcessor, STATUS_RECENTLY_CONTACTED, STATUS_NOT_FOUND, EMAIL_SOURCE_HELP_PAGE, EMAIL_SOURCE_FUZZY,
+)
+from run_manifest import DEFAULT_RUNS_DIR
+import metrics
 
 
 DEFAULT_CSV_FILENAME = "publishers.csv"
+# 等待主线程创建批量结果窗口的最长时间（秒）和检查取消的间隔
+BATCH_WINDOW_TIMEOUT = 10.0
+BATCH_WINDOW_POLL = 0.2
 
 class InputFrame(tk.LabelFrame):
     def __init__(self, parent, app):
@@ -56,23 +63,29 @@ class InputFrame(tk.LabelFrame):
         
         action_status_frame.grid_columnconfigure(0, weight=0) 
         action_status_frame.grid_columnconfigure(1, weight=0) 
-        action_status_frame.grid_columnconfigure(2, weight=1) 
+        action_status_frame.grid_columnconfigure(2, weight=0)
+        action_status_frame.grid_columnconfigure(3, weight=1)
 
         self.email_config_button = tk.Button(action_status_frame, text="配置邮件服务", 
                   command=self._configure_email_window)
         self.email_config_button.grid(row=0, column=0, padx=2, pady=2, sticky="w") 
 
-        self.process_button = tk.Button(action_status_frame, text="处理URL并生成邮件", command=self._start_process_url_thread)
+        self.process_button = tk.Button(action_status_frame, text="处理URL并生成邮件", command=self._start_process_url_task)
         self.process_button.grid(row=0, column=1, padx=2, pady=2, sticky="w") 
 
+        self.stop_button = tk.Button(action_status_frame, text="停止", state="disabled", command=self._stop_process_url_task)
+        self.stop_button.grid(row=0, column=2, padx=2, pady=2, sticky="w")
+
         self.status_label = tk.Label(action_status_frame, text="", fg="black", wraplength=400, justify="left")
-        self.status_label.grid(row=0, column=2, padx=2, pady=2, sticky="ew") 
+        self.status_label.grid(row=0, column=3, padx=2, pady=2, sticky="ew") 
 
     def _paste_from_clipboard(self):
         """从剪贴板读取内容并粘贴到URL输入框。"""
         self.app._update_status("正在尝试从剪贴板粘贴...", "info")
         logger = logging.getLogger(__name__)
         logger.debug("尝试从剪贴板粘贴内容。")
+        # pyperclip 只在粘贴时使用，不在启动时导入
+        import pyperclip
         try:
             clipboard_content = pyperclip.paste()
             self.url_entry.delete(1.0, tk.END)
@@ -131,12 +144,16 @@ class InputFrame(tk.LabelFrame):
 
         def save_template():
             new_content = template_text_area.get(1.0, tk.END).strip()
+            template_error = self.app.email_manager.validate_template(template_type, new_content)
+            if template_error:
+                messagebox.showerror("模板错误", template_error, parent=template_window)
+                return
             if self.app.email_manager.save_template_content(template_type, new_content):
                 messagebox.showinfo("保存成功", f"{title}已保存！")
                 logger.info(f"模板 '{template_type}' 已保存。")
-                # 保存模板后，重新处理URL以更新邮件内容
-                self._start_process_url_thread()
                 template_window.destroy()
+                # 只按新模板重新渲染已获取的结果，不重新请求 Steam
+                self.app._rerender_results()
             else:
                 messagebox.showerror("保存失败", f"保存{title}时发生错误。")
                 logger = logging.getLogger(__name__)
@@ -163,7 +180,7 @@ class InputFrame(tk.LabelFrame):
         logger.info("打开邮件服务配置窗口。")
         config_window = tk.Toplevel(self)
         config_window.title("配置邮件服务 (SMTP)") # 标题已修改
-        config_window.geometry("500x350") # 窗口大小已调整，因为移除了IMAP Tab
+        # 不固定窗口大小，由内容决定，增加配置项（如冷却期）后不会被截断
         config_window.transient(self)
         config_window.grab_set()
 
@@ -200,6 +217,11 @@ class InputFrame(tk.LabelFrame):
         tk.Checkbutton(smtp_frame, text="使用TLS/SSL加密 (推荐)", variable=smtp_use_tls_var).grid(row=4, column=0, columnspan=2, sticky="w", padx=5, pady=5)
         tk.Label(smtp_frame, text="端口465通常使用SSL，端口587通常使用STARTTLS。", fg="gray").grid(row=5, column=0, columnspan=2, sticky="w", padx=5, pady=2)
 
+        tk.Label(smtp_frame, text="重复联系冷却期 (天):").grid(row=6, column=0, sticky="w", padx=5, pady=5)
+        cooldown_entry = tk.Entry(smtp_frame, width=40)
+        cooldown_entry.grid(row=6, column=1, padx=5, pady=5)
+        cooldown_entry.insert(0, f"{self.app.email_manager.get_cooldown_days():g}")
+
         def save_email_config():
             new_smtp_config = {
                 "host": smtp_host_entry.get().strip(),
@@ -209,16 +231,23 @@ class InputFrame(tk.LabelFrame):
                 "use_tls": smtp_use_tls_var.get()
             }
             
-            full_config = {
-                "smtp": new_smtp_config,
-            }
+            try:
+                cooldown_days = float(cooldown_entry.get().strip())
+            except ValueError:
+                messagebox.showerror("配置错误", "冷却期必须是数字（天），0 表示不限制。", parent=config_window)
+                return
+
+            # 保留 smtp_accounts 等其他配置项
+            full_config = dict(self.app.email_manager.email_config)
+            full_config["smtp"] = new_smtp_config
+            full_config["cooldown_days"] = cooldown_days
 
             if self.app.email_manager.save_email_config(full_config):
                 messagebox.showinfo("保存成功", "邮件服务配置已保存！")
                 logger.info("邮件服务配置已保存。")
-                # 保存配置后，重新处理URL以更新邮件内容（特别是发件人显示）
-                self._start_process_url_thread()
                 config_window.destroy()
+                # 发件人显示依赖配置，重新渲染已获取的结果即可
+                self.app._rerender_results()
             else:
                 messagebox.showerror("保存失败", "保存邮件服务配置时发生错误。")
                 logger = logging.getLogger(__name__)
@@ -240,148 +269,174 @@ class InputFrame(tk.LabelFrame):
 
         self.app.wait_window(config_window)
 
-    def _start_process_url_thread(self):
-        """在单独的线程中启动URL处理逻辑，避免GUI卡死。"""
+    def _start_process_url_task(self):
+        """在后台任务中启动URL处理逻辑，避免GUI卡死；同一时间只运行一个处理任务。"""
+        # 控件只能在主线程读取，读好后再交给后台任务
+        steam_urls_raw = self.url_entry.get(1.0, tk.END).strip()
+        csv_path = self.csv_path_entry.get().strip()
+        from ui.batch_window import PROCESS_TASK
+        task = self.app.task_runner.submit(PROCESS_TASK, self._run_process_url_logic, steam_urls_raw, csv_path)
+        if task is None:
+            self.app._update_status("已有处理任务在运行，请等待完成或先停止。", "warning")
+            return
         self.app._set_buttons_state("disabled")
+        self.stop_button.config(state="normal")
         self.app._update_status("正在后台处理URL并获取游戏信息，请稍候...", "info")
         logger = logging.getLogger(__name__)
-        logger.info("启动URL处理线程。")
-        thread = threading.Thread(target=self._run_process_url_logic)
-        thread.start()
+        logger.info("启动URL处理任务。")
 
-    def _run_process_url_logic(self):
-        """实际执行URL处理和邮件构造的逻辑，在单独线程中运行。"""
-        logger = logging.getLogger(__name__)  # 添加这一行
-        try:
-            self.app._clear_output_fields()
-            
-            steam_urls_raw = self.url_entry.get(1.0, tk.END).strip()
-            csv_path = self.csv_path_entry.get().strip()
+    def _stop_process_url_task(self):
+        from ui.batch_window import PROCESS_TASK
+        if self.app.task_runner.cancel(PROCESS_TASK):
+            self.stop_button.config(state="disabled")
+            self.app._update_status("正在停止，等待进行中的请求完成...", "warning")
+
+    def _on_process_url_finished(self):
+        self.app._set_buttons_state("normal")
+        self.stop_button.config(state="disabled")
 
+    def _run_process_url_logic(self, task, steam_urls_raw: str, csv_path: str):
+        """实际执行URL处理和邮件构造的逻辑，在后台任务中运行，界面更新都经由 ui_queue。"""
+        logger = logging.getLogger(__name__)
+        try:
             if not steam_urls_raw:
-                self.app.after(0, lambda: self.app._update_status("输入错误：请输入Steam URL(s)。", "warning"))
+                self.app.post_status("输入错误：请输入Steam URL(s)。", "warning")
                 return
             if not csv_path:
-                self.app.after(0, lambda: self.app._update_status("输入错误：请选择或输入发行商邮箱CSV文件路径。", "warning"))
+                self.app.post_status("输入错误：请选择或输入发行商邮箱CSV文件路径。", "warning")
                 return
 
-            urls = [url.strip() for url in steam_urls_raw.split('\n') if url.strip()]
-            if not urls:
-                self.app.after(0, lambda: self.app._update_status("输入错误：未检测到有效的Steam URL。", "warning"))
+            groups, unrecognized = classify_urls(steam_urls_raw)
+            unrecognized.extend(flatten_group(groups.pop(None, {})))
+            if not groups:
+                if unrecognized:
+                    self.app.post_status(f"AppID提取失败：无法从URL '{unrecognized[0]}' 中提取AppID，请检查URL格式。", "error")
+                else:
+                    self.app.post_status("输入错误：未检测到有效的Steam URL。", "warning")
                 return
 
-            extracted_appids = []
-            for url in urls:
-                appid = self.app.extractor.extract_appid_from_url(url)
-                if not appid:
-                    self.app.after(0, lambda url=url: self.app._update_status(f"AppID提取失败：无法从URL '{url}' 中提取AppID，请检查URL格式。", "error"))
-                    return
-                extracted_appids.append(appid)
-            
-            first_appid = extracted_appids[0]
-            for appid in extracted_appids:
-                if appid != first_appid:
-                    self.app.after(0, lambda first=first_appid, current=appid: self.app._update_status(f"AppID不一致：检测到多个不同的AppID ({first} 和 {current} 等)。请确保所有输入的URL都指向同一个游戏。", "error"))
-                    return
-            
-            common_appid = first_appid
+            # 发行商通讯录等在窗口显示后于后台加载，处理前等它完成
+            self.app.ready.wait()
 
-            self.app.after(0, lambda: self.app.info_frame.appid_label.config(text=common_appid))
-
-            game_info = self.app.extractor.get_game_info_from_appid(common_appid)
-            if not game_info:
-                self.app.after(0, lambda: self.app._update_status("游戏信息获取失败：无法从Steam商店页面获取游戏名和发行商名，请检查AppID或网络连接。", "error"))
+            if len(groups) > 1:
+                # 多个不同的游戏，进入批量模式
+                self._run_batch_logic(task, groups, unrecognized, csv_path)
                 return
-            
-            game_name = game_info.get("game_name", "未知游戏名")
-            steam_publisher_name = game_info.get("publisher_name", "未知发行商") 
 
-            self.app.after(0, lambda: self.app.info_frame.game_name_label.config(text=game_name))
-            
-            # 保存游戏名和发行商名，以便在修改邮箱地址时使用
-            self.app.game_name = game_name
-            self.app.steam_publisher_name = steam_publisher_name
-            
-            publisher_email = self.app.email_manager.get_email(game_name, steam_publisher_name, csv_path)
-
-            display_publisher_name = steam_publisher_name
-            
-            if publisher_email:
-                self.app.after(0, lambda: self.app.info_frame.publisher_email_label.config(text=publisher_email, fg="green"))
-                self.app.after(0, lambda dpn=display_publisher_name: self.app.info_frame.publisher_name_label.config(text=display_publisher_name, fg="blue"))
-                self.app.after(0, lambda dpn=display_publisher_name: self.app._update_status(f"已找到发行商 '{dpn}' 的邮箱。", "success"))
-            else:
-                self.app.after(0, lambda: self.app.info_frame.publisher_email_label.config(text="未找到该发行商的邮箱", fg="red"))
-                self.app.after(0, lambda sp_name=steam_publisher_name: self.app._update_status(f"未在CSV中找到发行商 '{sp_name}' 的邮箱地址。", "warning"))
-                self.app.after(0, lambda dpn=display_publisher_name: self.app.info_frame.publisher_name_label.config(text=f"{dpn} (未匹配到邮箱)", fg="red"))
-                publisher_email = "未找到邮箱"
-
-                # 如果找不到邮箱，则发送请求到 Steam 帮助页面
-                help_url = f"https://help.steampowered.com/zh-cn/wizard/HelpWithGameTechnicalIssue?appid={common_appid}"
-                try:
-                    response = requests.get(help_url)
-                    response.raise_for_status()
-
-                    # 使用 lxml 解析 HTML
-                    tree = html.fromstring(response.text)
-
-                    # 使用 XPath 提取包含邮箱地址的文本
-                    email_text = tree.xpath('string(//div[@class="help_official_support_row"]/text())')
-
-                    # 使用正则表达式提取邮箱地址
-                    match = re.search(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", email_text)
-
-                    if match:
-                        extracted_email = match.group(0)
-                        self.app.after(0, lambda email=extracted_email: self.app.info_frame.publisher_email_label.config(text=email, fg="purple"))  # 使用紫色显示提取的邮箱
-                        self.app.after(0, lambda email=extracted_email: self.app._update_status(f"未找到邮箱，但从 Steam 帮助页面提取到邮箱地址: {email}", "success"))
-                        logger.info(f"从 Steam 帮助页面提取到邮箱地址: {extracted_email}")
-                        publisher_email = extracted_email  # 更新 publisher_email 变量
-                    else:
-                        self.app.after(0, lambda: self.app._update_status("未找到邮箱，且无法从 Steam 帮助页面提取邮箱地址。", "warning"))
-                        logger.warning("未找到邮箱，且无法从 Steam 帮助页面提取邮箱地址。")
-
-                except requests.exceptions.HTTPError as e:
-                    if e.response.status_code == 429:
-                        self.app.after(0, lambda: self.app._update_status(f"未找到邮箱，向 Steam 帮助页面发送请求时遇到速率限制 (AppID: {common_appid})。请稍后重试。", "warning"))
-                        logger.warning(f"向 Steam 帮助页面发送请求时遇到速率限制 (AppID: {common_appid})。状态码: {e.response.status_code}")
-                        time.sleep(60)
-                    else:
-                        self.app.after(0, lambda: self.app._update_status(f"未找到邮箱，但向 Steam 帮助页面发送请求失败 (AppID: {common_appid})，HTTP 错误: {e}", "error"))
-                        logger.error(f"向 Steam 帮助页面发送请求失败 (AppID: {common_appid})，HTTP 错误: {e}")
-                except requests.exceptions.RequestException as e:
-                    self.app.after(0, lambda: self.app._update_status(f"未找到邮箱，且向 Steam 帮助页面发送请求时发生错误 (AppID: {common_appid}): {e}", "error"))
-                    logger.exception(f"向 Steam 帮助页面发送请求时发生错误 (AppID: {common_appid}): {e}")
-                except Exception as e:
-                    self.app.after(0, lambda e=e: self.app._update_status(f"处理 Steam 帮助页面响应时发生错误: {e}", "error"))
-                    logger.exception(f"处理 Steam 帮助页面响应时发生错误: {e}")
-
-            steam_urls_for_template = "\n".join(urls)
-
-            email_parts = self.app.email_manager.construct_email_content(
-                to_email=publisher_email,
-                game_name=game_name,
-                publisher_name=display_publisher_name, 
-                appid=common_appid,
-                steam_url=steam_urls_for_template
-            )
-            
-            self.app.after(0, lambda: self.app.email_frame.email_subject_label.config(text=email_parts['subject']))
-            self.app.after(0, lambda: self.app.email_frame.email_to_label.config(text=email_parts['to_email']))
-            self.app.after(0, lambda: self.app.email_frame.email_from_label.config(text=email_parts['from_email'])) # 这里显示的是组合后的完整From头部
-
-            self.app.after(0, self.app.email_frame.email_text_area.delete, 1.0, tk.END)
-            self.app.after(0, self.app.email_frame.email_text_area.insert, tk.END, email_parts['body'])
+            if unrecognized:
+                self.app.post_status(f"AppID提取失败：无法从URL '{unrecognized[0]}' 中提取AppID，请检查URL格式。", "error")
+                return
 
-            if self.app.input_frame.status_label.cget("fg") not in ["red", "orange"]:
-                self.app.after(0, lambda: self.app._update_status("信息已获取并邮件已构造，请检查界面。", "success"))
+            common_appid, kinds = next(iter(groups.items()))
+            processor = BatchProcessor(self.app.extractor, self.app.email_manager, csv_path)
+            result = processor.process_game(common_appid, flatten_group(kinds))
+            self.app.ui_queue.call(self._show_single_result, result)
 
         except Exception as e:
-            self.app.after(0, lambda e=e: self.app._update_status(f"处理URL时发生意外错误: {e}", "error"))
+            self.app.post_status(f"处理URL时发生意外错误: {e}", "error")
             logger.exception("处理URL逻辑时发生未捕获的异常。")
         finally:
-            self.app.after(0, lambda: self.app._set_buttons_state("normal"))
-            logger.info("URL处理线程结束。")
+            self.app.ui_queue.call(self._on_process_url_finished)
+            logger.info("URL处理任务结束。")
+
+    def _add_batch_results(self, results: list):
+        if self.app.batch_window is not None and self.app.batch_window.winfo_exists():
+            self.app.batch_window.add_results(results)
+
+    def _set_batch_progress(self, done: int, total: int, progress_text: str, stats_text: str):
+        if self.app.batch_window is not None and self.app.batch_window.winfo_exists():
+            self.app.batch_window.set_progress(done, total, progress_text)
+            self.app.batch_window.set_pipeline_stats(stats_text)
+
+    def _show_single_result(self, result: dict):
+        """显示单个游戏的处理结果，并根据邮箱来源给出提示（需在主线程调用）。"""
+        self.app._show_game_result(result)
+        if result["status"] == STATUS_NOT_FOUND:
+            self.app._update_status(f"游戏信息获取失败：Steam 商店中不存在 AppID {result['appid']}，请检查链接。", "error")
+        elif not result["game_name"]:
+            self.app._update_status("游戏信息获取失败：无法从Steam商店页面获取游戏名和发行商名，请检查AppID或网络连接。", "error")
+        elif result["status"] == STATUS_RECENTLY_CONTACTED:
+            return
+        elif result["email_source"] == EMAIL_SOURCE_HELP_PAGE:
+            self.app._update_status(f"未在CSV中找到发行商 '{result['publisher_name']}' 的邮箱，但从 Steam 帮助页面提取到邮箱地址: {result['publisher_email']}", "success")
+        elif result["email_source"] == EMAIL_SOURCE_FUZZY:
+            self.app._update_status(f"CSV 中没有发行商 '{result['publisher_name']}'，按相似名称匹配到邮箱: {result['publisher_email']}，发送前请核对。", "warning")
+        elif result["publisher_email"]:
+            self.app._update_status(f"已找到发行商 '{result['publisher_name']}' 的邮箱，邮件已构造，请检查界面。", "success")
+        elif result["error"]:
+            self.app._update_status(f"未找到邮箱，且{result['error']} (AppID: {result['appid']})。请稍后重试。", "warning")
+        else:
+            self.app._update_status(f"未在CSV中找到发行商 '{result['publisher_name']}' 的邮箱，且无法从 Steam 帮助页面提取邮箱地址。", "warning")
+
+    def _run_batch_logic(self, task, groups: dict, unrecognized: list, csv_path: str):
+        """批量模式：按 AppID 并发处理所有游戏，结果逐个显示在批量结果窗口中，可随时停止。"""
+        logger = logging.getLogger(__name__)
+        total = len(groups)
+        task.progress.total = total
+        if unrecognized:
+            logger.warning(f"批量模式下忽略 {len(unrecognized)} 个无法识别的链接: {unrecognized[:5]}")
+
+        # 在工作线程中导入，主线程只负责创建窗口
+        from ui.batch_window import BatchResultsWindow
+        batch_window_ready = threading.Event()
+        created = []
+        def open_batch_window():
+            try:
+                self.app.batch_window = BatchResultsWindow(self.app, self.app)
+                created.append(self.app.batch_window)
+            finally:
+                batch_window_ready.set()
+        self.app.ui_queue.call(open_batch_window)
+        # 窗口创建失败或界面队列已停止（程序正在退出）时不能一直等下去
+        deadline = time.monotonic() + BATCH_WINDOW_TIMEOUT
+        while not batch_window_ready.wait(BATCH_WINDOW_POLL):
+            if task.token.cancelled or time.monotonic() >= deadline:
+                break
+        if task.token.cancelled:
+            return
+        if not created:
+            logger.error("批量结果窗口未能创建，批量处理已取消。")
+            self.app.post_status("无法打开批量结果窗口，批量处理已取消，请查看日志。", "error")
+            return
+
+        # 每次批量处理单独统计，不累计之前的运行
+        metrics.registry.reset()
+        try:
+            metrics.registry.open_log(metrics.default_log_path(DEFAULT_RUNS_DIR))
+        except OSError as e:
+            logger.error(f"无法创建耗时记录: {e}")
+        processor = BatchProcessor(self.app.extractor, self.app.email_manager, csv_path)
+        try:
+            for result in processor.process_many(groups, cancel_token=task.token):
+                task.progress.advance()
+                progress_text = task.progress.format()
+                self.app.ui_queue.append("batch_results", self._add_batch_results, result)
+                self.app.post_status(f"批量处理中：{progress_text}", "info", log=False)
+                self.app.ui_queue.post("batch_progress", self._set_batch_progress,
+                                       task.progress.done, total, progress_text, processor.pipeline.format_stats())
+        finally:
+            self._finish_batch_metrics()
+
+        if task.token.cancelled:
+            message = f"批量处理已停止，已完成 {task.progress.done}/{total} 个游戏。"
+            self.app.post_status(message, "warning")
+            return
+        message = f"批量处理完成，共 {total} 个游戏。"
+        if unrecognized:
+            message += f" 已忽略 {len(unrecognized)} 个无法识别的链接。"
+        self.app.post_status(message, "success")
+
+    def _finish_batch_metrics(self):
+        """关闭本次批量处理的耗时记录，写出 Prometheus 统计并在日志中输出各阶段 p50/p99。"""
+        logger = logging.getLogger(__name__)
+        metrics.registry.close_log()
+        try:
+            metrics.registry.write_prometheus(os.path.join(DEFAULT_RUNS_DIR, metrics.DEFAULT_PROMETHEUS_FILENAME))
+        except OSError as e:
+            logger.error(f"写出 Prometheus 统计失败: {e}")
+        summary_text = metrics.registry.format_summary()
+        if summary_text:
+            logger.info("各阶段耗时:\n" + summary_text)
 
     def _clear_input_fields(self):
         self.url_entry.delete(1.0, tk.END)
@@ -0,0 +1,204 @@
+# ui/results_model.py
+from batch_processor import (
+    STATUS_OK, STATUS_NO_EMAIL, STATUS_RECENTLY_CONTACTED,
+    EMAIL_SOURCE_CSV, EMAIL_SOURCE_FUZZY, EMAIL_SOURCE_HELP_PAGE, EMAIL_SOURCE_MANUAL,
+)
+from outbox import STATE_QUEUED, STATE_SENDING, STATE_SENT, STATE_FAILED
+
+STATUS_TEXT = {
+    STATUS_OK: "已找到邮箱",
+    STATUS_NO_EMAIL: "未找到邮箱",
+    STATUS_RECENTLY_CONTACTED: "冷却期内已联系",
+}
+
+EMAIL_SOURCE_TEXT = {
+    EMAIL_SOURCE_CSV: "CSV",
+    EMAIL_SOURCE_FUZZY: "CSV 模糊匹配",
+    EMAIL_SOURCE_HELP_PAGE: "支持页面",
+    EMAIL_SOURCE_MANUAL: "手动填写",
+}
+
+SEND_STATE_TEXT = {
+    STATE_QUEUED: "待发送",
+    STATE_SENDING: "发送中",
+    STATE_SENT: "已发送",
+    STATE_FAILED: "发送失败",
+}
+
+# 表格列：(key, 标题, 默认宽度像素)
+COLUMNS = [
+    ("appid", "AppID", 80),
+    ("game_name", "游戏", 200),
+    ("publisher_name", "发行商", 160),
+    ("email_source", "邮箱来源", 80),
+    ("send_status", "发送状态", 140),
+]
+
+# 筛选项：(标题, 索引键)，索引键为 None 表示全部
+FILTERS = [
+    ("全部", None),
+    ("已找到邮箱", ("status", STATUS_OK)),
+    ("未找到邮箱", ("status", STATUS_NO_EMAIL)),
+    ("冷却期内已联系", ("status", STATUS_RECENTLY_CONTACTED)),
+    ("处理失败", ("status", "failed")),
+    ("待发送", ("send", STATE_QUEUED)),
+    ("已发送", ("send", STATE_SENT)),
+    ("发送失败", ("send", STATE_FAILED)),
+]
+
+def send_state(result: dict):
+    """结果的发送状态：GUI 中由发件箱更新 send_state，命令行结果只有 sent 字段。"""
+    state = result.get("send_state")
+    if state is None and result.get("sent"):
+        state = STATE_SENT
+    return state
+
+def format_send_status(result: dict) -> str:
+    state = send_state(result)
+    if state is not None:
+        return SEND_STATE_TEXT.get(state, state)
+    return STATUS_TEXT.get(result["status"], f"失败: {result['error']}")
+
+def _status_key(result: dict) -> str:
+    status = result["status"]
+    return status if status in STATUS_TEXT else "failed"
+
+def _sort_key(column: str, text: str):
+    if column == "appid":
+        # AppID 按数字排序，无法识别的排在最后
+        return (0, int(text)) if text.isdigit() else (1, 0)
+    return (0, text.casefold())
+
+class ResultsModel:
+    """
+    批量结果表格的数据模型，与界面无关。
+    rows 保存全部结果，view 是当前筛选和排序后要显示的行号列表；
+    每行的显示文本、搜索文本和排序键在加入时算好一次，按状态和发送状态建立索引，
+    筛选时只扫描对应索引里的行，界面只需要按 view 取出可见的几十行。
+    """
+    def __init__(self):
+        self.rows = []
+        self.view = []
+        self._cells = []
+        self._search = []
+        self._sort_keys = {column: [] for column, _, _ in COLUMNS}
+        self._index = {}
+        self._row_keys = []
+        self._by_appid = {}
+        self.filter_key = None
+        self.filter_text = ""
+        self.sort_column = None
+        self.sort_descending = False
+
+    def __len__(self):
+        return len(self.view)
+
+    def row_at(self, position: int) -> int:
+        return self.view[position]
+
+    def result(self, row: int) -> dict:
+        return self.rows[row]
+
+    def cells(self, row: int) -> tuple:
+        return self._cells[row]
+
+    def count(self, filter_key) -> int:
+        if filter_key is None:
+            return len(self.rows)
+        return len(self._index.get(filter_key, ()))
+
+    def find(self, appid: str) -> list:
+        """该 AppID 对应的行号（同一 AppID 可能处理过多次）。"""
+        return self._by_appid.get(appid, [])
+
+    def add(self, results: list):
+        """追加结果。符合当前筛选条件的行加入 view，有排序时重新排序（已排好的部分几乎不需要移动）。"""
+        added = []
+        for result in results:
+            row = len(self.rows)
+            self.rows.append(result)
+            self._cells.append(None)
+            self._search.append(None)
+            for keys in self._sort_keys.values():
+                keys.append(None)
+            self._row_keys.append(())
+            self._by_appid.setdefault(result["appid"], []).append(row)
+            self._compute(row)
+            if self._matches(row):
+                added.append(row)
+        if added:
+            self.view.extend(added)
+            if self.sort_column is not None:
+                self._sort_view()
+
+    def refresh(self, rows=None) -> bool:
+        """
+        结果内容变化（重新生成邮件、发送状态更新等）后重新计算这些行，rows 省略时重新计算全部。
+        行的筛选结果或排序位置可能变化，返回 True 表示 view 已重建。
+        """
+        rows = range(len(self.rows)) if rows is None else rows
+        for row in rows:
+            self._compute(row)
+        if self.filter_key is None and not self.filter_text and self.sort_column is None:
+            return False
+        self.apply()
+        return True
+
+    def set_filter(self, filter_key=None, text: str = ""):
+        self.filter_key = filter_key
+        self.filter_text = text.strip().casefold()
+        self.apply()
+
+    def set_sort(self, column: str, descending: bool = False):
+        self.sort_column = column
+        self.sort_descending = descending
+        self._sort_view()
+
+    def apply(self):
+        """按当前筛选条件和排序重建 view。"""
+        if self.filter_key is None:
+            candidates = range(len(self.rows))
+        else:
+            candidates = sorted(self._index.get(self.filter_key, ()))
+        if self.filter_text:
+            text = self.filter_text
+            search = self._search
+            self.view = [row for row in candidates if text in search[row]]
+        else:
+            self.view = list(candidates)
+        if self.sort_column is not None:
+            self._sort_view()
+
+    def _sort_view(self):
+        keys = self._sort_keys[self.sort_column]
+        # 稳定排序，相同键保持加入顺序
+        self.view.sort(key=keys.__getitem__, reverse=self.sort_descending)
+
+    def _matches(self, row: int) -> bool:
+        if self.filter_key is not None and self.filter_key not in self._row_keys[row]:
+            return False
+        return not self.filter_text or self.filter_text in self._search[row]
+
+    def _compute(self, row: int):
+        result = self.rows[row]
+        cells = (
+            result["appid"] or "-",
+            result["game_name"] or "-",
+            result["publisher_name"] or "-",
+            EMAIL_SOURCE_TEXT.get(result["email_source"], "-"),
+            format_send_status(result),
+        )
+        self._cells[row] = cells
+        self._search[row] = " ".join(cells + (result["publisher_email"] or "",)).casefold()
+        for (column, _, _), text in zip(COLUMNS, cells):
+            self._sort_keys[column][row] = _sort_key(column, text)
+
+        for key in self._row_keys[row]:
+            self._index[key].discard(row)
+        row_keys = [("status", _status_key(result))]
+        state = send_state(result)
+        if state is not None:
+            row_keys.append(("send", state))
+        for key in row_keys:
+            self._index.setdefault(key, set()).add(row)
+        self._row_keys[row] = tuple(row_keys)
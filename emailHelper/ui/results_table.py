@@ -0,0 +1,205 @@
+# ui/results_table.py
+import tkinter as tk
+from tkinter import font as tkfont
+
+from ui.results_model import COLUMNS
+
+HEADER_BACKGROUND = "#e8e8e8"
+SELECT_BACKGROUND = "#cce4ff"
+ROW_BACKGROUNDS = ("white", "#f7f7f7")
+# 截断文本缓存的上限，超过后清空重建
+TRUNCATE_CACHE_SIZE = 20000
+
+class ResultsTable(tk.Frame):
+    """
+    虚拟滚动的结果表格。只为窗口中可见的几十行创建 Canvas 文本项，
+    滚动、排序、筛选时只改写这些文本项，行数再多也不会在 Tk 中创建对应数量的控件。
+
+    row_style(result) 返回该行文字颜色；on_select(result) 在选中一行时调用。
+    """
+    def __init__(self, parent, model, row_style=None, on_select=None):
+        super().__init__(parent)
+        self.model = model
+        self.row_style = row_style or (lambda result: "black")
+        self.on_select = on_select
+        self.first = 0
+        self.selected_row = None
+        self._slots = []
+        self._truncated = {}
+        self._widths = [width for _, _, width in COLUMNS]
+
+        self.font = tkfont.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 6
+
+        self.header = tk.Canvas(self, height=self.row_height, highlightthickness=0, bg=HEADER_BACKGROUND)
+        self.header.grid(row=0, column=0, sticky="ew")
+        self.canvas = tk.Canvas(self, highlightthickness=0, bg="white", takefocus=True)
+        self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll(3))
+        self.canvas.bind("<Up>", lambda event: self._move_selection(-1))
+        self.canvas.bind("<Down>", lambda event: self._move_selection(1))
+        self.canvas.bind("<Prior>", lambda event: self._move_selection(-self._visible_rows()))
+        self.canvas.bind("<Next>", lambda event: self._move_selection(self._visible_rows()))
+        self.canvas.bind("<Home>", lambda event: self._move_selection(-len(self.model)))
+        self.canvas.bind("<End>", lambda event: self._move_selection(len(self.model)))
+        self.header.bind("<Button-1>", self._on_header_click)
+        self.header.bind("<Configure>", lambda event: self._draw_header())
+
+    def refresh(self):
+        """模型的 view 变化后重绘可见行。"""
+        self.first = max(0, min(self.first, len(self.model) - self._visible_rows()))
+        self._redraw()
+
+    def scroll(self, rows: int):
+        self.first = max(0, min(self.first + rows, len(self.model) - self._visible_rows()))
+        self._redraw()
+
+    def _visible_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def _column_positions(self, total_width: int) -> list:
+        """各列的 (x, 宽度)，最后一列占满剩余宽度。"""
+        positions = []
+        x = 0
+        for index, width in enumerate(self._widths):
+            if index == len(self._widths) - 1:
+                width = max(width, total_width - x)
+            positions.append((x, width))
+            x += width
+        return positions
+
+    def _draw_header(self):
+        self.header.delete("all")
+        positions = self._column_positions(self.header.winfo_width())
+        for (column, title, _), (x, width) in zip(COLUMNS, positions):
+            if column == self.model.sort_column:
+                title += " ▼" if self.model.sort_descending else " ▲"
+            self.header.create_text(x + 4, self.row_height // 2, text=title, anchor="w", font=self.font)
+            self.header.create_line(x + width - 1, 2, x + width - 1, self.row_height - 2, fill="gray")
+
+    def _on_configure(self, event=None):
+        # 按可见行数准备文本项，多出来的一行用于显示半行
+        needed = self._visible_rows() + 1
+        while len(self._slots) < needed:
+            y = len(self._slots) * self.row_height
+            background = self.canvas.create_rectangle(0, y, 0, y + self.row_height, width=0)
+            texts = [self.canvas.create_text(0, y + self.row_height // 2, anchor="w", font=self.font)
+                     for _ in COLUMNS]
+            self._slots.append((background, texts))
+        self._draw_header()
+        self.refresh()
+
+    def _truncate(self, text: str, width: int) -> str:
+        """截断超出列宽的文本。同样的文本在滚动时反复出现，结果缓存起来。"""
+        key = (text, width)
+        cached = self._truncated.get(key)
+        if cached is not None:
+            return cached
+        if self.font.measure(text) <= width:
+            cached = text
+        else:
+            low, high = 0, len(text)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self.font.measure(text[:middle] + "…") <= width:
+                    low = middle
+                else:
+                    high = middle - 1
+            cached = text[:low] + "…"
+        if len(self._truncated) >= TRUNCATE_CACHE_SIZE:
+            self._truncated.clear()
+        self._truncated[key] = cached
+        return cached
+
+    def _redraw(self):
+        total = len(self.model)
+        canvas_width = self.canvas.winfo_width()
+        positions = self._column_positions(canvas_width)
+        for slot, (background, texts) in enumerate(self._slots):
+            position = self.first + slot
+            y = slot * self.row_height
+            if position >= total:
+                self.canvas.itemconfigure(background, state="hidden")
+                for text in texts:
+                    self.canvas.itemconfigure(text, state="hidden")
+                continue
+            row = self.model.row_at(position)
+            if row == self.selected_row:
+                fill = SELECT_BACKGROUND
+            else:
+                fill = ROW_BACKGROUNDS[position % 2]
+            self.canvas.coords(background, 0, y, canvas_width, y + self.row_height)
+            self.canvas.itemconfigure(background, fill=fill, state="normal")
+            color = self.row_style(self.model.result(row))
+            for text, cell, (x, width) in zip(texts, self.model.cells(row), positions):
+                self.canvas.coords(text, x + 4, y + self.row_height // 2)
+                self.canvas.itemconfigure(text, text=self._truncate(cell, width - 8), fill=color, state="normal")
+
+        if total:
+            visible = self._visible_rows()
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.first = int(float(args[0]) * len(self.model))
+            self.refresh()
+        elif action == "scroll":
+            count, unit = int(args[0]), args[1]
+            self.scroll(count * self._visible_rows() if unit == "pages" else count)
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_click(self, event):
+        self.canvas.focus_set()
+        position = self.first + event.y // self.row_height
+        if position < len(self.model):
+            self._select_position(position)
+
+    def _move_selection(self, step: int):
+        if not len(self.model):
+            return
+        current = self.selected_position()
+        position = 0 if current is None else max(0, min(current + step, len(self.model) - 1))
+        self._select_position(position)
+        visible = self._visible_rows()
+        if position < self.first:
+            self.first = position
+        elif position >= self.first + visible:
+            self.first = position - visible + 1
+        self.refresh()
+
+    def selected_position(self):
+        """选中行在当前 view 中的位置，没有选中或已被筛选掉时返回 None。"""
+        if self.selected_row is None:
+            return None
+        try:
+            return self.model.view.index(self.selected_row)
+        except ValueError:
+            return None
+
+    def _select_position(self, position: int):
+        self.selected_row = self.model.row_at(position)
+        self._redraw()
+        if self.on_select is not None:
+            self.on_select(self.model.result(self.selected_row))
+
+    def _on_header_click(self, event):
+        for (column, _, _), (x, width) in zip(COLUMNS, self._column_positions(self.header.winfo_width())):
+            if x <= event.x < x + width:
+                descending = column == self.model.sort_column and not self.model.sort_descending
+                self.model.set_sort(column, descending)
+                self._draw_header()
+                self.refresh()
+                break
@@ -0,0 +1,67 @@
+# ui/ui_queue.py
+import itertools
+import tkinter as tk
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAME_INTERVAL_MS = 16  # 约 60fps
+
+class UIUpdateQueue:
+    """
+    工作线程向界面提交更新的唯一入口。工作线程只往队列里放回调，
+    主线程每帧（默认 16ms）取出一次全部执行，工作线程从不直接接触 Tk 控件。
+
+    - post(key, func, *args): 同一 key 在一帧内只执行最后一次，用于状态栏、进度等只关心最新值的更新；
+    - append(key, func, item): 一帧内同一 key 的 item 收集成列表，只调用一次 func(items)，用于批量追加结果行；
+    - call(func, *args): 每次都执行，按提交顺序。
+    """
+    def __init__(self, root, interval_ms: int = DEFAULT_FRAME_INTERVAL_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._after_id = None
+
+    def post(self, key, func, *args):
+        with self._lock:
+            # 先删除再插入，使该更新排在本帧已提交的其他更新之后
+            self._pending.pop(("post", key), None)
+            self._pending[("post", key)] = (func, args)
+
+    def append(self, key, func, item):
+        with self._lock:
+            entry = self._pending.get(("append", key))
+            if entry is None:
+                self._pending[("append", key)] = (func, ([item],))
+            else:
+                entry[1][0].append(item)
+
+    def call(self, func, *args):
+        with self._lock:
+            self._pending[("call", next(self._sequence))] = (func, args)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except tk.TclError:
+                # 窗口已销毁
+                pass
+            self._after_id = None
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception:
+                logger.exception("执行界面更新时出错")
+        self._after_id = self.root.after(self.interval_ms, self._drain)
@@ -0,0 +1,89 @@
+# url_classifier.py
+import re
+import logging
+
+from metrics import span, SPAN_URL_PARSE, OUTCOME_NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+# URL 类型
+KIND_STORE = "store"
+KIND_REVIEW = "review"
+KIND_CURATOR = "curator"
+KIND_COMMUNITY_APP = "community_app"
+KIND_OTHER = "other"
+
+# 所有支持的链接合并为一个预编译的多分支正则，每个 URL 只需匹配一次
+_URL_PATTERN = re.compile(r"""
+    (?:https?://)?(?:www\.)?
+    (?:
+        store\.steampowered\.com/curator/\d+
+            (?:\S*?(?:/app/|[?&]appid=)(?P<curator>\d+))?
+      | store\.steampowered\.com/(?:agecheck/)?app/(?P<store>\d+)
+      | steamcommunity\.com/(?:id|profiles)/[^/\s]+/recommended/(?P<review>\d+)
+      | steamcommunity\.com/app/(?P<community_app>\d+)
+      | \S*?(?:app|recommended)/(?P<other>\d+)
+    )
+""", re.VERBOSE | re.IGNORECASE)
+
+_GROUP_KINDS = (
+    ("curator", KIND_CURATOR),
+    ("store", KIND_STORE),
+    ("review", KIND_REVIEW),
+    ("community_app", KIND_COMMUNITY_APP),
+    ("other", KIND_OTHER),
+)
+
+def classify_url(url: str) -> tuple:
+    """
+    识别单个 URL，返回 (类型, AppID)。
+    无法识别时返回 (None, None)；不带 AppID 的鉴赏家链接返回 (KIND_CURATOR, None)。
+    """
+    if not url:
+        return None, None
+    match = _URL_PATTERN.search(url)
+    if not match:
+        return None, None
+    for group, kind in _GROUP_KINDS:
+        appid = match.group(group)
+        if appid:
+            return kind, appid
+    # 只剩下不带 AppID 的鉴赏家链接这一种情况
+    return KIND_CURATOR, None
+
+def classify_urls(source) -> tuple:
+    """
+    一次遍历批量分类 URL。
+    source: 粘贴的整段文本，或可迭代的行（例如打开的文件对象）。URL 之间以空白分隔。
+    返回 (groups, unrecognized)：
+        groups: {appid: {类型: [url, ...]}}，保持首次出现的顺序，同组内重复的 URL 只保留一次；
+                不带 AppID 的鉴赏家链接归入 groups[None]。
+        unrecognized: 无法识别的片段列表。
+    整批只记录一次 url_parse 耗时，避免大量 URL 时逐条计时拖慢解析、撑大运行日志。
+    """
+    lines = source.splitlines() if isinstance(source, str) else source
+    groups = {}
+    seen = set()
+    unrecognized = []
+    with span(SPAN_URL_PARSE) as timing:
+        for line in lines:
+            for token in line.split():
+                if token in seen:
+                    continue
+                seen.add(token)
+                kind, appid = classify_url(token)
+                if kind is None:
+                    unrecognized.append(token)
+                    continue
+                groups.setdefault(appid, {}).setdefault(kind, []).append(token)
+        if not groups:
+            timing.outcome = OUTCOME_NOT_FOUND
+
+    if unrecognized:
+        logger.warning(f"有 {len(unrecognized)} 个链接无法识别AppID")
+    logger.debug(f"URL 分类完成，共 {len(groups)} 个 AppID")
+    return groups, unrecognized
+
+def flatten_group(kinds: dict) -> list:
+    """把某个 AppID 下按类型分组的 URL 合并为一个列表。"""
+    return [url for urls in kinds.values() for url in urls]